@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Agrupamiento de Chunks por Temas (k-means por mini-lotes)
+Vista general de un documento largo: agrupa la matriz de embeddings en
+temas con k-means esférico por mini-lotes (inicialización k-means++) y
+elige k automáticamente por silueta sobre una muestra. Por tema guarda
+los chunks representativos (los más cercanos al centroide); el resultado
+se escribe junto al run (.temas.json + .temas.npz) y la generación de
+preguntas lo usa para repartir las preguntas entre temas.
+
+Uso:
+    python agrupamiento_temas.py output/run.manifest.ndjson [--k 12]
+    python agrupamiento_temas.py --benchmark 100000
+
+Fecha: 18/10/2026
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from escritor_json import escritura_atomica
+from formato_binario import ruta_base_run
+from indice_ann import asignar
+
+TEMAS = os.environ.get('RECUIVA_TEMAS', 'auto')   # 'auto', un k fijo, o '0' para no agrupar
+VERSION_TEMAS = 'recuiva-temas-v1'
+SUFIJO_TEMAS = '.temas.json'
+SUFIJO_ETIQUETAS = '.temas.npz'
+K_MAXIMO = 40
+MIN_CHUNKS_POR_TEMA = 5
+CANDIDATOS_K = 8              # Valores de k que se prueban (escala geométrica entre 2 y el máximo)
+MUESTRA_AUTO_K = 10000        # Filas con las que se elige k
+MUESTRA_SILUETA = 2000
+TAMANO_LOTE_KMEANS = 1024
+ITERACIONES_KMEANS = 100
+PASADAS_COMPLETAS = 2         # Pasadas de Lloyd sobre todas las filas al final (afinan los centroides)
+REPRESENTANTES = 3
+
+
+def configurar_temas(valor):
+    """'auto', un k fijo o 0 (desactivar); opción --temas"""
+    global TEMAS
+    valor = str(valor)
+    if valor != 'auto' and (not valor.isdigit() or int(valor) == 1):
+        raise ValueError(f"--temas debe ser 'auto', 0 o un k >= 2 (recibido: {valor})")
+    TEMAS = valor
+
+
+def temas_actual():
+    """None (desactivado), 'auto' o el k fijo"""
+    if TEMAS == 'auto':
+        return 'auto'
+    return int(TEMAS) or None
+
+
+def kmeans_mas_mas(vectores, k, rng):
+    """
+    Centroides iniciales k-means++ (variante greedy: en cada paso se sortean
+    2 + log(k) candidatos y queda el que más reduce el potencial). Distancia
+    euclídea al cuadrado entre vectores unitarios: 2 - 2·coseno.
+    """
+    intentos = 2 + int(np.log(k))
+    elegidos = [int(rng.integers(len(vectores)))]
+    distancias = np.maximum(2 - 2 * (vectores @ vectores[elegidos[0]]), 0)
+    for _ in range(1, k):
+        total = distancias.sum()
+        if total <= 0:
+            elegidos.append(int(rng.integers(len(vectores))))
+            continue
+        candidatos = rng.choice(len(vectores), size=intentos, p=distancias / total)
+        nuevas = np.minimum(distancias[None, :], np.maximum(2 - 2 * (vectores[candidatos] @ vectores.T), 0))
+        mejor = int(nuevas.sum(axis=1).argmin())
+        elegidos.append(int(candidatos[mejor]))
+        distancias = nuevas[mejor]
+    return vectores[elegidos].copy()
+
+
+def kmeans_minibatch(vectores, k, iteraciones=ITERACIONES_KMEANS, tamano_lote=TAMANO_LOTE_KMEANS, semilla=0):
+    """
+    Centroides unitarios (k, d) por k-means esférico con mini-lotes: cada
+    centroide avanza hacia la media de sus puntos del lote con tasa
+    1/(puntos vistos), y se renormaliza.
+    """
+    rng = np.random.default_rng(semilla)
+    muestra = vectores[rng.choice(len(vectores), size=min(len(vectores), MUESTRA_AUTO_K), replace=False)]
+    centroides = kmeans_mas_mas(muestra, k, rng)
+    vistos = np.zeros(k, dtype=np.float64)
+    for _ in range(iteraciones):
+        lote = vectores[rng.integers(len(vectores), size=min(tamano_lote, len(vectores)))]
+        etiquetas = (lote @ centroides.T).argmax(axis=1)
+        conteos = np.bincount(etiquetas, minlength=k)
+        sumas = np.zeros_like(centroides)
+        np.add.at(sumas, etiquetas, lote)
+        con_puntos = conteos > 0
+        vistos += conteos
+        tasa = (conteos[con_puntos] / vistos[con_puntos]).astype(np.float32)[:, None]
+        centroides[con_puntos] += tasa * (sumas[con_puntos] / conteos[con_puntos, None] - centroides[con_puntos])
+        centroides /= np.clip(np.linalg.norm(centroides, axis=1, keepdims=True), 1e-12, None)
+    return centroides
+
+
+def silueta(vectores, etiquetas, k):
+    """Coeficiente de silueta medio (distancia coseno) de una muestra pequeña"""
+    distancias = 1 - vectores @ vectores.T
+    una_caliente = np.zeros((len(vectores), k), dtype=np.float32)
+    una_caliente[np.arange(len(vectores)), etiquetas] = 1
+    sumas = distancias @ una_caliente
+    conteos = una_caliente.sum(axis=0)
+    propias = conteos[etiquetas]
+    a = sumas[np.arange(len(vectores)), etiquetas] / np.maximum(propias - 1, 1)
+    medias = sumas / np.maximum(conteos, 1)
+    medias[np.arange(len(vectores)), etiquetas] = np.inf
+    medias[:, conteos == 0] = np.inf
+    b = medias.min(axis=1)
+    valores = np.where(propias > 1, (b - a) / np.maximum(np.maximum(a, b), 1e-12), 0)
+    return float(valores.mean())
+
+
+def elegir_k(vectores, semilla=0):
+    """k con mejor silueta entre CANDIDATOS_K valores de 2 a min(K_MAXIMO, n / MIN_CHUNKS_POR_TEMA)"""
+    n = len(vectores)
+    maximo = int(min(K_MAXIMO, n // MIN_CHUNKS_POR_TEMA))
+    if maximo < 2:
+        return 1, {}
+    rng = np.random.default_rng(semilla)
+    muestra = vectores[rng.choice(n, size=min(n, MUESTRA_AUTO_K), replace=False)]
+    evaluacion = muestra[:MUESTRA_SILUETA]
+    puntajes = {}
+    for k in sorted({int(round(k)) for k in np.geomspace(2, maximo, CANDIDATOS_K)}):
+        centroides = kmeans_minibatch(muestra, k, semilla=semilla)
+        puntajes[k] = silueta(evaluacion, (evaluacion @ centroides.T).argmax(axis=1), k)
+    return max(puntajes, key=puntajes.get), puntajes
+
+
+class Temas:
+    """Resultado del agrupamiento: etiqueta y similitud al centroide de cada fila de la matriz"""
+
+    def __init__(self, etiquetas, centroides, similitudes, ids, silueta_muestra=None, detalle=None):
+        self.etiquetas = etiquetas
+        self.centroides = centroides
+        self.similitudes = similitudes
+        self.ids = list(ids)
+        self.silueta = silueta_muestra
+        self.detalle = detalle or {}
+
+    @property
+    def k(self):
+        return len(self.centroides)
+
+    def tamanos(self):
+        return np.bincount(self.etiquetas, minlength=self.k)
+
+    def representantes(self, cantidad=REPRESENTANTES):
+        """Por tema, las filas más cercanas a su centroide: lista de arrays (de más a menos cercana)"""
+        orden = np.lexsort((-self.similitudes, self.etiquetas))
+        inicios = np.searchsorted(self.etiquetas[orden], np.arange(self.k))
+        fines = np.append(inicios[1:], len(orden))
+        return [orden[inicio:min(fin, inicio + cantidad)] for inicio, fin in zip(inicios, fines)]
+
+    def muestrear(self, cantidad, semilla=0):
+        """Filas repartidas entre temas (una por tema por vuelta, temas más grandes primero)"""
+        rng = np.random.default_rng(semilla)
+        por_tema = [rng.permutation(np.flatnonzero(self.etiquetas == t)) for t in np.argsort(-self.tamanos())]
+        filas = []
+        for vuelta in range(max((len(p) for p in por_tema), default=0)):
+            for tema in por_tema:
+                if vuelta < len(tema):
+                    filas.append(int(tema[vuelta]))
+                    if len(filas) == cantidad:
+                        return filas
+        return filas
+
+    def resumen(self, chunks=None, largo_preview=80):
+        """Diccionario para el .temas.json (con preview de los representantes si se pasan los chunks)"""
+        tamanos = self.tamanos()
+        temas = []
+        for tema, filas in enumerate(self.representantes()):
+            representantes = []
+            for fila in filas:
+                representante = {'id': self.ids[fila], 'similarity': round(float(self.similitudes[fila]), 4)}
+                if chunks is not None:
+                    representante['content'] = chunks[fila]['content'][:largo_preview]
+                representantes.append(representante)
+            temas.append({'topic': tema, 'size': int(tamanos[tema]), 'representatives': representantes})
+        return {
+            'format': VERSION_TEMAS,
+            'k': self.k,
+            'chunks': len(self.ids),
+            'silhouette': None if self.silueta is None else round(self.silueta, 4),
+            'clustering': self.detalle,
+            'topics': sorted(temas, key=lambda t: -t['size'])
+        }
+
+    def guardar(self, ruta_run, chunks=None):
+        """Escribir <run>.temas.json (resumen) y <run>.temas.npz (etiquetas, centroides) junto al run"""
+        base = ruta_base_run(ruta_run)
+        with escritura_atomica(base + SUFIJO_ETIQUETAS) as f:
+            np.savez(f, etiquetas=self.etiquetas, centroides=self.centroides, similitudes=self.similitudes)
+        with escritura_atomica(base + SUFIJO_TEMAS) as f:
+            f.write(json.dumps(self.resumen(chunks), ensure_ascii=False, indent=2).encode('utf-8'))
+        return base + SUFIJO_TEMAS
+
+    @classmethod
+    def cargar(cls, ruta_run):
+        base = ruta_base_run(ruta_run)
+        with open(base + SUFIJO_TEMAS, 'r', encoding='utf-8') as f:
+            resumen = json.load(f)
+        if resumen.get('format') != VERSION_TEMAS:
+            raise ValueError(f"Archivo de temas no reconocido: {base + SUFIJO_TEMAS}")
+        with np.load(base + SUFIJO_ETIQUETAS, allow_pickle=False) as datos:
+            etiquetas, centroides, similitudes = datos['etiquetas'], datos['centroides'], datos['similitudes']
+        from lector_runs import abrir_run
+        with abrir_run(ruta_run) as run:
+            ids = [chunk['id'] for chunk in run.iterar_chunks()]
+        return cls(etiquetas, centroides, similitudes, ids, resumen.get('silhouette'), resumen.get('clustering'))
+
+
+def agrupar(matriz, k='auto', semilla=0):
+    """Agrupar una MatrizEmbeddings en temas; k='auto' lo elige por silueta"""
+    inicio = time.perf_counter()
+    vectores = matriz.matriz
+    puntajes = {}
+    if k == 'auto':
+        k, puntajes = elegir_k(vectores, semilla)
+    k = max(1, min(int(k), len(vectores)))
+    if k == 1:
+        centroides = vectores.mean(axis=0, keepdims=True) if len(vectores) else np.zeros((1, matriz.dimension), np.float32)
+        centroides /= max(float(np.linalg.norm(centroides)), 1e-12)
+    else:
+        centroides = kmeans_minibatch(vectores, k, semilla=semilla)
+        for _ in range(PASADAS_COMPLETAS):
+            etiquetas, _ = asignar(vectores, centroides)
+            conteos = np.bincount(etiquetas, minlength=k)
+            con_puntos = conteos > 0
+            sumas = np.add.reduceat(vectores[np.argsort(etiquetas, kind='stable')], (np.cumsum(conteos) - conteos)[con_puntos])
+            centroides[con_puntos] = sumas / np.clip(np.linalg.norm(sumas, axis=1, keepdims=True), 1e-12, None)
+    etiquetas, similitudes = asignar(vectores, centroides)
+
+    muestra = np.random.default_rng(semilla).choice(len(vectores), size=min(len(vectores), MUESTRA_SILUETA), replace=False)
+    valor_silueta = silueta(vectores[muestra], etiquetas[muestra], k) if k > 1 else None
+    detalle = {
+        'method': 'minibatch-spherical-kmeans++',
+        'k_selection': 'silhouette' if puntajes else 'fixed',
+        'silhouette_by_k': {str(kk): round(v, 4) for kk, v in puntajes.items()},
+        'seconds': round(time.perf_counter() - inicio, 3)
+    }
+    return Temas(etiquetas, centroides, similitudes, matriz.ids, valor_silueta, detalle)
+
+
+def describir_temas(temas):
+    """Línea de resumen para consola/log"""
+    silueta_texto = f", silueta {temas.silueta:.3f}" if temas.silueta is not None else ""
+    return f"{temas.k} temas en {temas.detalle['seconds']:.2f}s{silueta_texto}"
+
+
+def _benchmark(total, k):
+    from embeddings_mock import vectores_por_temas
+    from matriz_embeddings import MatrizEmbeddings
+
+    vectores, reales = vectores_por_temas(total, temas=25, ruido=1.5)
+    matriz = MatrizEmbeddings(vectores, [f'chunk_{i}' for i in range(total)], normalizada=True)
+    temas = agrupar(matriz, k)
+    # Pureza: fracción de filas cuyo tema encontrado coincide con el tema real más frecuente del grupo
+    coincidencias = sum(np.bincount(reales[temas.etiquetas == t]).max() for t in range(temas.k) if (temas.etiquetas == t).any())
+    print(f"🧩 {total:,} chunks (25 temas reales): {describir_temas(temas)}, pureza {coincidencias / total:.3f}")
+    if temas.detalle['silhouette_by_k']:
+        print(f"   Silueta por k: {temas.detalle['silhouette_by_k']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recuiva - agrupamiento de chunks por temas")
+    parser.add_argument('run', nargs='?', help="Run de output/")
+    parser.add_argument('--k', default='auto', help="Cantidad de temas (por defecto: automática)")
+    parser.add_argument('--benchmark', type=int, metavar='CHUNKS', help="Vectores mock con 25 temas reales")
+    args = parser.parse_args()
+    k = args.k if args.k == 'auto' else int(args.k)
+
+    if args.benchmark:
+        _benchmark(args.benchmark, k)
+        return 0
+    if not args.run:
+        parser.error("indicar un run (o --benchmark)")
+
+    from lector_runs import abrir_run
+    from matriz_embeddings import MatrizEmbeddings
+
+    with abrir_run(args.run) as run:
+        chunks = list(run.iterar_chunks())
+    temas = agrupar(MatrizEmbeddings.desde_run(args.run), k)
+    ruta = temas.guardar(args.run, chunks)
+    print(f"🧩 {describir_temas(temas)} -> {ruta}")
+    for tema in temas.resumen(chunks)['topics'][:10]:
+        print(f"   Tema {tema['topic']} ({tema['size']} chunks): {tema['representatives'][0]['content']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,687 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Almacén de Corpus (append-only, por segmentos)
+Guarda documentos, chunks y vectores de muchos materiales y ejecuciones en
+un solo corpus local. Cada ingesta escribe un segmento nuevo e inmutable
+(mismo formato binario que los runs: .vectors.npy + manifiesto + índice,
+más un índice ordenado de hashes de contenido) y agrega una línea al log
+del manifiesto (`corpus.log.ndjson`); el snapshot `corpus.json` solo se
+reescribe cada tantas operaciones, así que el costo de una ingesta depende
+solo del material nuevo. Reingestar un documento deja su versión anterior
+como reemplazada; la compactación (automática y en segundo plano al pasar
+de RECUIVA_CORPUS_MAX_SEGMENTOS o acumular filas muertas) reescribe los
+segmentos con muchas filas muertas o demasiado pequeños.
+
+Uso:
+    python almacen_corpus.py estado
+    python almacen_corpus.py agregar output/run.manifest.ndjson [--doc-id apuntes_bio]
+    python almacen_corpus.py eliminar apuntes_bio
+    python almacen_corpus.py compactar
+    python almacen_corpus.py buscar-hash "texto de un chunk"
+    python almacen_corpus.py benchmark [--documentos 200] [--chunks 200]
+
+Fecha: 18/10/2026
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from cache_embeddings import normalizar_texto
+from escritor_json import escritura_atomica
+from formato_binario import archivos_run, guardar_run_binario
+from lector_runs import LectorRun
+
+DIRECTORIO_CORPUS = os.environ.get(
+    'RECUIVA_CORPUS_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+)
+ARCHIVO_MANIFIESTO = 'corpus.json'
+ARCHIVO_LOG = 'corpus.log.ndjson'
+VERSION_CORPUS = 'recuiva-corpus-v1'
+SUFIJO_HASHES = '.hashes.npy'
+UMBRAL_FILAS_MUERTAS = 0.3    # Compactar segmentos con al menos 30% de filas muertas
+MIN_FILAS_SEGMENTO = 256      # ... o varios segmentos más chicos que esto
+MAX_SEGMENTOS = int(os.environ.get('RECUIVA_CORPUS_MAX_SEGMENTOS', '32'))  # Más segmentos: se fusionan los más chicos
+MIN_OPERACIONES_CHECKPOINT = 64  # El log se vuelca al snapshot al superar max(esto, documentos) líneas
+BYTES_HASH = 16
+
+
+def hash_contenido(texto):
+    """Hash de contenido de un chunk (sha256 truncado del texto normalizado), en hex"""
+    return hashlib.sha256(normalizar_texto(texto).encode('utf-8')).hexdigest()[:2 * BYTES_HASH]
+
+
+def _vector_float32(embedding):
+    """Vector de un registro de salida en float32 (deshace int8 + escala y float16)"""
+    vector = np.asarray(embedding['vector'], dtype=np.float32)
+    if 'scale' in embedding:
+        vector = vector * np.float32(embedding['scale'])
+    return vector
+
+
+class AlmacenCorpus:
+    """
+    Corpus en `directorio`: manifiesto (`corpus.json` + log de operaciones)
+    y segmentos inmutables. Un chunk está vivo si su documento apunta hoy a
+    su segmento. Con `compactacion_automatica` las ingestas y eliminaciones
+    lanzan la compactación en segundo plano cuando hace falta.
+    """
+
+    def __init__(self, directorio=DIRECTORIO_CORPUS, compactacion_automatica=True):
+        self.directorio = directorio
+        self.directorio_segmentos = os.path.join(directorio, 'segmentos')
+        os.makedirs(self.directorio_segmentos, exist_ok=True)
+        self.ruta_manifiesto = os.path.join(directorio, ARCHIVO_MANIFIESTO)
+        self.ruta_log = os.path.join(directorio, ARCHIVO_LOG)
+        self.compactacion_automatica = compactacion_automatica
+        self._lock = threading.RLock()
+        self._lock_compactacion = threading.Lock()
+        self._lectores = {}
+        self._hashes = {}
+        self._pendientes_borrar = []   # Segmentos retirados cuyos archivos el SO no dejó borrar todavía
+        self._hilo_compactacion = None
+        self.manifiesto = self._leer_manifiesto()
+        self._operaciones_log = self._reproducir_log()
+        self._archivo_log = open(self.ruta_log, 'ab')
+        self._contar_filas()
+
+    def _contar_filas(self):
+        self._filas_totales = sum(info['rows'] for info in self.manifiesto['segments'].values())
+        self._filas_muertas = self._filas_totales - sum(
+            self._filas_vivas(segmento) for segmento in self.manifiesto['segments']
+        )
+
+    # ------------------------------------------------------------------
+    # Manifiesto
+    # ------------------------------------------------------------------
+
+    def _leer_manifiesto(self):
+        if not os.path.exists(self.ruta_manifiesto):
+            return {
+                'format': VERSION_CORPUS,
+                'model': None,
+                'dimension': None,
+                'next_segment': 1,
+                'seq': 0,
+                'segments': {},
+                'documents': {}
+            }
+        with open(self.ruta_manifiesto, 'r', encoding='utf-8') as f:
+            manifiesto = json.load(f)
+        if manifiesto.get('format') != VERSION_CORPUS:
+            raise ValueError(f"Manifiesto de corpus no reconocido: {self.ruta_manifiesto}")
+        manifiesto.setdefault('seq', 0)
+        return manifiesto
+
+    def _reproducir_log(self, truncar=True):
+        """
+        Aplicar al snapshot las operaciones del log posteriores a él. Una
+        última línea incompleta (corte durante la escritura) se descarta y,
+        con `truncar`, se corta del archivo. Devuelve las líneas válidas del log.
+        """
+        if not os.path.exists(self.ruta_log):
+            return 0
+        lineas, valido = 0, 0
+        with open(self.ruta_log, 'rb') as f:
+            for linea in f:
+                try:
+                    operacion = json.loads(linea) if linea.endswith(b'\n') else None
+                except ValueError:
+                    operacion = None
+                if operacion is None:
+                    break
+                if operacion['seq'] > self.manifiesto['seq']:
+                    self._aplicar(operacion)
+                lineas += 1
+                valido += len(linea)
+        if truncar and valido < os.path.getsize(self.ruta_log):
+            with open(self.ruta_log, 'r+b') as f:
+                f.truncate(valido)
+        return lineas
+
+    def _aplicar(self, operacion):
+        """Efecto de una operación del log sobre el manifiesto en memoria (valores absolutos)"""
+        manifiesto = self.manifiesto
+        manifiesto['seq'] = operacion['seq']
+        tipo = operacion['op']
+        if tipo in ('add', 'compact') and operacion['segment']:
+            segmento = operacion['segment']
+            manifiesto['segments'][segmento] = operacion['info']
+            manifiesto['next_segment'] = max(manifiesto['next_segment'], int(segmento.split('_')[1]) + 1)
+        if tipo == 'add':
+            manifiesto['dimension'] = operacion['dimension']
+            manifiesto['model'] = manifiesto['model'] or operacion['model']
+            manifiesto['documents'].update(operacion['documents'])
+        elif tipo == 'delete':
+            manifiesto['documents'].pop(operacion['doc_id'], None)
+        elif tipo == 'compact':
+            for doc_id, cambios in operacion['documents'].items():
+                if doc_id in manifiesto['documents']:
+                    manifiesto['documents'][doc_id].update(cambios)
+            for segmento in operacion['removed']:
+                manifiesto['segments'].pop(segmento, None)
+
+    def refrescar(self):
+        """
+        Releer snapshot y log para ver las operaciones de otros procesos. No
+        trunca el log: una última línea incompleta puede estar escribiéndose.
+        """
+        with self._lock:
+            self.manifiesto = self._leer_manifiesto()
+            self._operaciones_log = self._reproducir_log(truncar=False)
+            for segmento in [s for s in self._lectores if s not in self.manifiesto['segments']]:
+                self._lectores.pop(segmento)  # Sin cerrar: puede haber vistas en uso (ver _compactar)
+                self._hashes.pop(segmento, None)
+            self._contar_filas()
+
+    def _registrar(self, operacion):
+        """
+        Aplicar `operacion` y agregarla al log (una línea + fsync). Cuando el
+        log supera max(MIN_OPERACIONES_CHECKPOINT, documentos) líneas se
+        vuelca al snapshot: el costo amortizado por operación es constante.
+        Llamar con self._lock tomado.
+        """
+        operacion = dict(operacion, seq=self.manifiesto['seq'] + 1)
+        self._aplicar(operacion)
+        self._archivo_log.write(json.dumps(operacion, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n')
+        self._archivo_log.flush()
+        os.fsync(self._archivo_log.fileno())
+        self._operaciones_log += 1
+        if self._operaciones_log >= max(MIN_OPERACIONES_CHECKPOINT, len(self.manifiesto['documents'])):
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Escribir el snapshot completo y vaciar el log (las líneas con seq <= snapshot se ignoran al abrir)"""
+        with self._lock:
+            with escritura_atomica(self.ruta_manifiesto) as f:
+                f.write(json.dumps(self.manifiesto, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+            self._archivo_log.truncate(0)
+            self._operaciones_log = 0
+
+    def _ruta_segmento(self, segmento):
+        return os.path.join(self.directorio_segmentos, segmento)
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def _escribir_segmento(self, documentos, modelo):
+        """
+        Escribir un segmento nuevo con `documentos` [(doc_id, registros, metadata)]
+        y devolver (nombre, {doc_id: [inicio, fin]}, filas). No toca el manifiesto.
+        """
+        with self._lock:
+            segmento = f"seg_{self.manifiesto['next_segment']:06d}"
+            self.manifiesto['next_segment'] += 1
+
+        registros, rangos, hashes = [], {}, []
+        for doc_id, chunks, _ in documentos:
+            inicio = len(registros)
+            for chunk in chunks:
+                contenido_hash = chunk.get('content_hash') or hash_contenido(chunk['content'])
+                embedding = {k: v for k, v in chunk['embedding'].items() if k not in ('vector', 'scale', 'dtype')}
+                registros.append(dict(
+                    chunk,
+                    id=f"{doc_id}:{chunk.get('chunk_id', chunk['id'])}",
+                    chunk_id=chunk.get('chunk_id', chunk['id']),
+                    doc_id=doc_id,
+                    content_hash=contenido_hash,
+                    embedding=dict(embedding, vector=_vector_float32(chunk['embedding']))
+                ))
+                hashes.append(bytes.fromhex(contenido_hash))
+            rangos[doc_id] = [inicio, len(registros)]
+
+        base = self._ruta_segmento(segmento)
+        guardar_run_binario({'metadata': {'segment': segmento, 'model': modelo}, 'chunks': registros}, base)
+
+        indice_hashes = np.empty(len(hashes), dtype=[('hash', f'S{BYTES_HASH}'), ('row', '<u4')])
+        indice_hashes['hash'] = hashes
+        indice_hashes['row'] = np.arange(len(hashes))
+        indice_hashes.sort(order='hash')
+        with escritura_atomica(base + SUFIJO_HASHES) as f:
+            np.save(f, indice_hashes, allow_pickle=False)
+        return segmento, rangos, len(registros)
+
+    def agregar_documentos(self, documentos, modelo=None):
+        """
+        Ingestar [(doc_id, registros, metadata)] en un segmento nuevo. Los
+        registros tienen el formato de salida ('id', 'content', 'embedding').
+        Un doc_id existente queda reemplazado por la versión nueva.
+        """
+        documentos = [(doc_id, list(chunks), metadata or {}) for doc_id, chunks, metadata in documentos]
+        documentos = [doc for doc in documentos if doc[1]]
+        if not documentos:
+            return None
+
+        dimension = len(documentos[0][1][0]['embedding']['vector'])
+        with self._lock:
+            esperada = self.manifiesto['dimension']
+            if esperada and dimension != esperada:
+                raise ValueError(f"Dimensión {dimension} distinta a la del corpus ({esperada})")
+            if self.manifiesto['model'] and modelo and modelo != self.manifiesto['model']:
+                raise ValueError(f"Modelo {modelo} distinto al del corpus ({self.manifiesto['model']})")
+
+        segmento, rangos, filas = self._escribir_segmento(documentos, modelo)
+
+        with self._lock:
+            entradas = {}
+            for doc_id, _, metadata in documentos:
+                anterior = self.manifiesto['documents'].get(doc_id)
+                if anterior:
+                    self._filas_muertas += anterior['chunks']
+                entradas[doc_id] = {
+                    'segment': segmento,
+                    'rows': rangos[doc_id],
+                    'chunks': rangos[doc_id][1] - rangos[doc_id][0],
+                    'metadata': metadata,
+                    'ingested_at': datetime.now().isoformat(),
+                    'version': anterior['version'] + 1 if anterior else 1
+                }
+            self._registrar({
+                'op': 'add',
+                'segment': segmento,
+                'info': {'rows': filas, 'documents': rangos, 'created': datetime.now().isoformat()},
+                'documents': entradas,
+                'model': modelo,
+                'dimension': dimension
+            })
+            self._filas_totales += filas
+        self._compactar_si_hace_falta()
+        return segmento
+
+    def agregar_documento(self, doc_id, chunks, metadata=None, modelo=None):
+        return self.agregar_documentos([(doc_id, chunks, metadata)], modelo)
+
+    def eliminar_documento(self, doc_id):
+        """Quitar un documento (sus filas quedan muertas hasta la próxima compactación)"""
+        with self._lock:
+            entrada = self.documento(doc_id)
+            self._registrar({'op': 'delete', 'doc_id': doc_id})
+            self._filas_muertas += entrada['chunks']
+        self._compactar_si_hace_falta()
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def _lector(self, segmento):
+        with self._lock:
+            if segmento not in self._lectores:
+                self._lectores[segmento] = LectorRun(self._ruta_segmento(segmento))
+            return self._lectores[segmento]
+
+    def _indice_hashes(self, segmento):
+        with self._lock:
+            if segmento not in self._hashes:
+                ruta = self._ruta_segmento(segmento) + SUFIJO_HASHES
+                self._hashes[segmento] = np.load(ruta, mmap_mode='r', allow_pickle=False)
+            return self._hashes[segmento]
+
+    def documentos(self):
+        return dict(self.manifiesto['documents'])
+
+    def documento(self, doc_id):
+        """Entrada del manifiesto de un documento (segmento, filas, metadata)"""
+        try:
+            return self.manifiesto['documents'][doc_id]
+        except KeyError:
+            raise KeyError(f"Documento no encontrado en el corpus: {doc_id}") from None
+
+    def vectores_documento(self, doc_id):
+        """
+        Vectores del documento como vista memory-mapped (sin copia). La vista
+        sigue siendo válida aunque una compactación retire el segmento.
+        """
+        with self._lock:  # Documento y lector juntos: la compactación no puede retirar el segmento en medio
+            entrada = self.documento(doc_id)
+            inicio, fin = entrada['rows']
+            return self._lector(entrada['segment']).matriz[inicio:fin]
+
+    def chunks_documento(self, doc_id):
+        """Registros de chunks del documento (texto + metadata), leídos de a uno"""
+        with self._lock:
+            entrada = self.documento(doc_id)
+            inicio, fin = entrada['rows']
+            return self._lector(entrada['segment']).iterar_chunks(inicio, fin)
+
+    def _instantanea_segmentos(self, con_hashes=False):
+        """
+        [(segmento, rangos vivos {doc_id: (inicio, fin)}, lector, índice de hashes)]
+        tomados juntos bajo el lock. Una compactación en segundo plano puede
+        retirar segmentos mientras se recorren; el lector y el índice ya abiertos
+        siguen leyendo del mapeo aunque sus archivos se borren.
+        """
+        with self._lock:
+            documentos = self.manifiesto['documents']
+            return [
+                (segmento,
+                 {doc_id: rango for doc_id, rango in info['documents'].items()
+                  if documentos.get(doc_id, {}).get('segment') == segmento},
+                 self._lector(segmento),
+                 self._indice_hashes(segmento) if con_hashes else None)
+                for segmento, info in self.manifiesto['segments'].items()
+            ]
+
+    def buscar_hash(self, contenido_hash=None, texto=None):
+        """Chunks vivos con ese hash de contenido: [(doc_id, registro)]"""
+        contenido_hash = contenido_hash or hash_contenido(texto)
+        clave = np.array(bytes.fromhex(contenido_hash), dtype=f'S{BYTES_HASH}')
+        encontrados = []
+        for _, vivos, lector, indice in self._instantanea_segmentos(con_hashes=True):
+            inicio = np.searchsorted(indice['hash'], clave, side='left')
+            fin = np.searchsorted(indice['hash'], clave, side='right')
+            for fila in indice['row'][inicio:fin]:
+                fila = int(fila)
+                doc_id = next((d for d, (desde, hasta) in vivos.items() if desde <= fila < hasta), None)
+                if doc_id:
+                    encontrados.append((doc_id, lector.chunk(fila)))
+        return encontrados
+
+    def iterar_segmentos_vivos(self):
+        """(segmento, filas vivas, matriz memmap) por segmento, para búsquedas sobre todo el corpus"""
+        for segmento, vivos, lector, _ in self._instantanea_segmentos():
+            if vivos:
+                yield segmento, np.concatenate([np.arange(inicio, fin) for inicio, fin in vivos.values()]), lector.matriz
+
+    # ------------------------------------------------------------------
+    # Compactación
+    # ------------------------------------------------------------------
+
+    def _filas_vivas(self, segmento):
+        info = self.manifiesto['segments'][segmento]
+        return sum(fin - inicio for doc_id, (inicio, fin) in info['documents'].items()
+                   if self.manifiesto['documents'].get(doc_id, {}).get('segment') == segmento)
+
+    def segmentos_a_compactar(self, umbral=UMBRAL_FILAS_MUERTAS, min_filas=MIN_FILAS_SEGMENTO,
+                              max_segmentos=MAX_SEGMENTOS):
+        """
+        Segmentos con muchas filas muertas, más los pequeños si hay más de
+        uno; si aun así quedarían más de `max_segmentos`, también los más
+        chicos hasta dejar la mitad (fusión por tamaños, como un LSM).
+        """
+        with self._lock:
+            candidatos, pequenos, resto = [], [], []
+            for segmento, info in self.manifiesto['segments'].items():
+                vivas = self._filas_vivas(segmento)
+                if info['rows'] == 0 or vivas == 0 or 1 - vivas / info['rows'] >= umbral:
+                    candidatos.append(segmento)
+                elif info['rows'] < min_filas:
+                    pequenos.append(segmento)
+                else:
+                    resto.append(segmento)
+            if len(pequenos) <= 1:
+                resto += pequenos
+                pequenos = []
+            quedarian = len(resto) + (1 if candidatos or pequenos else 0)
+            if quedarian > max_segmentos:
+                resto.sort(key=lambda segmento: self.manifiesto['segments'][segmento]['rows'])
+                pequenos += resto[:quedarian - max_segmentos // 2]
+            return candidatos + pequenos
+
+    def necesita_compactar(self):
+        """Chequeo O(1) tras cada operación: demasiados segmentos o demasiadas filas muertas"""
+        with self._lock:
+            return (len(self.manifiesto['segments']) > MAX_SEGMENTOS
+                    or (self._filas_totales and self._filas_muertas / self._filas_totales >= UMBRAL_FILAS_MUERTAS))
+
+    def _compactar_si_hace_falta(self):
+        if self.compactacion_automatica and self.necesita_compactar():
+            self.compactar_en_segundo_plano()
+
+    def compactar(self, segmentos=None):
+        """
+        Reescribir los documentos vivos de `segmentos` en un segmento nuevo y
+        borrar los anteriores. Las ingestas concurrentes siguen funcionando:
+        solo se reasignan los documentos que no cambiaron durante la copia.
+        """
+        with self._lock_compactacion:
+            return self._compactar(segmentos if segmentos is not None else self.segmentos_a_compactar())
+
+    def _compactar(self, segmentos):
+        with self._lock:
+            segmentos = [segmento for segmento in segmentos if segmento in self.manifiesto['segments']]
+            documentos = [(doc_id, dict(entrada)) for doc_id, entrada in self.manifiesto['documents'].items()
+                          if entrada['segment'] in segmentos]
+            modelo = self.manifiesto['model']
+
+        reporte = {'segments_in': len(segmentos), 'documents': len(documentos), 'segment_out': None}
+        if not segmentos:
+            return reporte
+
+        if documentos:
+            a_copiar = []
+            for doc_id, entrada in documentos:
+                inicio, fin = entrada['rows']
+                lector = self._lector(entrada['segment'])
+                registros = []
+                for fila, chunk in zip(range(inicio, fin), lector.iterar_chunks(inicio, fin)):
+                    chunk['embedding']['vector'] = lector.matriz[fila]
+                    registros.append(chunk)
+                a_copiar.append((doc_id, registros, entrada['metadata']))
+            nuevo, rangos, filas = self._escribir_segmento(a_copiar, modelo)
+        else:
+            nuevo, rangos, filas = None, {}, 0
+
+        with self._lock:
+            reasignados = {}
+            for doc_id, entrada in documentos:
+                actual = self.manifiesto['documents'].get(doc_id)
+                # Si el documento se reingestó o eliminó durante la copia, se respeta lo nuevo
+                if actual and actual['segment'] == entrada['segment'] and actual['version'] == entrada['version']:
+                    reasignados[doc_id] = {'segment': nuevo, 'rows': rangos[doc_id]}
+            self._registrar({
+                'op': 'compact',
+                'segment': nuevo,
+                'info': {'rows': filas, 'documents': rangos, 'created': datetime.now().isoformat()} if nuevo else None,
+                'documents': reasignados,
+                'removed': segmentos
+            })
+            self._filas_totales = sum(info['rows'] for info in self.manifiesto['segments'].values())
+            self._filas_muertas = self._filas_totales - sum(
+                self._filas_vivas(segmento) for segmento in self.manifiesto['segments']
+            )
+            self.checkpoint()  # Antes de borrar archivos: ningún snapshot ni log vuelve a apuntar a ellos
+
+            # Los lectores retirados no se cierran: vistas y generadores entregados antes de la
+            # compactación siguen leyendo del mapeo (el SO libera los archivos al soltarlos)
+            for segmento in segmentos:
+                self._lectores.pop(segmento, None)
+                self._hashes.pop(segmento, None)
+            self._pendientes_borrar.extend(segmentos)
+            self._borrar_retirados()
+
+        reporte['segment_out'] = nuevo
+        reporte['rows_out'] = filas
+        return reporte
+
+    def _borrar_retirados(self):
+        """Borrar archivos de segmentos retirados; donde el SO lo impide (Windows, aún mapeados) se reintenta luego"""
+        pendientes = []
+        for segmento in self._pendientes_borrar:
+            base = self._ruta_segmento(segmento)
+            for archivo in archivos_run(base) + [base + SUFIJO_HASHES]:
+                try:
+                    if os.path.exists(archivo):
+                        os.remove(archivo)
+                except OSError:
+                    pendientes.append(segmento)
+                    break
+        self._pendientes_borrar = pendientes
+
+    def compactar_en_segundo_plano(self):
+        """Lanzar la compactación en un hilo (una a la vez); devuelve el hilo"""
+        with self._lock:
+            if self._hilo_compactacion and self._hilo_compactacion.is_alive():
+                return self._hilo_compactacion
+            self._hilo_compactacion = threading.Thread(
+                target=self.compactar, name='recuiva-compactacion', daemon=True
+            )
+            self._hilo_compactacion.start()
+            return self._hilo_compactacion
+
+    # ------------------------------------------------------------------
+    # Estado
+    # ------------------------------------------------------------------
+
+    def estadisticas(self):
+        with self._lock:
+            filas = sum(info['rows'] for info in self.manifiesto['segments'].values())
+            vivas = sum(self._filas_vivas(segmento) for segmento in self.manifiesto['segments'])
+            return {
+                'documents': len(self.manifiesto['documents']),
+                'segments': len(self.manifiesto['segments']),
+                'rows': filas,
+                'live_rows': vivas,
+                'dead_rows': filas - vivas,
+                'model': self.manifiesto['model'],
+                'dimension': self.manifiesto['dimension']
+            }
+
+    def cerrar(self):
+        if self._hilo_compactacion:
+            self._hilo_compactacion.join()
+        with self._lock:
+            for lector in self._lectores.values():
+                lector.cerrar()
+            self._lectores.clear()
+            self._hashes.clear()
+            self._borrar_retirados()
+            if not self._archivo_log.closed:
+                self._archivo_log.close()
+
+
+def firma_corpus(directorio=DIRECTORIO_CORPUS):
+    """
+    (mtime, tamaño) del snapshot y del log del corpus, o None si el corpus no
+    existe. Cambia con cada operación, la haga este proceso u otro.
+    """
+    firma = []
+    for archivo in (ARCHIVO_MANIFIESTO, ARCHIVO_LOG):
+        try:
+            estado = os.stat(os.path.join(directorio, archivo))
+        except FileNotFoundError:
+            firma.append(None)
+        else:
+            firma.append((estado.st_mtime_ns, estado.st_size))
+    return None if firma == [None, None] else tuple(firma)
+
+
+_almacen_global = None
+_lock_global = threading.Lock()
+
+
+def obtener_almacen():
+    """Corpus compartido por todo el proceso"""
+    global _almacen_global
+    with _lock_global:
+        if _almacen_global is None:
+            _almacen_global = AlmacenCorpus()
+        return _almacen_global
+
+
+def _benchmark(documentos, chunks_por_documento):
+    """Tiempo de cada ingesta a medida que crece el corpus (debería mantenerse plano)"""
+    import shutil
+    import tempfile
+    from embeddings_mock import chunks_sinteticos, generar_vectores_mock
+    from streaming_embeddings import registro_chunk
+
+    directorio = tempfile.mkdtemp(prefix='recuiva_corpus_')
+    try:
+        almacen = AlmacenCorpus(directorio)
+        tiempos = []
+        for d in range(documentos):
+            chunks = list(chunks_sinteticos(chunks_por_documento, inicio=d * chunks_por_documento))
+            vectores = generar_vectores_mock([c['content'] for c in chunks])
+            registros = [registro_chunk(c, v) for c, v in zip(chunks, vectores)]
+            inicio = time.perf_counter()
+            almacen.agregar_documento(f'doc_{d:05d}', registros, modelo='mock')
+            tiempos.append(time.perf_counter() - inicio)
+
+        cuarto = max(1, documentos // 4)
+        print(f"📚 {documentos} documentos x {chunks_por_documento} chunks")
+        print(f"   Ingesta (primer cuarto): {1000 * np.median(tiempos[:cuarto]):.1f} ms/documento")
+        print(f"   Ingesta (último cuarto): {1000 * np.median(tiempos[-cuarto:]):.1f} ms/documento")
+
+        inicio = time.perf_counter()
+        encontrados = almacen.buscar_hash(texto=registros[0]['content'])
+        print(f"   Búsqueda por hash: {1000 * (time.perf_counter() - inicio):.1f} ms ({len(encontrados)} resultado)")
+
+        for d in range(0, documentos, 2):
+            almacen.eliminar_documento(f'doc_{d:05d}')
+        inicio = time.perf_counter()
+        reporte = almacen.compactar()
+        print(f"   Compactación tras eliminar la mitad: {time.perf_counter() - inicio:.2f}s "
+              f"({reporte['segments_in']} segmentos -> 1)")
+        print(f"   Estado: {almacen.estadisticas()}")
+        almacen.cerrar()
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def _ejecutar_comando(almacen, args):
+    if args.comando == 'agregar':
+        from lector_runs import abrir_run
+        with abrir_run(args.run) as run:
+            registros = []
+            for fila, chunk in enumerate(run.iterar_chunks()):
+                chunk['embedding']['vector'] = run.matriz[fila]
+                registros.append(chunk)
+            doc_id = args.doc_id or os.path.basename(args.run).split('.')[0]
+            segmento = almacen.agregar_documento(doc_id, registros, {'source': os.path.basename(args.run)},
+                                                 run.metadata.get('model'))
+        print(f"✅ {doc_id}: {len(registros)} chunks en {segmento}")
+    elif args.comando == 'eliminar':
+        almacen.eliminar_documento(args.doc_id)
+        print(f"🗑️  {args.doc_id} eliminado (se libera al compactar)")
+    elif args.comando == 'compactar':
+        reporte = almacen.compactar()
+        print(f"🧹 {reporte['segments_in']} segmentos compactados -> {reporte['segment_out'] or 'ninguno'}")
+    elif args.comando == 'buscar-hash':
+        for doc_id, chunk in almacen.buscar_hash(texto=args.texto):
+            print(f"   {doc_id} / {chunk['chunk_id']}: {chunk['content'][:80]}")
+
+    estadisticas = almacen.estadisticas()
+    print(f"📚 Corpus: {estadisticas['documents']} documentos, {estadisticas['segments']} segmentos, "
+          f"{estadisticas['live_rows']} filas vivas, {estadisticas['dead_rows']} muertas")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recuiva - almacén de corpus")
+    sub = parser.add_subparsers(dest='comando', required=True)
+    sub.add_parser('estado', help='Documentos, segmentos y filas muertas')
+    p_agregar = sub.add_parser('agregar', help='Ingestar un run de output/')
+    p_agregar.add_argument('run')
+    p_agregar.add_argument('--doc-id', help='Por defecto: nombre del run')
+    p_eliminar = sub.add_parser('eliminar', help='Eliminar un documento')
+    p_eliminar.add_argument('doc_id')
+    sub.add_parser('compactar', help='Reescribir segmentos con filas muertas')
+    p_hash = sub.add_parser('buscar-hash', help='Buscar un chunk por su contenido')
+    p_hash.add_argument('texto')
+    p_bench = sub.add_parser('benchmark', help='Costo de ingesta a medida que crece el corpus')
+    p_bench.add_argument('--documentos', type=int, default=200)
+    p_bench.add_argument('--chunks', type=int, default=200)
+    args = parser.parse_args()
+
+    if args.comando == 'benchmark':
+        _benchmark(args.documentos, args.chunks)
+        return 0
+
+    try:
+        _ejecutar_comando(obtener_almacen(), args)
+    except (KeyError, ValueError) as e:
+        print(f"❌ {e.args[0] if e.args else e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Archivo Comprimido de Runs (columnar, por bloques)
+Modo archivo para runs viejos de output/: un solo archivo `<base>.rca` con
+los vectores en bloques de filas comprimidos por separado (float16 por
+defecto, cada bloque guardado por columnas y con los bytes reordenados por
+significancia antes de comprimir, que es lo que deja comprimir bien a
+floats) y el texto + metadata de los chunks como otra columna comprimida
+con los mismos bloques. Al final del archivo va un índice de bloques, así
+leer un rango de chunks solo descomprime los bloques que lo cubren.
+Usa zstd si `zstandard` está instalado; si no, deflate (zlib).
+
+Uso:
+    python archivo_runs.py archivar output/run.json [--borrar-original] [--precision float32]
+    python archivo_runs.py extraer output/run.rca [--formato json]
+    python archivo_runs.py benchmark [--chunks 20000 | --run output/run.json]
+
+Fecha: 18/10/2026
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from escritor_json import escritura_atomica, serializar
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+VERSION_ARCHIVO = 'recuiva-archive-v1'
+SUFIJO_ARCHIVO = '.rca'
+MAGIA = b'RCVA1\n'
+FILAS_POR_BLOQUE = int(os.environ.get('RECUIVA_ARCHIVO_FILAS_BLOQUE', '1024'))
+CODEC_POR_DEFECTO = 'zstd' if ZSTD_AVAILABLE else 'zlib'
+NIVELES = {'zstd': 9, 'zlib': 6}
+PRECISIONES_ARCHIVO = ('float16', 'float32')
+
+
+def _comprimir(datos, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=NIVELES['zstd']).compress(datos)
+    return zlib.compress(datos, NIVELES['zlib'])
+
+
+def _descomprimir(datos, codec):
+    if codec == 'zstd':
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("El archivo usa zstd: instalar con `pip install zstandard`")
+        return zstandard.ZstdDecompressor().decompress(datos)
+    return zlib.decompress(datos)
+
+
+def reordenar_bytes(bloque):
+    """
+    (n, d) -> bytes agrupados por columna y, dentro de la columna, por byte
+    de cada valor (primero todos los bytes bajos, luego los altos...)
+    """
+    columnas = np.ascontiguousarray(bloque.T)
+    return np.ascontiguousarray(columnas.view(np.uint8).reshape(-1, bloque.dtype.itemsize).T).tobytes()
+
+
+def restaurar_bytes(datos, forma, tipo):
+    """Inversa de reordenar_bytes"""
+    tipo = np.dtype(tipo)
+    planos = np.frombuffer(datos, dtype=np.uint8).reshape(tipo.itemsize, -1)
+    columnas = np.ascontiguousarray(planos.T).view(tipo).reshape(forma[1], forma[0])
+    return np.ascontiguousarray(columnas.T)
+
+
+def _matriz_y_chunks(ruta):
+    """(resultado sin chunks, clave de chunks, registros sin vector, matriz float32) de cualquier run"""
+    from lector_runs import abrir_run
+
+    with abrir_run(ruta) as run:
+        chunks = list(run.iterar_chunks())
+        matriz = np.asarray(run.matriz, dtype=np.float32)
+        escalas = np.array([chunk['embedding'].get('scale', 1.0) for chunk in chunks], dtype=np.float32)
+        cabecera = {k: v for k, v in run.cabecera.items() if k not in ('format', 'vectors', 'chunks_key')}
+        clave = run.cabecera['chunks_key']
+    if len(chunks):
+        matriz = matriz * escalas[:, None]  # Runs int8: deshacer la escala
+    for chunk in chunks:
+        chunk.pop('row', None)
+        chunk.pop('offset', None)
+        chunk['embedding'] = {k: v for k, v in chunk['embedding'].items() if k not in ('scale', 'dtype')}
+    return cabecera, clave, chunks, matriz
+
+
+def archivar_run(ruta, destino=None, precision='float16', codec=CODEC_POR_DEFECTO, filas_por_bloque=FILAS_POR_BLOQUE):
+    """
+    Escribir el run `ruta` (JSON o .npy + manifiesto) como archivo columnar
+    comprimido. Devuelve la ruta del archivo .rca.
+    """
+    from formato_binario import ruta_base_run
+
+    if precision not in PRECISIONES_ARCHIVO:
+        raise ValueError(f"Precisión no soportada: {precision} (opciones: {', '.join(PRECISIONES_ARCHIVO)})")
+    cabecera, clave, chunks, matriz = _matriz_y_chunks(ruta)
+    destino = destino or ruta_base_run(ruta) + SUFIJO_ARCHIVO
+    matriz = matriz.astype(precision)
+
+    bloques = []
+    with escritura_atomica(destino) as f:
+        f.write(MAGIA)
+        for inicio in range(0, len(chunks), filas_por_bloque):
+            fin = min(inicio + filas_por_bloque, len(chunks))
+            entrada = {'rows': [inicio, fin]}
+            for columna, datos in (
+                ('vectors', reordenar_bytes(matriz[inicio:fin])),
+                ('text', b'\n'.join(serializar(chunk) for chunk in chunks[inicio:fin]))
+            ):
+                comprimido = _comprimir(datos, codec)
+                entrada[columna] = [f.tell(), len(comprimido)]
+                f.write(comprimido)
+            bloques.append(entrada)
+
+        pie = serializar({
+            'format': VERSION_ARCHIVO,
+            'codec': codec,
+            'chunks_key': clave,
+            'rows': len(chunks),
+            'dimension': int(matriz.shape[1]) if matriz.ndim == 2 and len(chunks) else 0,
+            'dtype': precision,
+            'block_rows': filas_por_bloque,
+            'blocks': bloques,
+            'header': cabecera
+        })
+        f.write(pie)
+        f.write(len(pie).to_bytes(8, 'little') + MAGIA)
+    return destino
+
+
+class LectorArchivo:
+    """Lectura parcial de un .rca: solo se descomprimen los bloques del rango pedido"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._archivo = open(ruta, 'rb')
+        self._archivo.seek(-(8 + len(MAGIA)), os.SEEK_END)
+        cola = self._archivo.read()
+        if cola[8:] != MAGIA:
+            self.cerrar()
+            raise ValueError(f"Archivo .rca no reconocido: {ruta}")
+        largo_pie = int.from_bytes(cola[:8], 'little')
+        self._archivo.seek(-(8 + len(MAGIA) + largo_pie), os.SEEK_END)
+        self.pie = json.loads(self._archivo.read(largo_pie))
+        self.inicios = np.array([bloque['rows'][0] for bloque in self.pie['blocks']], dtype=np.int64)
+
+    def __len__(self):
+        return self.pie['rows']
+
+    @property
+    def cabecera(self):
+        return self.pie['header']
+
+    @property
+    def metadata(self):
+        return self.cabecera.get('metadata', {})
+
+    def _leer(self, offset, largo):
+        self._archivo.seek(offset)
+        return _descomprimir(self._archivo.read(largo), self.pie['codec'])
+
+    def _bloques(self, inicio, fin):
+        primero = max(int(np.searchsorted(self.inicios, inicio, side='right')) - 1, 0)
+        for bloque in self.pie['blocks'][primero:]:
+            if bloque['rows'][0] >= fin:
+                break
+            yield bloque
+
+    def vectores(self, inicio=0, fin=None):
+        """Matriz float32 (fin - inicio, d) de las filas [inicio, fin)"""
+        fin = len(self) if fin is None else min(fin, len(self))
+        partes = []
+        for bloque in self._bloques(inicio, fin):
+            a, b = bloque['rows']
+            matriz = restaurar_bytes(self._leer(*bloque['vectors']), (b - a, self.pie['dimension']), self.pie['dtype'])
+            partes.append(matriz[max(inicio - a, 0):fin - a])
+        if not partes:
+            return np.zeros((0, self.pie['dimension']), dtype=np.float32)
+        return np.concatenate(partes).astype(np.float32, copy=False)
+
+    def chunks(self, inicio=0, fin=None):
+        """Registros de chunks (texto + metadata, sin vector) de las filas [inicio, fin)"""
+        fin = len(self) if fin is None else min(fin, len(self))
+        registros = []
+        for bloque in self._bloques(inicio, fin):
+            a, _ = bloque['rows']
+            lineas = self._leer(*bloque['text']).split(b'\n')
+            registros.extend(json.loads(linea) for linea in lineas[max(inicio - a, 0):fin - a])
+        return registros
+
+    def resultado(self):
+        """Resultado completo con el esquema original (vectores float32 dentro de cada chunk)"""
+        chunks = self.chunks()
+        for chunk, vector in zip(chunks, self.vectores()):
+            chunk['embedding']['vector'] = vector
+        return dict(self.cabecera, **{self.pie['chunks_key']: chunks})
+
+    def cerrar(self):
+        self._archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+def extraer_archivo(ruta, formato='npy'):
+    """Restaurar un .rca como run de output/ (.npy + manifiesto o JSON); devuelve la ruta"""
+    from escritor_json import guardar_json_streaming
+    from formato_binario import guardar_run_binario, ruta_base_run
+
+    base = ruta[:-len(SUFIJO_ARCHIVO)] if ruta.endswith(SUFIJO_ARCHIVO) else ruta_base_run(ruta)
+    with LectorArchivo(ruta) as archivo:
+        resultado = archivo.resultado()
+    if formato == 'json':
+        return guardar_json_streaming(base + '.json', resultado)
+    return guardar_run_binario(resultado, base)
+
+
+def benchmark_archivo(ruta_json, precision='float16', codec=CODEC_POR_DEFECTO):
+    """Tamaño y velocidad de lectura: JSON original vs .rca (completo y un rango de 100 chunks)"""
+    from formato_binario import clave_chunks
+
+    inicio = time.perf_counter()
+    with open(ruta_json, 'r', encoding='utf-8') as f:
+        datos = json.load(f)
+    original = np.array([c['embedding']['vector'] for c in datos[clave_chunks(datos)]], dtype=np.float32)
+    lectura_json = time.perf_counter() - inicio
+
+    destino = ruta_json[:-len('.json')] + SUFIJO_ARCHIVO
+    inicio = time.perf_counter()
+    archivar_run(ruta_json, destino, precision, codec)
+    escritura = time.perf_counter() - inicio
+
+    with LectorArchivo(destino) as archivo:
+        inicio = time.perf_counter()
+        matriz = archivo.vectores()
+        lectura_vectores = time.perf_counter() - inicio
+        archivo.chunks()
+        lectura = time.perf_counter() - inicio
+        medio = len(archivo) // 2
+        inicio = time.perf_counter()
+        archivo.vectores(medio, medio + 100)
+        archivo.chunks(medio, medio + 100)
+        rango = time.perf_counter() - inicio
+
+    return {
+        'chunks': len(original),
+        'codec': codec,
+        'dtype': precision,
+        'json_bytes': os.path.getsize(ruta_json),
+        'archive_bytes': os.path.getsize(destino),
+        'json_load_s': round(lectura_json, 4),
+        'archive_write_s': round(escritura, 4),
+        'archive_load_s': round(lectura, 4),
+        'vectors_load_s': round(lectura_vectores, 4),
+        'decode_mb_s': round(matriz.nbytes / 1024 / 1024 / lectura_vectores, 1) if lectura_vectores else None,
+        'range_100_ms': round(rango * 1000, 3),
+        'max_abs_error': float(np.abs(matriz - original).max()) if len(original) else 0.0
+    }
+
+
+def _ejecutar_benchmark(args):
+    import shutil
+    import tempfile
+
+    directorio = tempfile.mkdtemp(prefix='recuiva_archivo_')
+    try:
+        if args.run:
+            ruta_json = os.path.join(directorio, 'run.json')
+            shutil.copy(args.run, ruta_json)
+        else:
+            from escritor_json import guardar_json_streaming
+            from formato_binario import _resultado_sintetico
+            ruta_json = guardar_json_streaming(os.path.join(directorio, 'run.json'), _resultado_sintetico(args.chunks))
+
+        print(f"🗜️  codec {CODEC_POR_DEFECTO}{'' if ZSTD_AVAILABLE else ' (zstandard no instalado)'}")
+        for precision in PRECISIONES_ARCHIVO:
+            r = benchmark_archivo(ruta_json, precision)
+            print(f"   {precision}: {r['chunks']:,} chunks  JSON {r['json_bytes'] / 1024 / 1024:.1f} MB -> "
+                  f".rca {r['archive_bytes'] / 1024 / 1024:.2f} MB (x{r['json_bytes'] / r['archive_bytes']:.1f})")
+            print(f"      lectura JSON {r['json_load_s']:.2f}s | .rca completo {r['archive_load_s']:.3f}s "
+                  f"(vectores {r['vectors_load_s']:.3f}s, {r['decode_mb_s']} MB/s en float32) | rango de 100 chunks {r['range_100_ms']:.2f} ms | "
+                  f"error máx {r['max_abs_error']:.2e} | escritura {r['archive_write_s']:.2f}s")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recuiva - archivo comprimido de runs")
+    sub = parser.add_subparsers(dest='comando', required=True)
+    p_archivar = sub.add_parser('archivar', help='Comprimir un run de output/')
+    p_archivar.add_argument('run')
+    p_archivar.add_argument('--precision', choices=PRECISIONES_ARCHIVO, default='float16')
+    p_archivar.add_argument('--borrar-original', action='store_true')
+    p_extraer = sub.add_parser('extraer', help='Restaurar un .rca como run')
+    p_extraer.add_argument('archivo')
+    p_extraer.add_argument('--formato', choices=('npy', 'json'), default='npy')
+    p_bench = sub.add_parser('benchmark', help='Tamaño y velocidad frente al JSON')
+    p_bench.add_argument('--chunks', type=int, default=20000)
+    p_bench.add_argument('--run', help='Usar un JSON de output/ en lugar de uno sintético')
+    args = parser.parse_args()
+
+    if args.comando == 'benchmark':
+        _ejecutar_benchmark(args)
+        return 0
+
+    if args.comando == 'archivar':
+        from formato_binario import archivos_run
+
+        originales = [args.run] if args.run.endswith('.json') else archivos_run(args.run)
+        originales = [ruta for ruta in originales if os.path.exists(ruta)]
+        tamaño = sum(os.path.getsize(ruta) for ruta in originales)
+        destino = archivar_run(args.run, precision=args.precision)
+        print(f"🗜️  {os.path.basename(destino)}: {tamaño / 1024:.1f} KB -> {os.path.getsize(destino) / 1024:.1f} KB")
+        if args.borrar_original:
+            for ruta in originales:
+                os.remove(ruta)
+            print(f"🗑️  Originales eliminados ({len(originales)} archivos)")
+    else:
+        destino = extraer_archivo(args.archivo, args.formato)
+        print(f"📂 Restaurado: {destino}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
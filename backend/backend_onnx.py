@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Backend ONNX Runtime (CPU)
+Ejecuta all-MiniLM-L6-v2 exportado a ONNX (fp32 o cuantizado a int8)
+desde una ruta local, con la misma salida que sentence-transformers:
+mean pooling sobre la máscara de atención + normalización L2.
+
+Uso:
+    python backend_onnx.py exportar              # genera model.onnx y model_int8.onnx
+    python backend_onnx.py verificar [--int8]    # compara cosenos contra PyTorch
+
+Fecha: 18/10/2026
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+try:
+    import onnxruntime as ort
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+DIRECTORIO_ONNX = os.environ.get(
+    'RECUIVA_ONNX_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modelos_onnx')
+)
+ARCHIVO_FP32 = 'model.onnx'
+ARCHIVO_INT8 = 'model_int8.onnx'
+MAX_SEQ_LENGTH = 256
+TOLERANCIA_COSENO = 0.02
+
+
+def ruta_modelo_onnx(nombre):
+    """Directorio local con el modelo exportado y su tokenizer"""
+    return os.path.join(DIRECTORIO_ONNX, nombre.replace('/', '__'))
+
+
+class CodificadorONNX:
+    """Codificador compatible con la parte de SentenceTransformer que usa Recuiva"""
+
+    def __init__(self, ruta, cuantizado=False, hilos=None):
+        if not ONNX_AVAILABLE:
+            raise ImportError("onnxruntime no está instalado")
+        from transformers import AutoTokenizer
+
+        archivo = os.path.join(ruta, ARCHIVO_INT8 if cuantizado else ARCHIVO_FP32)
+        if not os.path.exists(archivo):
+            raise FileNotFoundError(
+                f"Modelo ONNX no encontrado: {archivo} (ejecuta: python backend_onnx.py exportar)"
+            )
+
+        opciones = ort.SessionOptions()
+        opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        hilos = hilos or int(os.environ.get('RECUIVA_ONNX_HILOS', '0'))
+        if hilos:
+            opciones.intra_op_num_threads = hilos
+        self.sesion = ort.InferenceSession(archivo, opciones, providers=['CPUExecutionProvider'])
+        self.entradas = {e.name for e in self.sesion.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(ruta)
+        self.max_seq_length = MAX_SEQ_LENGTH
+        self.cuantizado = cuantizado
+
+    def get_sentence_embedding_dimension(self):
+        return self.sesion.get_outputs()[0].shape[-1]
+
+    def encode(self, textos, batch_size=32, show_progress_bar=False, **kwargs):
+        """Embeddings normalizados float32, en el orden de `textos`"""
+        textos = list(textos)
+        salida = []
+        for inicio in range(0, len(textos), batch_size):
+            tokens = self.tokenizer(
+                textos[inicio:inicio + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors='np'
+            )
+            feed = {nombre: tokens[nombre].astype(np.int64) for nombre in self.entradas if nombre in tokens}
+            ultima_capa = self.sesion.run(None, feed)[0]
+
+            # Mean pooling sobre los tokens reales (igual que sentence-transformers)
+            mascara = tokens['attention_mask'][..., None].astype(np.float32)
+            suma = (ultima_capa * mascara).sum(axis=1)
+            vectores = suma / np.clip(mascara.sum(axis=1), 1e-9, None)
+            vectores /= np.clip(np.linalg.norm(vectores, axis=1, keepdims=True), 1e-12, None)
+            salida.append(vectores.astype(np.float32))
+
+        if not salida:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.concatenate(salida)
+
+
+def exportar_modelo_onnx(nombre, ruta_destino=None):
+    """Exportar el transformer base a ONNX fp32 y generar la versión int8 dinámica"""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    ruta_destino = ruta_destino or ruta_modelo_onnx(nombre)
+    os.makedirs(ruta_destino, exist_ok=True)
+    repo = nombre if '/' in nombre else f'sentence-transformers/{nombre}'
+
+    print(f"📦 Exportando {repo} a ONNX...")
+    tokenizer = AutoTokenizer.from_pretrained(repo)
+    modelo = AutoModel.from_pretrained(repo)
+    modelo.eval()
+
+    ejemplo = tokenizer(["Active Recall es una técnica de estudio"], return_tensors='pt')
+    nombres_entrada = [n for n in ('input_ids', 'attention_mask', 'token_type_ids') if n in ejemplo]
+    ejes = {n: {0: 'batch', 1: 'secuencia'} for n in nombres_entrada}
+    ejes['last_hidden_state'] = {0: 'batch', 1: 'secuencia'}
+
+    ruta_fp32 = os.path.join(ruta_destino, ARCHIVO_FP32)
+    with torch.no_grad():
+        torch.onnx.export(
+            modelo,
+            tuple(ejemplo[n] for n in nombres_entrada),
+            ruta_fp32,
+            input_names=nombres_entrada,
+            output_names=['last_hidden_state'],
+            dynamic_axes=ejes,
+            opset_version=14
+        )
+    tokenizer.save_pretrained(ruta_destino)
+
+    ruta_int8 = os.path.join(ruta_destino, ARCHIVO_INT8)
+    print("🗜️  Cuantizando pesos a int8...")
+    quantize_dynamic(ruta_fp32, ruta_int8, weight_type=QuantType.QInt8)
+
+    print(f"✅ Modelos ONNX en: {ruta_destino}")
+    return ruta_fp32, ruta_int8
+
+
+def verificar_equivalencia(textos, nombre='all-MiniLM-L6-v2', cuantizado=True, tolerancia=TOLERANCIA_COSENO):
+    """
+    Comparar ONNX contra PyTorch: coseno entre el vector de cada backend
+    para el mismo texto y diferencia máxima en la matriz de similaridades.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    referencia = SentenceTransformer(nombre, device='cpu').encode(textos, normalize_embeddings=True)
+    onnx = CodificadorONNX(ruta_modelo_onnx(nombre), cuantizado=cuantizado).encode(textos)
+
+    coseno_mismo_texto = np.sum(referencia * onnx, axis=1)
+    diferencia_matriz = np.abs(referencia @ referencia.T - onnx @ onnx.T)
+
+    reporte = {
+        'backend': 'onnx-int8' if cuantizado else 'onnx-fp32',
+        'textos': len(textos),
+        'coseno_minimo': float(coseno_mismo_texto.min()),
+        'max_diferencia_similaridad': float(diferencia_matriz.max()),
+        'tolerancia': tolerancia
+    }
+    reporte['ok'] = (1 - reporte['coseno_minimo'] <= tolerancia
+                     and reporte['max_diferencia_similaridad'] <= tolerancia)
+    return reporte
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recuiva - backend ONNX Runtime")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p_exportar = sub.add_parser('exportar', help='Exportar el modelo a ONNX fp32 + int8')
+    p_exportar.add_argument('--modelo', default='all-MiniLM-L6-v2')
+
+    p_verificar = sub.add_parser('verificar', help='Comparar ONNX contra PyTorch')
+    p_verificar.add_argument('--modelo', default='all-MiniLM-L6-v2')
+    p_verificar.add_argument('--int8', action='store_true', help='Verificar la versión cuantizada')
+    p_verificar.add_argument('--archivo', help='TXT con un texto por línea (por defecto: sample_active_recall.txt)')
+    p_verificar.add_argument('--tolerancia', type=float, default=TOLERANCIA_COSENO)
+
+    args = parser.parse_args()
+
+    if args.comando == 'exportar':
+        exportar_modelo_onnx(args.modelo)
+        return 0
+
+    archivo = args.archivo or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_active_recall.txt')
+    with open(archivo, 'r', encoding='utf-8') as f:
+        textos = [linea.strip() for linea in f if len(linea.strip()) >= 20]
+
+    reporte = verificar_equivalencia(textos, args.modelo, cuantizado=args.int8, tolerancia=args.tolerancia)
+    print(f"🔍 Backend: {reporte['backend']} ({reporte['textos']} textos)")
+    print(f"   Coseno mínimo vs PyTorch: {reporte['coseno_minimo']:.5f}")
+    print(f"   Máx. diferencia en similaridades: {reporte['max_diferencia_similaridad']:.5f}")
+    print(f"   {'✅ Dentro' if reporte['ok'] else '❌ Fuera'} de la tolerancia ({reporte['tolerancia']})")
+    return 0 if reporte['ok'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
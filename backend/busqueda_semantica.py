@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Búsqueda Semántica sobre Materiales
+El estudiante escribe una pregunta y salta al pasaje del material: la
+consulta se codifica con el mismo encoder que los chunks (con una cache
+LRU en memoria de consultas recientes), se compara contra la matriz
+normalizada (exacta) o contra un IndiceIVF (corpus grandes), y se
+devuelven los chunks ordenados con su posición en el material y el
+desglose de latencia de cada etapa.
+
+Uso:
+    python busqueda_semantica.py "¿qué es la repetición espaciada?" [--run output/run.manifest.ndjson] [--k 5]
+    python busqueda_semantica.py "..." --corpus [--doc-id apuntes_bio]
+    python busqueda_semantica.py --benchmark 100000
+
+Fecha: 18/10/2026
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from cache_embeddings import normalizar_texto
+from indice_ann import NPROBE, IndiceIVF
+from matriz_embeddings import MatrizEmbeddings
+
+TAMANO_CACHE_CONSULTAS = int(os.environ.get('RECUIVA_BUSQUEDA_CACHE', '1024'))
+MIN_FILAS_ANN = int(os.environ.get('RECUIVA_BUSQUEDA_ANN_MIN', '50000'))   # Desde aquí se arma un IndiceIVF
+MAX_FILAS_FILTRADAS_EXACTAS = 20000   # Si los filtros dejan menos filas, búsqueda exacta sobre ellas
+K_MAXIMO = 100
+FILTROS_VALIDOS = ('doc_id', 'type', 'min_score')
+LARGO_PREVIEW = 300
+
+
+class CacheConsultas:
+    """LRU en memoria: texto normalizado de la consulta -> vector unitario"""
+
+    def __init__(self, capacidad=TAMANO_CACHE_CONSULTAS):
+        self.capacidad = capacidad
+        self._vectores = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            vector = self._vectores.get(clave)
+            if vector is None:
+                self.fallos += 1
+                return None
+            self._vectores.move_to_end(clave)
+            self.aciertos += 1
+            return vector
+
+    def guardar(self, clave, vector):
+        with self._lock:
+            self._vectores[clave] = vector
+            self._vectores.move_to_end(clave)
+            while len(self._vectores) > self.capacidad:
+                self._vectores.popitem(last=False)
+
+    def estadisticas(self):
+        total = self.aciertos + self.fallos
+        return {
+            'entries': len(self._vectores),
+            'capacity': self.capacidad,
+            'hits': self.aciertos,
+            'misses': self.fallos,
+            'hit_rate': round(self.aciertos / total, 4) if total else 0.0
+        }
+
+
+def _modelo_actual():
+    from registro_modelos import encoder_disponible, identificador_modelo
+    return identificador_modelo() if encoder_disponible() else 'mock'
+
+
+class BuscadorSemantico:
+    """
+    Búsqueda sobre una MatrizEmbeddings y los chunks de cada fila (sin
+    vectores). `documentos`: doc_id por fila (para filtrar y reportar).
+    `codificar(textos) -> (n, d)`: por defecto el encoder del registro; el
+    `modelo` con el que se generaron los chunks debe ser el actual.
+    """
+
+    def __init__(self, matriz, chunks, documentos=None, modelo=None, codificar=None, usar_ann='auto', nprobe=NPROBE):
+        if len(chunks) != len(matriz):
+            raise ValueError(f"{len(chunks)} chunks para {len(matriz)} vectores")
+        if modelo and modelo != _modelo_actual():
+            raise ValueError(f"Los chunks se codificaron con {modelo} y el encoder actual es {_modelo_actual()}")
+        self.matriz = matriz
+        self.chunks = chunks
+        self.modelo = modelo
+        self.nprobe = nprobe
+        self.cache = CacheConsultas()
+        self._codificar = codificar
+        self._lock = threading.Lock()
+
+        documentos = documentos if documentos is not None else [''] * len(chunks)
+        self.nombres_documentos, self.documentos = np.unique(np.asarray(documentos, dtype=str), return_inverse=True)
+        self.nombres_tipos, self.tipos = np.unique(
+            np.asarray([chunk.get('type', '') for chunk in chunks], dtype=str), return_inverse=True
+        )
+
+        self.indice = None
+        if usar_ann is True or (usar_ann == 'auto' and len(matriz) >= MIN_FILAS_ANN):
+            self.indice = IndiceIVF.construir(matriz)
+
+    @classmethod
+    def desde_run(cls, ruta, **opciones):
+        """Buscador sobre un run de output/ (el documento es el nombre del run)"""
+        from formato_binario import ruta_base_run
+        from lector_runs import abrir_run
+
+        with abrir_run(ruta) as run:
+            chunks = [{k: v for k, v in chunk.items() if k != 'embedding'} for chunk in run.iterar_chunks()]
+            modelo = run.metadata.get('model')
+        doc_id = os.path.basename(ruta_base_run(ruta))
+        return cls(MatrizEmbeddings.desde_run(ruta), chunks, [doc_id] * len(chunks), modelo, **opciones)
+
+    @classmethod
+    def desde_almacen(cls, almacen, **opciones):
+        """Buscador sobre todos los documentos vivos del almacén de corpus"""
+        matrices, chunks, documentos = [], [], []
+        for doc_id in almacen.documentos():
+            matrices.append(almacen.vectores_documento(doc_id))
+            for chunk in almacen.chunks_documento(doc_id):
+                chunks.append({k: v for k, v in chunk.items() if k != 'embedding'})
+                documentos.append(doc_id)
+        if not matrices:
+            raise ValueError("El almacén de corpus no tiene documentos")
+        matriz = MatrizEmbeddings(np.concatenate(matrices), [chunk['id'] for chunk in chunks])
+        return cls(matriz, chunks, documentos, almacen.manifiesto.get('model'), **opciones)
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def _codificador(self):
+        with self._lock:
+            if self._codificar is None:
+                from servidor_embeddings import codificador_por_defecto
+                self._codificar = codificador_por_defecto()
+            return self._codificar
+
+    def vector_consulta(self, consulta):
+        """(vector unitario de la consulta, vino de la cache)"""
+        clave = normalizar_texto(consulta).lower()
+        vector = self.cache.obtener(clave)
+        if vector is not None:
+            return vector, True
+        vector = np.array(self._codificador()([consulta])[0], dtype=np.float32)
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        self.cache.guardar(clave, vector)
+        return vector, False
+
+    def _filas_permitidas(self, filtros):
+        """Máscara bool de filas que pasan los filtros doc_id/type (None = todas)"""
+        mascara = None
+        for campo, nombres, codigos in (('doc_id', self.nombres_documentos, self.documentos),
+                                        ('type', self.nombres_tipos, self.tipos)):
+            valores = filtros.get(campo)
+            if valores is None:
+                continue
+            valores = [valores] if isinstance(valores, str) else list(valores)
+            permitidos = np.flatnonzero(np.isin(nombres, valores))
+            parcial = np.isin(codigos, permitidos)
+            mascara = parcial if mascara is None else mascara & parcial
+        return mascara
+
+    def buscar(self, consulta, k=5, filtros=None):
+        """
+        Los k chunks más relevantes para `consulta`:
+        {'results': [{rank, id, doc_id, score, type, content, span, row}], 'timings_ms': {...}, ...}.
+        `filtros`: doc_id (uno o lista), type (uno o lista), min_score.
+        """
+        inicio = time.perf_counter()
+        if not isinstance(consulta, str) or not consulta.strip():
+            raise ValueError("La consulta no puede estar vacía")
+        filtros = filtros or {}
+        desconocidos = set(filtros) - set(FILTROS_VALIDOS)
+        if desconocidos:
+            raise ValueError(f"Filtros no soportados: {', '.join(sorted(desconocidos))}")
+        k = max(1, min(int(k), K_MAXIMO))
+
+        vector, acierto = self.vector_consulta(consulta)
+        t_codificacion = time.perf_counter()
+
+        mascara = self._filas_permitidas(filtros)
+        t_filtros = time.perf_counter()
+
+        permitidas = len(self.matriz) if mascara is None else int(mascara.sum())
+        if self.indice is not None and permitidas > MAX_FILAS_FILTRADAS_EXACTAS:
+            metodo = 'ann'
+            encontrados = self.indice.buscar(vector, k, self.nprobe, mascara)
+        else:
+            metodo = 'exact'
+            filas = None if mascara is None else np.flatnonzero(mascara)
+            encontrados = self.matriz.mas_similares(vector, k, filas) if permitidas else []
+        t_puntajes = time.perf_counter()
+
+        minimo = None if filtros.get('min_score') is None else float(filtros['min_score'])
+        resultados = []
+        for puntaje, fila in encontrados:
+            if minimo is not None and puntaje < minimo:
+                break
+            chunk = self.chunks[fila]
+            resultados.append({
+                'rank': len(resultados) + 1,
+                'id': chunk['id'],
+                'doc_id': str(self.nombres_documentos[self.documentos[fila]]),
+                'score': round(puntaje, 4),
+                'type': chunk.get('type'),
+                'content': chunk['content'][:LARGO_PREVIEW],
+                'span': chunk.get('span'),
+                'row': int(fila)
+            })
+        fin = time.perf_counter()
+
+        return {
+            'query': consulta,
+            'k': k,
+            'method': metodo,
+            'cache_hit': acierto,
+            'candidates': permitidas,
+            'results': resultados,
+            'timings_ms': {
+                'encode': round(1000 * (t_codificacion - inicio), 3),
+                'filter': round(1000 * (t_filtros - t_codificacion), 3),
+                'score': round(1000 * (t_puntajes - t_filtros), 3),
+                'format': round(1000 * (fin - t_puntajes), 3),
+                'total': round(1000 * (fin - inicio), 3)
+            }
+        }
+
+    def estadisticas(self):
+        return {
+            'chunks': len(self.matriz),
+            'documents': len(self.nombres_documentos),
+            'model': self.modelo,
+            'ann': self.indice.estadisticas() if self.indice is not None else None,
+            'query_cache': self.cache.estadisticas()
+        }
+
+
+_buscador_global = None
+_firma_buscador = None   # (firma del corpus, (run, mtime) o None) con la que se armó _buscador_global
+_lock_global = threading.Lock()
+
+
+def _run_mas_reciente():
+    """(ruta, mtime) del run más reciente de output/, o None"""
+    from lector_runs import listar_runs
+
+    ruta = next(iter(listar_runs()), None)
+    return (ruta, os.path.getmtime(ruta)) if ruta else None
+
+
+def obtener_buscador(codificar=None):
+    """
+    Buscador compartido por el proceso: el almacén de corpus si existe y tiene
+    documentos; si no, el run más reciente de output/. Se rearma cuando cambia
+    el corpus (snapshot o log, aunque lo escriba otro proceso) o, sin corpus,
+    cuando aparece un run más nuevo.
+    """
+    global _buscador_global, _firma_buscador
+    from almacen_corpus import firma_corpus, obtener_almacen
+
+    with _lock_global:
+        firma = firma_corpus()
+        if _buscador_global is not None and _firma_buscador[0] == firma:
+            run = _firma_buscador[1]
+            if run is None or run == _run_mas_reciente():
+                return _buscador_global
+
+        buscador, run = None, None
+        if firma is not None:  # Sin directorio de corpus no se crea uno (puede ser de solo lectura)
+            almacen = obtener_almacen()
+            almacen.refrescar()
+            if almacen.documentos():
+                buscador = BuscadorSemantico.desde_almacen(almacen, codificar=codificar)
+        if buscador is None:
+            run = _run_mas_reciente()
+            if run is None:
+                raise FileNotFoundError("No hay materiales para buscar: corpus vacío y sin runs en output/")
+            buscador = BuscadorSemantico.desde_run(run[0], codificar=codificar)
+        _buscador_global, _firma_buscador = buscador, (firma, run)
+        return buscador
+
+
+def _benchmark(total, consultas=500, repetidas=0.3):
+    """p50/p95 de búsqueda sobre `total` chunks mock agrupados (exacta e IVF), con consultas repetidas"""
+    from embeddings_mock import vectores_por_temas
+
+    vectores, _ = vectores_por_temas(total + consultas, temas=max(10, total // 200), ruido=2.0)
+    vectores_consulta = {f'consulta {i}': vectores[total + i] for i in range(consultas)}
+    matriz = MatrizEmbeddings(vectores[:total], [f'chunk_{i}' for i in range(total)], normalizada=True)
+    chunks = [{'id': f'chunk_{i}', 'content': f'Chunk sintético {i}', 'type': 'synthetic'} for i in range(total)]
+    documentos = [f'doc_{i // 500:04d}' for i in range(total)]
+
+    def codificar(textos):
+        return np.stack([vectores_consulta[t] for t in textos])
+
+    rng = np.random.default_rng(0)
+    secuencia = [f'consulta {int(rng.integers(consultas * repetidas))}' if rng.random() < repetidas
+                 else f'consulta {i}' for i in range(consultas)]
+    print(f"🔎 {total:,} chunks, {consultas} consultas (~{repetidas:.0%} repetidas)")
+    exactos = {}
+    for usar_ann in (False, True):
+        inicio = time.perf_counter()
+        buscador = BuscadorSemantico(matriz, chunks, documentos, codificar=codificar, usar_ann=usar_ann)
+        preparacion = time.perf_counter() - inicio
+        totales, puntajes, recall = [], [], []
+        for consulta in secuencia:
+            respuesta = buscador.buscar(consulta, 10)
+            totales.append(respuesta['timings_ms']['total'])
+            puntajes.append(respuesta['timings_ms']['score'])
+            ids = {resultado['id'] for resultado in respuesta['results']}
+            recall.append(len(ids & exactos[consulta]) / 10 if usar_ann else 1.0)
+            exactos.setdefault(consulta, ids)
+        filtrada = buscador.buscar(secuencia[0], 10, {'doc_id': ['doc_0001', 'doc_0002']})
+        print(f"   {'IVF' if usar_ann else 'Exacta'} (preparación {preparacion:.2f}s): "
+              f"total p50 {np.median(totales):.2f} ms, p95 {np.percentile(totales, 95):.2f} ms; "
+              f"puntajes p95 {np.percentile(puntajes, 95):.2f} ms; recall@10 {np.mean(recall):.3f}; con filtro doc_id {filtrada['timings_ms']['total']:.2f} ms")
+    print(f"   Cache de consultas: {buscador.cache.estadisticas()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recuiva - búsqueda semántica sobre materiales")
+    parser.add_argument('consulta', nargs='?')
+    parser.add_argument('--run', help="Run de output/ (por defecto: corpus si tiene documentos, si no el run más reciente)")
+    parser.add_argument('--corpus', action='store_true', help="Buscar en el almacén de corpus")
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--doc-id', action='append', help="Filtrar por documento (repetible)")
+    parser.add_argument('--tipo', action='append', help="Filtrar por tipo de chunk (repetible)")
+    parser.add_argument('--min-score', type=float)
+    parser.add_argument('--benchmark', type=int, metavar='CHUNKS', help="Latencia con vectores mock")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        _benchmark(args.benchmark)
+        return 0
+    if not args.consulta:
+        parser.error("indicar una consulta (o --benchmark)")
+
+    try:
+        if args.run:
+            buscador = BuscadorSemantico.desde_run(args.run)
+        elif args.corpus:
+            from almacen_corpus import obtener_almacen
+            buscador = BuscadorSemantico.desde_almacen(obtener_almacen())
+        else:
+            buscador = obtener_buscador()
+        filtros = {clave: valor for clave, valor in
+                   (('doc_id', args.doc_id), ('type', args.tipo), ('min_score', args.min_score)) if valor is not None}
+        respuesta = buscador.buscar(args.consulta, args.k, filtros)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    print(f"🔎 \"{args.consulta}\" ({respuesta['method']}, {respuesta['candidates']:,} chunks, "
+          f"cache {'✅' if respuesta['cache_hit'] else '❌'}): {respuesta['timings_ms']}")
+    for resultado in respuesta['results']:
+        posicion = f" [{resultado['span'][0]}:{resultado['span'][1]}]" if resultado['span'] else ""
+        print(f"   {resultado['rank']}. {resultado['score']:.4f}  {resultado['doc_id']}/{resultado['id']}{posicion}: "
+              f"{resultado['content'][:80]}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
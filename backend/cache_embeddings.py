@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Cache de Embeddings en Disco
+Cache persistente direccionada por contenido: la clave es
+(modelo, hash del texto normalizado del chunk). Los vectores se guardan
+en binario (float32) en SQLite y se expulsan por LRU al superar el tope.
+
+Fecha: 18/10/2026
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+DIRECTORIO_CACHE = os.environ.get(
+    'RECUIVA_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'embeddings')
+)
+MAX_MB_POR_DEFECTO = float(os.environ.get('RECUIVA_CACHE_MAX_MB', '512'))
+
+_LOTE_SQL = 500  # Máximo de parámetros por consulta IN (...)
+
+
+def normalizar_texto(texto):
+    """Normalizar un chunk para que cambios de espacios/Unicode no invaliden la cache"""
+    texto = unicodedata.normalize('NFC', texto)
+    return re.sub(r'\s+', ' ', texto).strip()
+
+
+def clave_chunk(nombre_modelo, texto):
+    """Clave de contenido: sha256(modelo + texto normalizado)"""
+    contenido = f"{nombre_modelo}\x00{normalizar_texto(texto)}".encode('utf-8')
+    return hashlib.sha256(contenido).hexdigest()
+
+
+class CacheEmbeddings:
+    """Cache LRU persistente de vectores por (modelo, texto)"""
+
+    def __init__(self, directorio=DIRECTORIO_CACHE, max_mb=MAX_MB_POR_DEFECTO):
+        os.makedirs(directorio, exist_ok=True)
+        self.ruta = os.path.join(directorio, 'embeddings_cache.sqlite')
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self._inicio_ejecucion = (0, 0, 0)  # (aciertos, fallos, expulsiones) al empezar la ejecución actual
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.ruta, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entradas (
+                clave TEXT PRIMARY KEY,
+                modelo TEXT NOT NULL,
+                dimension INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                bytes INTEGER NOT NULL,
+                ultimo_acceso REAL NOT NULL
+            )
+        """)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_entradas_acceso ON entradas(ultimo_acceso)')
+        self._conn.commit()
+        self._bytes_totales = self._conn.execute('SELECT COALESCE(SUM(bytes), 0) FROM entradas').fetchone()[0]
+
+    def _buscar(self, claves):
+        """Devolver {clave: vector} para las claves presentes y refrescar su acceso"""
+        encontrados = {}
+        for inicio in range(0, len(claves), _LOTE_SQL):
+            lote = claves[inicio:inicio + _LOTE_SQL]
+            marcadores = ','.join('?' * len(lote))
+            filas = self._conn.execute(
+                f'SELECT clave, vector FROM entradas WHERE clave IN ({marcadores})', lote
+            ).fetchall()
+            for clave, blob in filas:
+                encontrados[clave] = np.frombuffer(blob, dtype=np.float32)
+
+        if encontrados:
+            ahora = time.time()
+            self._conn.executemany(
+                'UPDATE entradas SET ultimo_acceso = ? WHERE clave = ?',
+                [(ahora, clave) for clave in encontrados]
+            )
+            self._conn.commit()
+        return encontrados
+
+    def _bytes_guardados(self, claves):
+        """Tamaño actual de las claves que ya tienen fila (las que no, no aparecen)"""
+        tamanos = {}
+        for inicio in range(0, len(claves), _LOTE_SQL):
+            lote = claves[inicio:inicio + _LOTE_SQL]
+            marcadores = ','.join('?' * len(lote))
+            tamanos.update(self._conn.execute(
+                f'SELECT clave, bytes FROM entradas WHERE clave IN ({marcadores})', lote
+            ).fetchall())
+        return tamanos
+
+    def _guardar(self, nombre_modelo, claves, vectores):
+        """
+        Insertar o reemplazar las filas. Dos llamadas concurrentes pueden fallar
+        en la misma clave: el total solo suma la diferencia con la fila previa.
+        """
+        ahora = time.time()
+        filas = []
+        for clave, vector in zip(claves, vectores):
+            blob = np.ascontiguousarray(vector, dtype=np.float32).tobytes()
+            filas.append((clave, nombre_modelo, len(vector), blob, len(blob), ahora))
+
+        previos = self._bytes_guardados(list(claves))
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO entradas (clave, modelo, dimension, vector, bytes, ultimo_acceso) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            filas
+        )
+        self._bytes_totales += sum(fila[4] - previos.get(fila[0], 0) for fila in filas)
+        self._expulsar_si_necesario()
+        self._conn.commit()
+
+    def _expulsar_si_necesario(self):
+        """Borrar las entradas menos usadas hasta quedar bajo el tope"""
+        if self._bytes_totales <= self.max_bytes:
+            return
+        exceso = self._bytes_totales - self.max_bytes
+        liberados = 0
+        claves = []
+        for clave, tamano in self._conn.execute('SELECT clave, bytes FROM entradas ORDER BY ultimo_acceso ASC'):
+            claves.append((clave,))
+            liberados += tamano
+            if liberados >= exceso:
+                break
+        self._conn.executemany('DELETE FROM entradas WHERE clave = ?', claves)
+        self._bytes_totales -= liberados
+        self.expulsiones += len(claves)
+
+    def codificar(self, nombre_modelo, textos, funcion_codificar):
+        """
+        Devolver la matriz (n, d) float32 de embeddings para `textos`.
+        Solo se llama a `funcion_codificar` con los textos que no están en cache
+        (cada texto distinto se codifica una sola vez).
+        """
+        claves = [clave_chunk(nombre_modelo, t) for t in textos]
+
+        with self._lock:
+            encontrados = self._buscar(list(set(claves)))
+
+        pendientes = {}
+        for clave, texto in zip(claves, textos):
+            if clave not in encontrados and clave not in pendientes:
+                pendientes[clave] = texto
+
+        if pendientes:
+            nuevos = np.asarray(funcion_codificar(list(pendientes.values())), dtype=np.float32)
+            with self._lock:
+                self._guardar(nombre_modelo, list(pendientes.keys()), nuevos)
+            encontrados.update(zip(pendientes.keys(), nuevos))
+
+        aciertos = sum(1 for clave in claves if clave not in pendientes)
+        fallos = len(claves) - aciertos
+        with self._lock:
+            self.aciertos += aciertos
+            self.fallos += fallos
+
+        if not claves:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([encontrados[clave] for clave in claves])
+
+    def iniciar_ejecucion(self):
+        """
+        Marcar el comienzo de una ejecución: 'last_run' de estadisticas() suma
+        todas las llamadas desde acá (el stream llama a codificar por lote)
+        """
+        with self._lock:
+            self._inicio_ejecucion = (self.aciertos, self.fallos, self.expulsiones)
+
+    def estadisticas(self):
+        """Contadores de la cache para la metadata de salida"""
+        with self._lock:
+            entradas = self._conn.execute('SELECT COUNT(*) FROM entradas').fetchone()[0]
+            return {
+                'hits': self.aciertos,
+                'misses': self.fallos,
+                'last_run': {
+                    'hits': self.aciertos - self._inicio_ejecucion[0],
+                    'misses': self.fallos - self._inicio_ejecucion[1],
+                    'evictions': self.expulsiones - self._inicio_ejecucion[2]
+                },
+                'evictions': self.expulsiones,
+                'entries': entradas,
+                'size_mb': round(self._bytes_totales / (1024 * 1024), 3),
+                'max_mb': round(self.max_bytes / (1024 * 1024), 3)
+            }
+
+    def cerrar(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache_global = None
+_lock_global = threading.Lock()
+
+
+def obtener_cache():
+    """Cache compartida por todo el proceso"""
+    global _cache_global
+    with _lock_global:
+        if _cache_global is None:
+            _cache_global = CacheEmbeddings()
+        return _cache_global
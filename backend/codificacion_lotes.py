@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Codificación por Lotes según Longitud
+Agrupa los chunks en buckets de longitud (en tokens) y elige el tamaño
+de lote con un presupuesto de tokens, para que cada lote tenga poco relleno.
+Devuelve los embeddings en el orden original de los textos.
+
+Fecha: 18/10/2026
+"""
+
+import os
+
+import numpy as np
+
+PRESUPUESTO_TOKENS = int(os.environ.get('RECUIVA_PRESUPUESTO_TOKENS', '8192'))
+MAX_LOTE = int(os.environ.get('RECUIVA_MAX_LOTE', '128'))
+LIMITES_BUCKETS = (32, 64, 128, 256, 512)
+
+
+class CodificadorPorLongitud:
+    """Front-end de `encode` que ordena por longitud y agrupa por bucket"""
+
+    def __init__(self, modelo, presupuesto_tokens=PRESUPUESTO_TOKENS, max_lote=MAX_LOTE,
+                 limites_buckets=LIMITES_BUCKETS):
+        self.modelo = modelo
+        self.presupuesto_tokens = presupuesto_tokens
+        self.max_lote = max_lote
+        self.max_tokens = getattr(modelo, 'max_seq_length', None) or limites_buckets[-1]
+        self.limites_buckets = tuple(l for l in limites_buckets if l < self.max_tokens) + (self.max_tokens,)
+        self.ultimas_estadisticas = {}
+
+    def tamano_lote(self, limite_bucket):
+        """Tamaño de lote para un bucket: cuántas secuencias de ese largo caben en el presupuesto"""
+        return max(1, min(self.max_lote, self.presupuesto_tokens // limite_bucket))
+
+    def configuracion(self):
+        """Parámetros de batching, para logs y metadata de salida"""
+        return {
+            'token_budget': self.presupuesto_tokens,
+            'max_batch_size': self.max_lote,
+            'max_seq_tokens': self.max_tokens,
+            'buckets': {str(limite): self.tamano_lote(limite) for limite in self.limites_buckets},
+            'last_run': dict(self.ultimas_estadisticas)
+        }
+
+    def contar_tokens(self, textos):
+        """Tokens por texto (con tokenizer real si el modelo lo expone, si no estimado)"""
+        tokenizer = getattr(self.modelo, 'tokenizer', None)
+        if tokenizer is not None:
+            ids = tokenizer(list(textos), add_special_tokens=True, truncation=False)['input_ids']
+            longitudes = np.fromiter((len(i) for i in ids), dtype=np.int64, count=len(textos))
+        else:
+            # ~4 caracteres por token + [CLS]/[SEP]
+            longitudes = np.fromiter((len(t) // 4 + 2 for t in textos), dtype=np.int64, count=len(textos))
+        return np.minimum(longitudes, self.max_tokens)
+
+    def planificar_lotes(self, longitudes):
+        """Lista de arrays de índices, uno por lote, ordenados por longitud"""
+        orden = np.argsort(longitudes, kind='stable')
+        buckets = np.searchsorted(self.limites_buckets, longitudes[orden], side='left')
+        buckets = np.minimum(buckets, len(self.limites_buckets) - 1)
+
+        lotes = []
+        for b in np.unique(buckets):
+            indices = orden[buckets == b]
+            tamano = self.tamano_lote(self.limites_buckets[b])
+            for inicio in range(0, len(indices), tamano):
+                lotes.append(indices[inicio:inicio + tamano])
+        return lotes
+
+    def encode(self, textos, show_progress_bar=False, **kwargs):
+        """Misma firma básica que SentenceTransformer.encode, devuelve float32 en orden original"""
+        textos = list(textos)
+        if not textos:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        longitudes = self.contar_tokens(textos)
+        lotes = self.planificar_lotes(longitudes)
+
+        resultado = None
+        tokens_utiles = 0
+        tokens_con_relleno = 0
+        for indices in lotes:
+            vectores = self.modelo.encode(
+                [textos[i] for i in indices],
+                batch_size=len(indices),
+                show_progress_bar=False,
+                **kwargs
+            )
+            if resultado is None:
+                resultado = np.empty((len(textos), vectores.shape[1]), dtype=np.float32)
+            resultado[indices] = vectores
+
+            tokens_utiles += int(longitudes[indices].sum())
+            tokens_con_relleno += int(longitudes[indices].max()) * len(indices)
+
+        self.ultimas_estadisticas = {
+            'texts': len(textos),
+            'batches': len(lotes),
+            'padding_ratio': round(1 - tokens_utiles / tokens_con_relleno, 4) if tokens_con_relleno else 0.0
+        }
+        return resultado
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Deduplicación de Chunks (MinHash-LSH)
+Etapa entre dividir_en_chunks y la codificación: los PDFs repiten
+encabezados, pies de página, marcadores de página y diapositivas enteras.
+Cada chunk recibe una firma MinHash de sus bigramas de palabras (con la
+numeración de páginas y diapositivas normalizada: "Página 3 de 40" =
+"Página 7 de 40"; el resto de los números cuenta); los que se
+parecen lo suficiente a un chunk anterior se colapsan sobre él (el
+canónico guarda los ids de sus duplicados en 'duplicates') y no se
+codifican. Los candidatos salen de las bandas LSH de la firma, así que el
+costo crece linealmente con la cantidad de chunks.
+
+Uso:
+    python deduplicacion.py apuntes.pdf|apuntes.txt [--umbral 0.8]
+    python deduplicacion.py --benchmark 2000
+
+Fecha: 18/10/2026
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+from cache_embeddings import normalizar_texto
+from embeddings_mock import _splitmix64
+
+DEDUPLICAR = os.environ.get('RECUIVA_DEDUP', '1') != '0'
+UMBRAL_JACCARD = float(os.environ.get('RECUIVA_DEDUP_JACCARD', '0.8'))  # Similitud de bigramas para ser duplicado
+TAMANO_SHINGLE = 2
+PERMUTACIONES = 64
+FILAS_POR_BANDA = 4       # 16 bandas de 4: a Jaccard 0.8 un par es candidato con probabilidad > 0.999
+MIN_TOKENS_MINHASH = 8    # Con menos palabras la firma no es confiable: solo duplicados exactos
+_SEMILLAS = np.random.default_rng(20261018).integers(0, 1 << 63, PERMUTACIONES, dtype=np.uint64)
+
+_PATRON_TOKEN = re.compile(r'\w+')
+_PATRON_DIGITOS = re.compile(r'\d+')
+# Numeración de encabezados y pies: "=== PÁGINA n ===", "Página n de m", "pág. n", "Diapositiva n/m"
+_PATRON_NUMERACION = re.compile(
+    r'\b(?:p[áa]gina|p[áa]g|page|diapositiva|slide|l[áa]mina)\.?\s*\d+(?:\s*(?:de|of|/)\s*\d+)?'
+)
+
+
+def configurar_deduplicacion(activa):
+    """Activar o desactivar la etapa (opción --sin-dedup)"""
+    global DEDUPLICAR
+    DEDUPLICAR = activa
+
+
+def deduplicacion_activa():
+    return DEDUPLICAR
+
+
+def tokens_huella(texto):
+    """
+    Palabras en minúsculas. Solo la numeración de páginas y diapositivas pasa
+    a 0: "La tasa fue 5% en 2019" y "... 12% en 2023" no son duplicados.
+    """
+    texto = _PATRON_NUMERACION.sub(
+        lambda m: _PATRON_DIGITOS.sub('0', m.group(0)), normalizar_texto(texto).lower()
+    )
+    return _PATRON_TOKEN.findall(texto)
+
+
+def firma_minhash(tokens):
+    """Firma MinHash (PERMUTACIONES,) uint64 del conjunto de bigramas de palabras"""
+    shingles = {' '.join(tokens[i:i + TAMANO_SHINGLE]) for i in range(len(tokens) - TAMANO_SHINGLE + 1)}
+    hashes = np.frombuffer(
+        b''.join(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest() for s in shingles), dtype=np.uint64
+    )
+    # Una permutación por semilla: splitmix64(x ^ semilla), aritmética uint64 modular
+    with np.errstate(over='ignore'):
+        return _splitmix64(hashes[:, None] ^ _SEMILLAS[None, :]).min(axis=0)
+
+
+def bandas_firma(firma):
+    """Claves LSH: una por banda de FILAS_POR_BANDA valores de la firma"""
+    return [(b, firma[b:b + FILAS_POR_BANDA].tobytes()) for b in range(0, PERMUTACIONES, FILAS_POR_BANDA)]
+
+
+def deduplicar(chunks, umbral=UMBRAL_JACCARD):
+    """
+    (canónicos, reporte): los chunks sin los casi duplicados, en el orden
+    original. Un chunk es duplicado si la similitud de Jaccard estimada de
+    sus bigramas con un canónico anterior es >= `umbral` (o, si es corto,
+    si su texto normalizado es idéntico); el canónico lleva la lista de ids
+    colapsados en 'duplicates'.
+    """
+    inicio = time.perf_counter()
+    canonicos, duplicados_de = [], {}
+    firmas = []                     # firma de cada canónico (None si es corto)
+    cubetas = {}                    # (banda, valores) -> posiciones de canónicos
+    exactos = {}                    # texto normalizado (chunks cortos) -> posición del canónico
+    caracteres_ahorrados = 0
+
+    for chunk in chunks:
+        tokens = tokens_huella(chunk['content'])
+        destino, firma = None, None
+        if len(tokens) < MIN_TOKENS_MINHASH:
+            clave = ' '.join(tokens)
+            destino = exactos.get(clave)
+        else:
+            firma = firma_minhash(tokens)
+            bandas = bandas_firma(firma)
+            candidatos = sorted({p for banda in bandas for p in cubetas.get(banda, ())})
+            if candidatos:
+                jaccard = (np.stack([firmas[p] for p in candidatos]) == firma).mean(axis=1)
+                mejor = int(jaccard.argmax())
+                if jaccard[mejor] >= umbral:
+                    destino = candidatos[mejor]
+
+        if destino is not None:
+            duplicados_de.setdefault(destino, []).append(chunk['id'])
+            caracteres_ahorrados += len(chunk['content'])
+            continue
+
+        posicion = len(canonicos)
+        canonicos.append(chunk)
+        firmas.append(firma)
+        if firma is None:
+            exactos[clave] = posicion
+        else:
+            for banda in bandas:
+                cubetas.setdefault(banda, []).append(posicion)
+
+    for posicion, ids in duplicados_de.items():
+        canonicos[posicion] = dict(canonicos[posicion], duplicates=ids)
+
+    caracteres = sum(len(chunk['content']) for chunk in chunks)
+    reporte = {
+        'method': f'minhash{PERMUTACIONES}-lsh-w{TAMANO_SHINGLE}',
+        'jaccard_threshold': umbral,
+        'chunks_in': len(chunks),
+        'chunks_out': len(canonicos),
+        'duplicates': len(chunks) - len(canonicos),
+        'chars_in': caracteres,
+        'chars_saved': caracteres_ahorrados,
+        'saved_ratio': round(caracteres_ahorrados / caracteres, 4) if caracteres else 0.0,
+        'seconds': round(time.perf_counter() - inicio, 4)
+    }
+    return canonicos, reporte
+
+
+def describir_reporte(reporte):
+    """Línea de resumen para consola/log"""
+    return (f"{reporte['duplicates']} chunks casi duplicados colapsados "
+            f"({reporte['chunks_in']} -> {reporte['chunks_out']}, "
+            f"{reporte['saved_ratio']:.1%} menos texto a codificar)")
+
+
+def _material_sintetico(paginas):
+    """Texto tipo PDF: encabezado y pie en cada página, y diapositivas repetidas con cambios mínimos"""
+    vocabulario = ('memoria recuerdo práctica estudio repaso intervalo concepto pregunta respuesta olvido '
+                   'curva aprendizaje atención evaluación retención contexto ejemplo síntesis lectura esquema '
+                   'hipótesis evidencia neurona sinapsis consolidación sueño examen estrategia error esfuerzo').split()
+    rng = np.random.default_rng(0)
+    cuerpos = [' '.join(rng.choice(vocabulario, 40)).capitalize() + '.' for _ in range(paginas * 3)]
+    partes = []
+    for p in range(paginas):
+        partes.append(f"\n\n=== PÁGINA {p + 1} ===\n")
+        partes.append("Universidad Católica - Curso de Técnicas de Estudio - Unidad 3: Active Recall")
+        partes.extend(cuerpos[3 * p:3 * p + 3])
+        if p % 4 == 0:  # Diapositiva de repaso repetida, a veces con la numeración cambiada
+            partes.append(f"Repaso {p % 3}: la práctica de recuperación fortalece la memoria a largo plazo "
+                          f"más que releer el material, según los estudios de Karpicke y Roediger.")
+        partes.append(f"Página {p + 1} de {paginas} - Material de uso exclusivo para estudiantes del curso")
+    return '\n'.join(partes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recuiva - deduplicación de chunks con MinHash-LSH")
+    parser.add_argument('archivo', nargs='?', help="PDF o TXT a dividir y deduplicar")
+    parser.add_argument('--umbral', type=float, default=UMBRAL_JACCARD, help="Jaccard mínimo de bigramas")
+    parser.add_argument('--benchmark', type=int, metavar='PAGINAS', help="Material sintético con encabezados y pies")
+    args = parser.parse_args()
+
+    from embeddings_local import dividir_en_chunks, leer_pdf
+
+    if args.benchmark:
+        texto = _material_sintetico(args.benchmark)
+    elif args.archivo:
+        if args.archivo.lower().endswith('.pdf'):
+            texto = leer_pdf(args.archivo)
+        else:
+            with open(args.archivo, 'r', encoding='utf-8') as f:
+                texto = f.read()
+    else:
+        parser.error("indicar un archivo o --benchmark")
+
+    chunks = dividir_en_chunks(texto)
+    canonicos, reporte = deduplicar(chunks, args.umbral)
+    print(f"♻️  {describir_reporte(reporte)} en {1000 * reporte['seconds']:.1f} ms "
+          f"({reporte['chunks_in'] / max(reporte['seconds'], 1e-9):,.0f} chunks/s)")
+    for chunk in [c for c in canonicos if 'duplicates' in c][:5]:
+        print(f"   {chunk['id']} ({len(chunk['duplicates'])} duplicados): {chunk['content'][:70]}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
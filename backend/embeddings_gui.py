@@ -10,7 +10,6 @@ Fecha: 30/09/2025
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
-import json
 import numpy as np
 from datetime import datetime
 import os
@@ -19,11 +18,27 @@ import threading
 import time
 import re
 
-try:
-    from sentence_transformers import SentenceTransformer
-    TRANSFORMERS_AVAILABLE = True
-except ImportError:
-    TRANSFORMERS_AVAILABLE = False
+from registro_modelos import (
+    TRANSFORMERS_AVAILABLE, MODELO_POR_DEFECTO, obtener_modelo, info_modelo,
+    configurar_backend, encoder_disponible, identificador_modelo, backend_actual
+)
+from backend_onnx import ONNX_AVAILABLE
+from cache_embeddings import obtener_cache
+from codificacion_lotes import CodificadorPorLongitud
+from pool_codificacion import CodificadorMultiproceso
+from embeddings_mock import NOMBRE_MOCK, generar_vectores_mock
+from streaming_embeddings import (
+    TAMANO_LOTE_STREAM, AcumuladorSimilaridades, configurar_top_k, consumir_stream, formatear_pares, top_k_actual
+)
+from agrupamiento_temas import agrupar, configurar_temas, describir_temas, temas_actual
+from deduplicacion import configurar_deduplicacion, deduplicacion_activa, deduplicar, describir_reporte
+from escritor_json import guardar_json_streaming
+from formato_binario import (
+    SUFIJO_MANIFIESTO, archivos_run, configurar_formato_salida, formato_salida_actual, guardar_run_binario
+)
+from precision_embeddings import (
+    almacenamiento_actual, compactar_registros, configurar_almacenamiento, descripcion_almacenamiento
+)
 
 try:
     import PyPDF2
@@ -63,6 +78,7 @@ class RecuivaEmbeddingsGUI:
         self.archivo_seleccionado = None
         self.embeddings_data = None
         self.modelo = None
+        self.codificador = None
         self.preguntas_generadas = []
         self.conceptos_identificados = []
         
@@ -166,6 +182,7 @@ class RecuivaEmbeddingsGUI:
         info_frame.pack(side='right')
         
         transformers_status = "✅ Disponible" if TRANSFORMERS_AVAILABLE else "❌ No instalado"
+        onnx_status = "✅ Disponible" if ONNX_AVAILABLE else "❌ No instalado"
         pdf_status = "✅ Disponible" if PDF_AVAILABLE else "❌ No instalado"
         
         tk.Label(
@@ -175,6 +192,13 @@ class RecuivaEmbeddingsGUI:
             bg='#f0f0f0'
         ).pack()
         
+        tk.Label(
+            info_frame,
+            text=f"onnxruntime: {onnx_status} (encoder: {identificador_modelo()})",
+            font=('Arial', 9),
+            bg='#f0f0f0'
+        ).pack()
+        
         tk.Label(
             info_frame,
             text=f"PyPDF2: {pdf_status}",
@@ -844,82 +868,70 @@ class RecuivaEmbeddingsGUI:
         self.log(f"Generados {len(chunks)} chunks (promedio: {promedio_chars:.0f} caracteres)", "SUCCESS")
         return chunks
         
-    def generar_embeddings(self, chunks):
+    def generar_embeddings(self, chunks, acumulador=None):
         """Generar embeddings reales o mock"""
         
-        if TRANSFORMERS_AVAILABLE:
-            return self.generar_embeddings_reales(chunks)
+        if encoder_disponible():
+            return self.generar_embeddings_reales(chunks, acumulador)
         else:
-            return self.generar_embeddings_mock(chunks)
+            return self.generar_embeddings_mock(chunks, acumulador)
             
-    def generar_embeddings_reales(self, chunks):
+    def actualizar_progreso_embeddings(self, procesados, total):
+        """Progreso entre 40% y 80% a medida que llegan los lotes del stream"""
+        self.progress_principal['value'] = 40 + (procesados / max(total, 1)) * 40
+        self.label_progreso.config(text=f"Procesando embeddings... {procesados}/{total}")
+        self.root.update()
+        
+    def generar_embeddings_reales(self, chunks, acumulador=None):
         """Generar embeddings usando sentence-transformers"""
         self.log("Cargando modelo sentence-transformers...", "INFO")
-        self.label_progreso.config(text="Cargando modelo all-MiniLM-L6-v2...")
+        self.label_progreso.config(text=f"Cargando modelo {identificador_modelo()}...")
         
-        # Cargar modelo
-        self.modelo = SentenceTransformer('all-MiniLM-L6-v2')
+        # Cargar modelo (compartido por proceso: solo el primer clic paga la carga)
+        self.modelo = obtener_modelo(MODELO_POR_DEFECTO)
+        carga = info_modelo(MODELO_POR_DEFECTO)
+        self.log(f"Modelo listo (carga: {carga['load_time_s']:.2f}s, reutilizado {carga['cache_hits']} veces)")
         self.progress_principal['value'] = 40
         self.root.update()
         
-        # Extraer textos
-        textos = [chunk['content'] for chunk in chunks]
-        
-        self.log(f"Generando embeddings para {len(textos)} chunks...")
+        self.log(f"Generando embeddings para {len(chunks)} chunks...")
         self.label_progreso.config(text="Procesando embeddings...")
         
-        # Generar embeddings
-        embeddings = self.modelo.encode(textos, show_progress_bar=False)
-        self.progress_principal['value'] = 80
-        self.root.update()
+        # Generar embeddings por lotes (solo los chunks que no están en cache)
+        cache = obtener_cache()
+        cache.iniciar_ejecucion()
+        self.codificador = CodificadorMultiproceso(
+            CodificadorPorLongitud(self.modelo), MODELO_POR_DEFECTO, backend_actual()
+        )
         
-        # Combinar resultados
-        resultados = []
-        for i, chunk in enumerate(chunks):
-            embedding = embeddings[i]
-            resultados.append({
-                'id': chunk['id'],
-                'content': chunk['content'],
-                'length': chunk['length'],
-                'type': chunk['type'],
-                'embedding': {
-                    'vector': embedding.tolist(),
-                    'dimension': len(embedding),
-                    'norm': float(np.linalg.norm(embedding))
-                }
-            })
+        def codificar(textos):
+            return cache.codificar(identificador_modelo(), textos, self.codificador.encode)
+        
+        resultados = consumir_stream(chunks, codificar, acumulador, self.actualizar_progreso_embeddings,
+                                     tamano_lote=max(TAMANO_LOTE_STREAM, self.codificador.lote_minimo()))
+        
+        lotes = self.codificador.ultimas_estadisticas
+        if lotes.get('processes', 1) > 1:
+            self.log(f"{lotes['shards']} fragmentos en {lotes['processes']} procesos")
+        elif lotes:
+            self.log(f"{lotes['batches']} lotes por longitud (relleno: {lotes['padding_ratio']:.1%})")
+        ejecucion = cache.estadisticas()['last_run']
+        self.log(f"Cache: {ejecucion['hits']} reutilizados, {ejecucion['misses']} codificados")
             
         self.log("Embeddings generados exitosamente", "SUCCESS")
         return resultados
         
-    def generar_embeddings_mock(self, chunks):
+    def generar_embeddings_mock(self, chunks, acumulador=None):
         """Generar embeddings mock"""
         self.log("Generando embeddings mock (384D)...", "WARNING")
         
-        resultados = []
-        np.random.seed(42)
+        # Vectores deterministas derivados del contenido de cada chunk
+        obtener_cache().iniciar_ejecucion()
+
+        def codificar(textos):
+            return obtener_cache().codificar(NOMBRE_MOCK, textos, generar_vectores_mock)
         
-        for i, chunk in enumerate(chunks):
-            # Simular procesamiento
-            if i % 5 == 0:
-                progreso = 40 + (i / len(chunks)) * 40
-                self.progress_principal['value'] = progreso
-                self.root.update()
-                
-            vector = np.random.randn(384)
-            vector = vector / np.linalg.norm(vector)
-            
-            resultados.append({
-                'id': chunk['id'],
-                'content': chunk['content'],
-                'length': chunk['length'],
-                'type': chunk['type'],
-                'embedding': {
-                    'vector': vector.tolist(),
-                    'dimension': 384,
-                    'norm': float(np.linalg.norm(vector))
-                }
-            })
+        resultados = consumir_stream(chunks, codificar, acumulador, self.actualizar_progreso_embeddings)
             
         self.log("Embeddings mock generados", "SUCCESS")
         return resultados
@@ -994,8 +1006,8 @@ class RecuivaEmbeddingsGUI:
         self.log(f"Conceptos identificados: {', '.join(conceptos_finales)}", "SUCCESS")
         return conceptos_finales
         
-    def generar_preguntas_active_recall(self, conceptos, chunks):
-        """Generar preguntas conceptuales de Active Recall"""
+    def generar_preguntas_active_recall(self, conceptos, chunks, temas=None):
+        """Generar preguntas conceptuales de Active Recall (repartidas entre temas si se pasan)"""
         self.log("Generando preguntas conceptuales...")
         
         import random
@@ -1005,6 +1017,10 @@ class RecuivaEmbeddingsGUI:
         # Generar máximo 5 preguntas
         conceptos_seleccionados = conceptos[:5] if len(conceptos) >= 5 else conceptos
         
+        # Temas ya usados: entre los chunks candidatos se prefiere uno de un tema con menos preguntas
+        tema_de = {chunk_id: int(tema) for chunk_id, tema in zip(temas.ids, temas.etiquetas)} if temas else {}
+        preguntas_por_tema = {}
+        
         for i, concepto in enumerate(conceptos_seleccionados, 1):
             # Seleccionar patrón aleatorio
             patron = random.choice(self.question_patterns)
@@ -1012,13 +1028,20 @@ class RecuivaEmbeddingsGUI:
             
             # Buscar chunk más relevante
             chunk_relevante = None
-            for chunk in chunks:
-                if concepto.lower() in chunk['content'].lower():
-                    chunk_relevante = chunk
-                    break
+            candidatos = [chunk for chunk in chunks if concepto.lower() in chunk['content'].lower()]
+            if candidatos:
+                chunk_relevante = min(candidatos, key=lambda c: preguntas_por_tema.get(tema_de.get(c['id']), 0))
+            elif temas and chunks:
+                # Representante del tema con menos preguntas
+                representantes = temas.representantes(1)
+                tema = min(range(temas.k), key=lambda t: (preguntas_por_tema.get(t, 0), -len(representantes[t])))
+                chunk_relevante = chunks[int(representantes[tema][0])] if len(representantes[tema]) else random.choice(chunks)
                     
             if not chunk_relevante and chunks:
                 chunk_relevante = random.choice(chunks)
+            if chunk_relevante and chunk_relevante['id'] in tema_de:
+                tema = tema_de[chunk_relevante['id']]
+                preguntas_por_tema[tema] = preguntas_por_tema.get(tema, 0) + 1
                 
             # Determinar dificultad
             if len(concepto.split()) > 2:
@@ -1036,6 +1059,7 @@ class RecuivaEmbeddingsGUI:
                 'tiempo_estimado': f"{random.randint(3, 8)} min",
                 'chunk_fuente': chunk_relevante['id'] if chunk_relevante else "N/A",
                 'contexto_breve': chunk_relevante['content'][:150] + "..." if chunk_relevante else "",
+                'tema': tema_de.get(chunk_relevante['id']) if chunk_relevante else None,
                 'tipo_evaluacion': "comprension_conceptual",
                 'permite_reformulacion': True
             }
@@ -1111,29 +1135,6 @@ class RecuivaEmbeddingsGUI:
                 'validaciones': []
             }
         
-    def calcular_similaridades(self, embeddings_data):
-        """Calcular similaridades coseno"""
-        self.log("Calculando similaridades coseno...")
-        
-        vectores = np.array([item['embedding']['vector'] for item in embeddings_data])
-        similaridades = np.dot(vectores, vectores.T)
-        
-        # Top-3 pares
-        pares_similares = []
-        for i in range(len(embeddings_data)):
-            for j in range(i+1, len(embeddings_data)):
-                similaridad = similaridades[i][j]
-                pares_similares.append({
-                    'chunk_1': embeddings_data[i]['id'],
-                    'chunk_2': embeddings_data[j]['id'],
-                    'similaridad': float(similaridad),
-                    'content_1': embeddings_data[i]['content'][:60] + "...",
-                    'content_2': embeddings_data[j]['content'][:60] + "..."
-                })
-        
-        pares_similares.sort(key=lambda x: x['similaridad'], reverse=True)
-        return pares_similares[:3]
-        
     def actualizar_metricas(self, embeddings_data, similaridades, tiempo_procesamiento, conceptos=[], preguntas=[], validacion=None):
         """Actualizar las métricas en la UI con validación semántica"""
         
@@ -1194,13 +1195,13 @@ class RecuivaEmbeddingsGUI:
         # Métricas técnicas
         self.metric_tiempo.config(text=f"{tiempo_procesamiento:.1f}s")
         
-        modelo_usado = "all-MiniLM-L6-v2" if TRANSFORMERS_AVAILABLE else "mock"
+        modelo_usado = identificador_modelo() if encoder_disponible() else "mock"
         self.metric_modelo.config(text=modelo_usado)
         
         # Mostrar top similaridades
         self.similarity_area.delete('1.0', 'end')
         
-        similarity_text = "🔝 TOP-3 CHUNKS MÁS SIMILARES:\n\n"
+        similarity_text = f"🔝 TOP-{len(similaridades)} CHUNKS MÁS SIMILARES:\n\n"
         for i, sim in enumerate(similaridades, 1):
             similarity_text += f"{i}. {sim['chunk_1']} ↔ {sim['chunk_2']} "
             similarity_text += f"(similaridad: {sim['similaridad']:.4f})\n"
@@ -1532,26 +1533,47 @@ class RecuivaEmbeddingsGUI:
             self.progress_principal['value'] = 15
             chunks = self.dividir_en_chunks(texto)
             
+            # Casi duplicados (encabezados, pies, diapositivas repetidas): no se codifican
+            reporte_dedup = None
+            if deduplicacion_activa():
+                chunks, reporte_dedup = deduplicar(chunks)
+                self.log(describir_reporte(reporte_dedup))
+            
             # 3. Extraer conceptos para Active Recall
             self.label_progreso.config(text="Extrayendo conceptos clave...")
             self.progress_principal['value'] = 25
             conceptos = self.extraer_conceptos_clave(texto)
             self.conceptos_identificados = conceptos
             
-            # 4. Generar embeddings
+            # 4. Generar embeddings (las similaridades se acumulan lote a lote)
             self.label_progreso.config(text="Generando embeddings...")
-            embeddings_data = self.generar_embeddings(chunks)
+            acumulador = AcumuladorSimilaridades(len(chunks), largo_preview=60)
+            embeddings_data = self.generar_embeddings(chunks, acumulador)
+            
+            # Temas (k-means por mini-lotes): las preguntas se reparten entre ellos
+            temas = None
+            if temas_actual() and embeddings_data:
+                temas = agrupar(acumulador.matriz_embeddings(), temas_actual())
+                self.log(describir_temas(temas))
             
             # 5. Generar preguntas Active Recall
             self.label_progreso.config(text="Generando preguntas conceptuales...")
             self.progress_principal['value'] = 85
-            preguntas = self.generar_preguntas_active_recall(conceptos, chunks)
+            preguntas = self.generar_preguntas_active_recall(conceptos, chunks, temas)
             self.preguntas_generadas = preguntas
             
             # 6. Calcular similaridades
             self.label_progreso.config(text="Calculando similaridades...")
             self.progress_principal['value'] = 90
-            similaridades = self.calcular_similaridades(embeddings_data)
+            self.log("Calculando similaridades coseno...")
+            similaridades = acumulador.top_pares()
+            
+            # Almacenamiento compacto opcional (RECUIVA_PRECISION / RECUIVA_DIMENSION)
+            modo, dimension = almacenamiento_actual()
+            if modo != 'float32' or dimension:
+                compactos = compactar_registros(embeddings_data, acumulador.matriz, modo, dimension)
+                similaridades = formatear_pares(compactos.top_k_pares(top_k_actual()), chunks, 60)
+                self.log(f"Almacenamiento {modo} de {compactos.dimension}D ({compactos.bytes_por_vector} bytes/vector)")
             
             # 7. Validar correspondencia semántica
             self.label_progreso.config(text="Validando correspondencia semántica...")
@@ -1583,6 +1605,8 @@ class RecuivaEmbeddingsGUI:
                 'conceptos': conceptos,
                 'preguntas': preguntas,
                 'validacion': validacion,
+                'deduplicacion': reporte_dedup,
+                'temas': temas,
                 'tiempo': tiempo_total
             }
             
@@ -1609,17 +1633,21 @@ class RecuivaEmbeddingsGUI:
             messagebox.showerror("Error", f"Error procesando archivo:\n{str(e)}")
             
     def guardar_resultados(self):
-        """Guardar resultados en JSON"""
+        """Guardar resultados en JSON o en .npy + manifiesto"""
         if not self.embeddings_data:
             messagebox.showerror("Error", "No hay resultados para guardar")
             return
             
         # Seleccionar ubicación
+        tipos = [("Vectores binarios + manifiesto", f"*{SUFIJO_MANIFIESTO}"), ("JSON files", "*.json")]
+        if formato_salida_actual() == 'json':
+            tipos.reverse()
+        extension = tipos[0][1][1:]
         archivo_salida = filedialog.asksaveasfilename(
             title="Guardar resultados",
-            defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
-            initialname=f"embeddings_recuiva_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            defaultextension=extension,
+            filetypes=tipos + [("All files", "*.*")],
+            initialname=f"embeddings_recuiva_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}"
         )
         
         if archivo_salida:
@@ -1628,7 +1656,12 @@ class RecuivaEmbeddingsGUI:
                 resultado_final = {
                     'metadata': {
                         'timestamp': datetime.now().isoformat(),
-                        'model': 'all-MiniLM-L6-v2' if TRANSFORMERS_AVAILABLE else 'mock',
+                        'model': identificador_modelo() if encoder_disponible() else 'mock',
+                        'model_loading': info_modelo(MODELO_POR_DEFECTO),
+                        'embedding_cache': obtener_cache().estadisticas(),
+                        'batching': self.codificador.configuracion() if self.codificador else None,
+                        'storage': descripcion_almacenamiento(self.embeddings_data['embeddings']),
+                        'deduplication': self.embeddings_data.get('deduplicacion'),
                         'total_chunks': len(self.embeddings_data['embeddings']),
                         'total_concepts': len(self.embeddings_data.get('conceptos', [])),
                         'total_questions': len(self.embeddings_data.get('preguntas', [])),
@@ -1662,11 +1695,19 @@ class RecuivaEmbeddingsGUI:
                     }
                 }
                 
-                with open(archivo_salida, 'w', encoding='utf-8') as f:
-                    json.dump(resultado_final, f, indent=2, ensure_ascii=False)
+                if archivo_salida.endswith('.json'):
+                    guardar_json_streaming(archivo_salida, resultado_final)
+                    archivos = [archivo_salida]
+                else:
+                    archivo_salida = guardar_run_binario(resultado_final, archivo_salida)
+                    archivos = archivos_run(archivo_salida)
+                temas = self.embeddings_data.get('temas')
+                if temas:
+                    ruta_temas = temas.guardar(archivo_salida, self.embeddings_data['embeddings'])
+                    self.log(f"Temas guardados en: {os.path.basename(ruta_temas)}")
                 
                 # Actualizar métrica de tamaño
-                tamaño_kb = os.path.getsize(archivo_salida) / 1024
+                tamaño_kb = sum(os.path.getsize(archivo) for archivo in archivos) / 1024
                 self.metric_json.config(text=f"{tamaño_kb:.1f} KB")
                 
                 self.log(f"Resultados guardados en: {os.path.basename(archivo_salida)}", "SUCCESS")
@@ -1790,6 +1831,22 @@ def main():
 if __name__ == "__main__":
     # Preguntar modo de ejecución
     import sys
+    for arg in sys.argv[1:]:
+        if arg.startswith("--backend="):
+            configurar_backend(arg.split("=", 1)[1])
+        elif arg.startswith("--precision="):
+            configurar_almacenamiento(modo=arg.split("=", 1)[1])
+        elif arg.startswith("--dimension="):
+            configurar_almacenamiento(dimension=int(arg.split("=", 1)[1]))
+        elif arg.startswith("--formato="):
+            configurar_formato_salida(arg.split("=", 1)[1])
+        elif arg.startswith("--top-k="):
+            configurar_top_k(int(arg.split("=", 1)[1]))
+        elif arg.startswith("--temas="):
+            configurar_temas(arg.split("=", 1)[1])
+        elif arg == "--sin-dedup":
+            configurar_deduplicacion(False)
+    
     if len(sys.argv) > 1 and sys.argv[1] == "--console":
         # Modo consola (script original)
         print("Ejecutando en modo consola...")
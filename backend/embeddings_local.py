@@ -9,19 +9,40 @@ Propósito: Demostrar capacidad técnica de procesamiento de embeddings
 para validación semántica en Active Recall
 """
 
-import json
 import numpy as np
 from datetime import datetime
+import argparse
 import os
 import sys
 
-try:
-    from sentence_transformers import SentenceTransformer
-    TRANSFORMERS_AVAILABLE = True
-except ImportError:
-    TRANSFORMERS_AVAILABLE = False
+from registro_modelos import (
+    TRANSFORMERS_AVAILABLE, MODELO_POR_DEFECTO, BACKENDS_VALIDOS, obtener_modelo, info_modelo,
+    configurar_backend, encoder_disponible, identificador_modelo, backend_actual
+)
+from cache_embeddings import obtener_cache
+from codificacion_lotes import CodificadorPorLongitud
+from pool_codificacion import CodificadorMultiproceso
+from embeddings_mock import NOMBRE_MOCK, generar_vectores_mock
+from streaming_embeddings import (
+    TAMANO_LOTE_STREAM, AcumuladorSimilaridades, configurar_top_k, consumir_stream, formatear_pares, top_k_actual
+)
+from agrupamiento_temas import agrupar, configurar_temas, describir_temas, temas_actual
+from deduplicacion import configurar_deduplicacion, deduplicacion_activa, deduplicar, describir_reporte
+from escritor_json import guardar_json_streaming
+from formato_binario import (
+    FORMATOS_SALIDA, SUFIJO_MANIFIESTO, configurar_formato_salida, formato_salida_actual, guardar_run_binario
+)
+from precision_embeddings import (
+    MODOS_PRECISION, almacenamiento_actual, compactar_registros, configurar_almacenamiento,
+    descripcion_almacenamiento
+)
+
+if not TRANSFORMERS_AVAILABLE:
     print("⚠️  sentence-transformers no instalado. Generando embeddings mock...")
 
+# Último codificador usado (su configuración de lotes va en la metadata)
+codificador_actual = None
+
 try:
     import PyPDF2
     PDF_AVAILABLE = True
@@ -89,27 +110,41 @@ def crear_texto_muestra():
 
 def dividir_en_chunks(texto, max_chars=400):
     """
-    Divide el texto en chunks manejables para embeddings
+    Divide el texto en chunks manejables para embeddings.
+    'span' = [inicio, fin) del chunk en `texto` (para saltar al pasaje desde la búsqueda)
     """
     # Limpiar y dividir por párrafos
     parrafos = [p.strip() for p in texto.split('\n') if p.strip()]
     
     chunks = []
     chunk_id = 1
+    cursor = 0
     
     for parrafo in parrafos:
+        inicio_parrafo = texto.find(parrafo, cursor)
+        cursor = inicio_parrafo + len(parrafo)
         if len(parrafo) <= max_chars:
             chunks.append({
                 'id': f'chunk_{chunk_id:03d}',
                 'content': parrafo,
                 'length': len(parrafo),
-                'type': 'paragraph'
+                'type': 'paragraph',
+                'span': [inicio_parrafo, cursor]
             })
             chunk_id += 1
         else:
             # Dividir párrafos largos por oraciones
             oraciones = parrafo.split('.')
             chunk_actual = ""
+            cursor_parrafo = 0
+            
+            def span_de(contenido):
+                nonlocal cursor_parrafo
+                inicio = parrafo.find(contenido.rstrip('.'), cursor_parrafo)
+                if inicio < 0:
+                    return None
+                cursor_parrafo = inicio + len(contenido.rstrip('.'))
+                return [inicio_parrafo + inicio, inicio_parrafo + min(inicio + len(contenido), len(parrafo))]
             
             for oracion in oraciones:
                 if len(chunk_actual + oracion) <= max_chars:
@@ -120,7 +155,8 @@ def dividir_en_chunks(texto, max_chars=400):
                             'id': f'chunk_{chunk_id:03d}',
                             'content': chunk_actual.strip(),
                             'length': len(chunk_actual),
-                            'type': 'split_paragraph'
+                            'type': 'split_paragraph',
+                            'span': span_de(chunk_actual.strip())
                         })
                         chunk_id += 1
                     chunk_actual = oracion + "."
@@ -131,104 +167,72 @@ def dividir_en_chunks(texto, max_chars=400):
                     'id': f'chunk_{chunk_id:03d}',
                     'content': chunk_actual.strip(),
                     'length': len(chunk_actual),
-                    'type': 'split_paragraph'
+                    'type': 'split_paragraph',
+                    'span': span_de(chunk_actual.strip())
                 })
                 chunk_id += 1
     
     return chunks
 
-def generar_embeddings_reales(chunks):
-    """Generar embeddings reales usando sentence-transformers"""
-    print("🤖 Cargando modelo sentence-transformers (all-MiniLM-L6-v2)...")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+def generar_embeddings_reales(chunks, acumulador=None):
+    """Generar embeddings reales usando sentence-transformers (por lotes, en streaming)"""
+    global codificador_actual
+    print(f"🤖 Cargando modelo {identificador_modelo()}...")
+    model = obtener_modelo(MODELO_POR_DEFECTO)
+    carga = info_modelo(MODELO_POR_DEFECTO)
+    print(f"   → Modelo listo (carga: {carga['load_time_s']:.2f}s, reutilizado {carga['cache_hits']} veces)")
     
-    # Extraer textos para procesar
-    textos = [chunk['content'] for chunk in chunks]
+    print(f"🧠 Generando embeddings para {len(chunks)} chunks...")
+    cache = obtener_cache()
+    cache.iniciar_ejecucion()
+    codificador_actual = CodificadorMultiproceso(
+        CodificadorPorLongitud(model), MODELO_POR_DEFECTO, backend_actual()
+    )
     
-    print(f"🧠 Generando embeddings para {len(textos)} chunks...")
-    embeddings = model.encode(textos, show_progress_bar=True)
+    def codificar(textos):
+        return cache.codificar(identificador_modelo(), textos, codificador_actual.encode)
     
-    # Combinar chunks con sus embeddings
-    resultados = []
-    for i, chunk in enumerate(chunks):
-        embedding = embeddings[i]
-        resultados.append({
-            'id': chunk['id'],
-            'content': chunk['content'],
-            'length': chunk['length'],
-            'type': chunk['type'],
-            'embedding': {
-                'vector': embedding.tolist(),
-                'dimension': len(embedding),
-                'norm': float(np.linalg.norm(embedding))
-            }
-        })
+    resultados = consumir_stream(chunks, codificar, acumulador,
+                                 tamano_lote=max(TAMANO_LOTE_STREAM, codificador_actual.lote_minimo()))
+    
+    lotes = codificador_actual.ultimas_estadisticas
+    if lotes.get('processes', 1) > 1:
+        print(f"   → {lotes['shards']} fragmentos en {lotes['processes']} procesos")
+    elif lotes:
+        print(f"   → {lotes['batches']} lotes por longitud (relleno: {lotes['padding_ratio']:.1%})")
+    ejecucion = cache.estadisticas()['last_run']
+    print(f"   → Cache: {ejecucion['hits']} reutilizados, {ejecucion['misses']} codificados")
     
     return resultados
 
-def generar_embeddings_mock(chunks):
+def generar_embeddings_mock(chunks, acumulador=None):
     """Generar embeddings mock (para cuando no está sentence-transformers)"""
     print("🎭 Generando embeddings mock (384 dimensiones)...")
     
-    resultados = []
-    np.random.seed(42)  # Para reproducibilidad
-    
-    for chunk in chunks:
-        # Vector aleatorio normalizado de 384 dimensiones
-        vector = np.random.randn(384)
-        vector = vector / np.linalg.norm(vector)  # Normalizar
-        
-        resultados.append({
-            'id': chunk['id'],
-            'content': chunk['content'],
-            'length': chunk['length'],
-            'type': chunk['type'],
-            'embedding': {
-                'vector': vector.tolist(),
-                'dimension': 384,
-                'norm': float(np.linalg.norm(vector))
-            }
-        })
-    
-    return resultados
+    # Vectores deterministas derivados del contenido de cada chunk
+    obtener_cache().iniciar_ejecucion()
 
-def calcular_similaridades(embeddings_data):
-    """Calcular similaridades coseno entre todos los pares"""
-    print("📊 Calculando similaridades coseno...")
+    def codificar(textos):
+        return obtener_cache().codificar(NOMBRE_MOCK, textos, generar_vectores_mock)
     
-    vectores = np.array([item['embedding']['vector'] for item in embeddings_data])
-    
-    # Matriz de similaridades
-    similaridades = np.dot(vectores, vectores.T)
-    
-    # Encontrar top-3 pares más similares (excluyendo diagonal)
-    pares_similares = []
-    for i in range(len(embeddings_data)):
-        for j in range(i+1, len(embeddings_data)):
-            similaridad = similaridades[i][j]
-            pares_similares.append({
-                'chunk_1': embeddings_data[i]['id'],
-                'chunk_2': embeddings_data[j]['id'],
-                'similaridad': float(similaridad),
-                'content_1': embeddings_data[i]['content'][:80] + "...",
-                'content_2': embeddings_data[j]['content'][:80] + "..."
-            })
-    
-    # Ordenar por similaridad descendente
-    pares_similares.sort(key=lambda x: x['similaridad'], reverse=True)
-    
-    return pares_similares[:3]  # Top-3
+    return consumir_stream(chunks, codificar, acumulador)
 
-def guardar_resultados(embeddings_data, similaridades, output_file='embeddings_output.json'):
-    """Guardar todos los resultados en JSON"""
+def guardar_resultados(embeddings_data, similaridades, output_file='embeddings_output.json', formato=None,
+                       deduplicacion=None):
+    """Guardar todos los resultados en JSON o en .npy + manifiesto (--formato)"""
     resultado_final = {
         'metadata': {
             'timestamp': datetime.now().isoformat(),
-            'model': 'all-MiniLM-L6-v2' if TRANSFORMERS_AVAILABLE else 'mock',
+            'model': identificador_modelo() if encoder_disponible() else 'mock',
             'total_chunks': len(embeddings_data),
             'dimension': embeddings_data[0]['embedding']['dimension'] if embeddings_data else 0,
             'script_version': '1.0',
-            'purpose': 'Recuiva Active Recall - Evidencia técnica embeddings'
+            'purpose': 'Recuiva Active Recall - Evidencia técnica embeddings',
+            'model_loading': info_modelo(MODELO_POR_DEFECTO),
+            'embedding_cache': obtener_cache().estadisticas(),
+            'batching': codificador_actual.configuracion() if codificador_actual else None,
+            'storage': descripcion_almacenamiento(embeddings_data),
+            'deduplication': deduplicacion
         },
         'chunks': embeddings_data,
         'top_similaridades': similaridades,
@@ -240,8 +244,10 @@ def guardar_resultados(embeddings_data, similaridades, output_file='embeddings_o
         }
     }
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(resultado_final, f, indent=2, ensure_ascii=False)
+    if (formato or formato_salida_actual()) == 'json':
+        guardar_json_streaming(output_file, resultado_final)
+    else:
+        output_file = guardar_run_binario(resultado_final, output_file)
     
     print(f"💾 Resultados guardados en: {output_file}")
     return resultado_final
@@ -264,7 +270,7 @@ def mostrar_resumen(resultado):
     
     print(f"\n📑 Tipos de chunk: {', '.join(resumen['tipos_chunk'])}")
     
-    print(f"\n🔝 TOP-3 CHUNKS MÁS SIMILARES:")
+    print(f"\n🔝 TOP-{len(resultado['top_similaridades'])} CHUNKS MÁS SIMILARES:")
     for i, sim in enumerate(resultado['top_similaridades'], 1):
         print(f"{i}. {sim['chunk_1']} ↔ {sim['chunk_2']} (similaridad: {sim['similaridad']:.4f})")
         print(f"   • {sim['content_1']}")
@@ -303,6 +309,12 @@ def main():
         chunks = dividir_en_chunks(texto)
         print(f"   → {len(chunks)} chunks generados")
         
+        # Casi duplicados (encabezados, pies, diapositivas repetidas): no se codifican
+        reporte_dedup = None
+        if deduplicacion_activa():
+            chunks, reporte_dedup = deduplicar(chunks)
+            print(f"♻️  {describir_reporte(reporte_dedup)}")
+        
         # Mostrar preview de chunks
         print(f"\n📋 PREVIEW DE CHUNKS:")
         for i, chunk in enumerate(chunks[:3], 1):
@@ -311,18 +323,36 @@ def main():
         if len(chunks) > 3:
             print(f"   ... y {len(chunks) - 3} chunks más")
         
-        # 3. Generar embeddings
-        if TRANSFORMERS_AVAILABLE:
-            embeddings_data = generar_embeddings_reales(chunks)
+        # 3. Generar embeddings (las similaridades se acumulan lote a lote)
+        acumulador = AcumuladorSimilaridades(len(chunks), largo_preview=80)
+        if encoder_disponible():
+            embeddings_data = generar_embeddings_reales(chunks, acumulador)
         else:
-            embeddings_data = generar_embeddings_mock(chunks)
+            embeddings_data = generar_embeddings_mock(chunks, acumulador)
+        
+        # 4. Top-k similaridades (ya calculadas durante el streaming)
+        print("📊 Calculando similaridades coseno...")
+        similaridades = acumulador.top_pares()
         
-        # 4. Calcular similaridades
-        similaridades = calcular_similaridades(embeddings_data)
+        # Temas: k-means por mini-lotes sobre la matriz ya normalizada
+        temas = None
+        if temas_actual() and embeddings_data:
+            temas = agrupar(acumulador.matriz_embeddings(), temas_actual())
+            print(f"🧩 {describir_temas(temas)}")
+        
+        # Almacenamiento compacto opcional (float16/int8 y/o dimensión truncada)
+        modo, dimension = almacenamiento_actual()
+        if modo != 'float32' or dimension:
+            compactos = compactar_registros(embeddings_data, acumulador.matriz, modo, dimension)
+            similaridades = formatear_pares(compactos.top_k_pares(top_k_actual()), chunks, 80)
+            print(f"🗜️  Almacenamiento {modo} de {compactos.dimension}D ({compactos.bytes_por_vector} bytes/vector)")
         
         # 5. Guardar resultados
-        output_file = f"output/embeddings_recuiva_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        resultado = guardar_resultados(embeddings_data, similaridades, output_file)
+        extension = '.json' if formato_salida_actual() == 'json' else SUFIJO_MANIFIESTO
+        output_file = f"output/embeddings_recuiva_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}"
+        resultado = guardar_resultados(embeddings_data, similaridades, output_file, deduplicacion=reporte_dedup)
+        if temas:
+            print(f"🧩 Temas guardados en: {temas.guardar(output_file, embeddings_data)}")
         
         # 6. Mostrar resumen
         mostrar_resumen(resultado)
@@ -337,9 +367,37 @@ def main():
         return None
 
 if __name__ == "__main__":
-    # Verificar si sentence-transformers está disponible
-    if not TRANSFORMERS_AVAILABLE:
-        print("📦 Para embeddings reales, instala: pip install sentence-transformers")
+    parser = argparse.ArgumentParser(description="Recuiva - Generador de embeddings locales")
+    parser.add_argument('--backend', choices=BACKENDS_VALIDOS,
+                        help="Backend del encoder (por defecto: RECUIVA_BACKEND o pytorch)")
+    parser.add_argument('--precision', choices=MODOS_PRECISION,
+                        help="Precisión de almacenamiento de los vectores (por defecto: float32)")
+    parser.add_argument('--dimension', type=int,
+                        help="Truncar los vectores a sus primeras N dimensiones")
+    parser.add_argument('--formato', choices=FORMATOS_SALIDA,
+                        help="Formato de salida: npy (vectores binarios + manifiesto NDJSON, por defecto) o json")
+    parser.add_argument('--top-k', type=int,
+                        help="Cantidad de pares similares a reportar (por defecto: RECUIVA_TOP_K o 3)")
+    parser.add_argument('--sin-dedup', action='store_true',
+                        help="No colapsar chunks casi duplicados antes de codificar (RECUIVA_DEDUP=0)")
+    parser.add_argument('--temas',
+                        help="Temas a agrupar: auto (por defecto, RECUIVA_TEMAS), un k fijo o 0 para no agrupar")
+    args = parser.parse_args()
+    if args.temas:
+        configurar_temas(args.temas)
+    if args.sin_dedup:
+        configurar_deduplicacion(False)
+    if args.top_k:
+        configurar_top_k(args.top_k)
+    if args.formato:
+        configurar_formato_salida(args.formato)
+    if args.backend:
+        configurar_backend(args.backend)
+    configurar_almacenamiento(args.precision, args.dimension)
+    
+    # Verificar si el backend elegido está disponible
+    if not encoder_disponible():
+        print("📦 Para embeddings reales, instala: pip install sentence-transformers (o onnxruntime para --backend onnx-*)")
         print("🎭 Continuando con embeddings mock para demostración...\n")
     
     output_file = main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Embeddings Mock Deterministas
+Cada vector se deriva del hash del texto del chunk (no del orden ni de
+una semilla global), y los lotes se generan como una sola matriz con
+operaciones vectorizadas. Sirve para pruebas de carga de similaridades,
+índices y almacenamiento con millones de chunks sin el modelo real.
+
+Uso:
+    python embeddings_mock.py --chunks 1000000
+
+Fecha: 18/10/2026
+"""
+
+import argparse
+import hashlib
+import time
+
+import numpy as np
+
+from cache_embeddings import normalizar_texto
+
+DIMENSION_MOCK = 384
+NOMBRE_MOCK = 'mock-hash-v1'  # Clave de cache: distinta a la del mock antiguo con semilla global
+FILAS_POR_BLOQUE = 16384
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+def _splitmix64(x):
+    """Mezclador splitmix64 vectorizado (aritmética uint64 modular)"""
+    x = x + _GOLDEN
+    x = (x ^ (x >> np.uint64(30))) * _MIX_1
+    x = (x ^ (x >> np.uint64(27))) * _MIX_2
+    return x ^ (x >> np.uint64(31))
+
+
+def semillas_textos(textos):
+    """Clave de 64 bits por texto (blake2b del texto normalizado)"""
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(normalizar_texto(t).encode('utf-8'), digest_size=8).digest(), 'little')
+         for t in textos),
+        dtype=np.uint64,
+        count=len(textos)
+    )
+
+
+def vectores_desde_semillas(semillas, dimension=DIMENSION_MOCK):
+    """Matriz (n, dimension) float32 normalizada, gaussiana vía Box-Muller"""
+    pares = (dimension + 1) // 2
+    contadores = np.arange(pares, dtype=np.uint64) * _GOLDEN
+    with np.errstate(over='ignore'):
+        bits = _splitmix64(semillas[:, None] ^ contadores[None, :])
+
+    # Cada uint64 da dos uniformes de 32 bits en (0, 1]
+    escala = np.float32(1.0 / 4294967296.0)
+    u1 = ((bits >> np.uint64(32)).astype(np.float32) + 1.0) * escala
+    u2 = ((bits & np.uint64(0xFFFFFFFF)).astype(np.float32) + 1.0) * escala
+    del bits
+    radio = np.sqrt(np.float32(-2.0) * np.log(u1))
+    angulo = np.float32(2.0 * np.pi) * u2
+
+    vectores = np.empty((len(semillas), 2 * pares), dtype=np.float32)
+    vectores[:, 0::2] = radio * np.cos(angulo)
+    vectores[:, 1::2] = radio * np.sin(angulo)
+    vectores = vectores[:, :dimension]
+    vectores /= np.linalg.norm(vectores, axis=1, keepdims=True)
+    return vectores
+
+
+def generar_vectores_mock(textos, dimension=DIMENSION_MOCK):
+    """Embeddings mock para `textos`: mismo texto -> mismo vector, siempre"""
+    textos = list(textos)
+    if not textos:
+        return np.zeros((0, dimension), dtype=np.float32)
+    salida = np.empty((len(textos), dimension), dtype=np.float32)
+    for inicio in range(0, len(textos), FILAS_POR_BLOQUE):
+        fin = inicio + FILAS_POR_BLOQUE
+        salida[inicio:fin] = vectores_desde_semillas(semillas_textos(textos[inicio:fin]), dimension)
+    return salida
+
+
+def vectores_por_temas(total, temas=1000, ruido=1.0, dimension=DIMENSION_MOCK, semilla=0):
+    """
+    (vectores (total, dimension), tema de cada fila): vectores mock agrupados
+    alrededor de `temas` centros, como los de un corpus real. Con ruido=1.0
+    cada vector queda a coseno ~0.7 de su centro. Para probar índices y
+    clustering, donde los vectores uniformes no tienen estructura.
+    """
+    base = np.uint64(semilla) * _GOLDEN
+    with np.errstate(over='ignore'):
+        centros = vectores_desde_semillas(_splitmix64(np.arange(temas, dtype=np.uint64) + base), dimension)
+        semillas = _splitmix64(np.arange(total, dtype=np.uint64) + base + np.uint64(temas))
+    tema = (semillas % np.uint64(temas)).astype(np.int64)
+    vectores = np.empty((total, dimension), dtype=np.float32)
+    for inicio in range(0, total, FILAS_POR_BLOQUE):
+        fin = inicio + FILAS_POR_BLOQUE
+        bloque = centros[tema[inicio:fin]] + np.float32(ruido) * vectores_desde_semillas(semillas[inicio:fin], dimension)
+        bloque /= np.linalg.norm(bloque, axis=1, keepdims=True)
+        vectores[inicio:fin] = bloque
+    return vectores, tema
+
+
+def chunks_sinteticos(total, inicio=0):
+    """Chunks sintéticos reproducibles para pruebas de carga"""
+    temas = ['active recall', 'repetición espaciada', 'metacognición', 'memoria a largo plazo', 'interleaving']
+    for i in range(inicio, inicio + total):
+        tema = temas[i % len(temas)]
+        contenido = f"Chunk sintético {i}: explicación número {i // len(temas)} sobre {tema} en Recuiva."
+        yield {
+            'id': f'chunk_{i + 1:07d}',
+            'content': contenido,
+            'length': len(contenido),
+            'type': 'synthetic'
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recuiva - benchmark de embeddings mock")
+    parser.add_argument('--chunks', type=int, default=100000)
+    parser.add_argument('--dimension', type=int, default=DIMENSION_MOCK)
+    args = parser.parse_args()
+
+    textos = [chunk['content'] for chunk in chunks_sinteticos(args.chunks)]
+    inicio = time.perf_counter()
+    vectores = generar_vectores_mock(textos, args.dimension)
+    duracion = time.perf_counter() - inicio
+
+    repetidos = generar_vectores_mock(textos[:1000], args.dimension)
+    print(f"🎭 {len(vectores):,} vectores mock de {args.dimension}D en {duracion:.2f}s "
+          f"({len(vectores) / duracion:,.0f} chunks/s)")
+    print(f"   Deterministas: {'✅' if np.array_equal(vectores[:1000], repetidos) else '❌'}")
+
+
+if __name__ == '__main__':
+    main()
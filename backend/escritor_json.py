@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Escritura Streaming de JSON y NDJSON
+Escribe los resultados sección por sección: las listas (chunks, preguntas,
+similaridades) se recorren elemento a elemento desde su iterador, sin armar
+el documento completo en memoria. Usa orjson si está instalado (con
+soporte directo de arrays NumPy) y escribe siempre en un archivo temporal
+que se renombra al terminar, así un error nunca deja un JSON a medias.
+
+Uso:
+    python escritor_json.py [--chunks 100000]
+    (tiempo y memoria extra: documento con listas + json.dump, como antes, vs streaming)
+
+Fecha: 18/10/2026
+"""
+
+import argparse
+import json
+import os
+import secrets
+import shutil
+import tempfile
+import time
+from collections.abc import Sequence
+from contextlib import contextmanager
+
+import numpy as np
+
+from streaming_embeddings import vector_a_json
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def serializar(objeto, indent=None):
+    """Objeto -> bytes UTF-8 (orjson si está disponible; arrays NumPy incluidos)"""
+    if ORJSON_AVAILABLE:
+        opciones = orjson.OPT_SERIALIZE_NUMPY | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(objeto, default=vector_a_json, option=opciones)
+    separadores = None if indent else (',', ':')
+    return json.dumps(objeto, indent=indent, separators=separadores, ensure_ascii=False,
+                      default=vector_a_json).encode('utf-8')
+
+
+@contextmanager
+def escritura_atomica(ruta):
+    """Archivo binario temporal en el mismo directorio; os.replace sobre `ruta` al salir sin errores"""
+    # open(..., 'xb') en lugar de mkstemp: respeta el umask (mkstemp crea con permisos 0600)
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    temporal = os.path.join(directorio, f".tmp_{secrets.token_hex(6)}_{os.path.basename(ruta)}")
+    try:
+        with open(temporal, 'xb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def _es_secuencia(valor):
+    """Listas, tuplas, otras Sequence (RegistrosStream) e iteradores/generadores se escriben elemento a elemento"""
+    if isinstance(valor, (str, bytes)):
+        return False
+    return isinstance(valor, Sequence) or hasattr(valor, '__next__')
+
+
+def escribir_documento(f, secciones, indent=2):
+    """
+    Escribir un objeto JSON `{clave: valor, ...}` a partir de `secciones`
+    (pares clave/valor o un dict). Los valores secuencia se serializan un
+    elemento a la vez; el resto, completos. Con indent=2 el resultado tiene
+    el mismo formato que json.dump(..., indent=2).
+    """
+    secciones = secciones.items() if isinstance(secciones, dict) else secciones
+    salto = b'\n' if indent else b''
+    sangria = b' ' * (indent or 0)
+    separador_clave = b': ' if indent else b':'
+
+    def anidar(datos, nivel):
+        return datos.replace(b'\n', b'\n' + sangria * nivel) if indent else datos
+
+    f.write(b'{')
+    primera_seccion = True
+    for clave, valor in secciones:
+        f.write((b',' if not primera_seccion else b'') + salto + sangria + serializar(clave) + separador_clave)
+        primera_seccion = False
+
+        if not _es_secuencia(valor):
+            f.write(anidar(serializar(valor, indent), 1))
+            continue
+
+        f.write(b'[')
+        vacia = True
+        for elemento in valor:
+            f.write((b',' if not vacia else b'') + salto + sangria * 2 + anidar(serializar(elemento, indent), 2))
+            vacia = False
+        f.write(b']' if vacia else salto + sangria + b']')
+    f.write((salto if not primera_seccion else b'') + b'}')
+
+
+def guardar_json_streaming(ruta, secciones, indent=2):
+    """Escribir el documento de forma atómica; devuelve la ruta"""
+    with escritura_atomica(ruta) as f:
+        escribir_documento(f, secciones, indent)
+    return ruta
+
+
+class EscritorNDJSON:
+    """
+    Una línea JSON por objeto, con escritura atómica. `escribir` devuelve
+    (offset, largo) en bytes de la línea, para índices como el de formato_binario.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._contexto = None
+        self._archivo = None
+        self.lineas = 0
+
+    def __enter__(self):
+        self._contexto = escritura_atomica(self.ruta)
+        self._archivo = self._contexto.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._contexto.__exit__(*exc)
+
+    def escribir(self, objeto):
+        linea = serializar(objeto) + b'\n'
+        offset = self._archivo.tell()
+        self._archivo.write(linea)
+        self.lineas += 1
+        return offset, len(linea)
+
+
+def _memoria_proceso(campo):
+    """VmRSS / VmHWM (pico) del proceso actual en KB, desde /proc (Linux)"""
+    with open('/proc/self/status') as f:
+        for linea in f:
+            if linea.startswith(campo + ':'):
+                return int(linea.split()[1])
+    return 0
+
+
+def _medir_escritura(modo, total, ruta):
+    """
+    Escribir un run sintético con `modo` y devolver (segundos, pico de RSS
+    por encima del RSS previo a escribir, en MB; Linux). 'json.dump' es el
+    camino anterior: armar resultado_final con los vectores como listas
+    (.tolist()) y volcarlo entero; 'streaming' escribe desde los arrays.
+    Se ejecuta en un proceso aparte para que los modos no se mezclen.
+    """
+    from formato_binario import _resultado_sintetico
+
+    resultado = _resultado_sintetico(total)
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')  # Reiniciar el pico (VmHWM) después de armar el resultado
+    rss_previo = _memoria_proceso('VmRSS')
+    inicio = time.perf_counter()
+    if modo == 'json.dump':
+        resultado_final = dict(resultado, chunks=[
+            dict(chunk, embedding=dict(chunk['embedding'], vector=chunk['embedding']['vector'].tolist()))
+            for chunk in resultado['chunks']
+        ])
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump(resultado_final, f, indent=2, ensure_ascii=False)
+    else:
+        guardar_json_streaming(ruta, resultado)
+    duracion = time.perf_counter() - inicio
+    return duracion, max(_memoria_proceso('VmHWM') - rss_previo, 0) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recuiva - benchmark de escritura JSON")
+    parser.add_argument('--chunks', type=int, default=100000)
+    args = parser.parse_args()
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    directorio = tempfile.mkdtemp(prefix='recuiva_escritor_')
+    rutas = {modo: os.path.join(directorio, f'{i}.json') for i, modo in enumerate(('json.dump', 'streaming'))}
+    try:
+        print(f"📝 {args.chunks:,} chunks de 384D (serializador: {'orjson' if ORJSON_AVAILABLE else 'json'})")
+        for modo, ruta in rutas.items():
+            with ProcessPoolExecutor(1) as proceso:
+                duracion, memoria = proceso.submit(_medir_escritura, modo, args.chunks, ruta).result()
+            print(f"   {modo:<10} {duracion:>7.2f}s   memoria extra pico: {memoria:>8.1f} MB   "
+                  f"({os.path.getsize(ruta) / 1024 / 1024:.1f} MB)")
+
+        documentos = []
+        for ruta in rutas.values():
+            with open(ruta, 'rb') as f:
+                documentos.append(json.load(f))
+        # orjson escribe float32 con su repr más corta: se comparan los vectores en float32
+        vectores = [np.array([c['embedding'].pop('vector') for c in datos['chunks']], dtype=np.float32)
+                    for datos in documentos]
+        iguales = documentos[0] == documentos[1] and np.array_equal(*vectores)
+        print(f"   Mismo contenido: {'✅' if iguales else '❌'}")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Formato Binario de Salida (vectores .npy + manifiesto NDJSON)
+La matriz de embeddings se guarda como un arreglo binario contiguo
+(`<base>.vectors.npy`) y el resto del resultado en un manifiesto liviano
+(`<base>.manifest.ndjson`): la primera línea es la cabecera (metadata,
+similaridades, resumen y descripción del archivo de vectores) y cada línea
+siguiente es un chunk con su fila y su offset en bytes dentro del .npy.
+`<base>.index.npy` guarda (id, offset, largo) de cada línea del manifiesto,
+más la permutación que ordena los ids, para que lector_runs pueda leer
+chunks sueltos por fila o por id (búsqueda binaria) sin recorrer el archivo.
+El JSON completo de siempre sigue disponible con --formato json.
+
+Uso:
+    python formato_binario.py [--chunks 10000]
+    (benchmark de escritura/lectura: JSON vs .npy + manifiesto)
+
+Fecha: 18/10/2026
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from numpy.lib import format as formato_npy
+
+from escritor_json import EscritorNDJSON, escritura_atomica, guardar_json_streaming
+from streaming_embeddings import registro_chunk
+
+FORMATOS_SALIDA = ('npy', 'json')
+FORMATO_SALIDA = os.environ.get('RECUIVA_FORMATO', 'npy')
+VERSION_FORMATO = 'recuiva-vectors-v1'
+SUFIJO_VECTORES = '.vectors.npy'
+SUFIJO_MANIFIESTO = '.manifest.ndjson'
+SUFIJO_INDICE = '.index.npy'
+CLAVES_CHUNKS = ('chunks', 'chunks_procesados')  # Esquema de consola / esquema de la GUI
+
+
+def configurar_formato_salida(formato):
+    """Cambiar el formato de salida del proceso (opción --formato)"""
+    global FORMATO_SALIDA
+    if formato not in FORMATOS_SALIDA:
+        raise ValueError(f"Formato no soportado: {formato} (opciones: {', '.join(FORMATOS_SALIDA)})")
+    FORMATO_SALIDA = formato
+
+
+def formato_salida_actual():
+    return FORMATO_SALIDA
+
+
+def ruta_base_run(ruta):
+    """Ruta sin sufijo de un run (acepta la base o cualquiera de sus archivos)"""
+    for sufijo in (SUFIJO_MANIFIESTO, SUFIJO_VECTORES, SUFIJO_INDICE, '.json'):
+        if ruta.endswith(sufijo):
+            return ruta[:-len(sufijo)]
+    return ruta
+
+
+def es_run_json(ruta):
+    """
+    Un .json de output/ es un run (JSON antiguo) y no un archivo auxiliar de
+    otro run (`<run>.temas.json` y similares, con sufijo compuesto)
+    """
+    nombre = os.path.basename(ruta)
+    return nombre.endswith('.json') and '.' not in nombre[:-len('.json')]
+
+
+def rutas_sidecar(ruta_base):
+    """(ruta .vectors.npy, ruta .manifest.ndjson) para una ruta base, con o sin extensión"""
+    ruta_base = ruta_base_run(ruta_base)
+    return ruta_base + SUFIJO_VECTORES, ruta_base + SUFIJO_MANIFIESTO
+
+
+def archivos_run(ruta):
+    """Todos los archivos de un run binario (vectores, manifiesto e índice)"""
+    ruta_base = ruta_base_run(ruta)
+    return [ruta_base + sufijo for sufijo in (SUFIJO_VECTORES, SUFIJO_MANIFIESTO, SUFIJO_INDICE)]
+
+
+def indice_manifiesto(ids, offsets, largos):
+    """
+    Arreglo estructurado (id, offset, largo, orden) de las líneas de chunks del
+    manifiesto; 'sorted' es la permutación que ordena los ids (estable: con
+    ids repetidos va primero la fila menor), para np.searchsorted(sorter=...)
+    """
+    largo_id = max((len(i) for i in ids), default=1)
+    indice = np.empty(len(ids), dtype=[('id', f'U{largo_id}'), ('offset', '<u8'), ('length', '<u4'),
+                                       ('sorted', '<u4')])
+    indice['id'] = ids
+    indice['offset'] = offsets
+    indice['length'] = largos
+    indice['sorted'] = np.argsort(indice['id'], kind='stable')
+    return indice
+
+
+def clave_chunks(resultado):
+    """Clave de la lista de chunks según el esquema del resultado"""
+    for clave in CLAVES_CHUNKS:
+        if clave in resultado:
+            return clave
+    raise KeyError(f"El resultado no tiene lista de chunks ({', '.join(CLAVES_CHUNKS)})")
+
+
+def guardar_run_binario(resultado, ruta_base):
+    """
+    Escribir `resultado` (mismo diccionario que se volcaría a JSON) como
+    .npy + manifiesto. No modifica `resultado`. Devuelve la ruta del manifiesto.
+    """
+    ruta_vectores, ruta_manifiesto = rutas_sidecar(ruta_base)
+    clave = clave_chunks(resultado)
+    chunks = resultado[clave]
+
+    # Los vectores se escriben fila a fila detrás de la cabecera .npy (sin apilar una copia)
+    if chunks:
+        primera = np.asarray(chunks[0]['embedding']['vector'])
+        tipo, forma = primera.dtype, (len(chunks), primera.shape[0])
+    else:
+        tipo, forma = np.dtype(np.float32), (0, 0)
+    bytes_fila = tipo.itemsize * forma[1]
+    with escritura_atomica(ruta_vectores) as f:
+        formato_npy.write_array_header_1_0(
+            f, {'descr': formato_npy.dtype_to_descr(tipo), 'fortran_order': False, 'shape': forma}
+        )
+        offset_datos = f.tell()
+        for chunk in chunks:
+            f.write(np.ascontiguousarray(chunk['embedding']['vector'], dtype=tipo).tobytes())
+
+    cabecera = {clave_cabecera: valor for clave_cabecera, valor in resultado.items() if clave_cabecera != clave}
+    cabecera['format'] = VERSION_FORMATO
+    cabecera['chunks_key'] = clave
+    cabecera['vectors'] = {
+        'file': os.path.basename(ruta_vectores),
+        'dtype': tipo.name,
+        'shape': list(forma),
+        'data_offset': int(offset_datos),
+        'row_bytes': int(bytes_fila)
+    }
+
+    ids, offsets, largos = [], [], []
+    with EscritorNDJSON(ruta_manifiesto) as escritor:
+        escritor.escribir(cabecera)
+        for fila, chunk in enumerate(chunks):
+            embedding = {k: v for k, v in chunk['embedding'].items() if k != 'vector'}
+            offset, largo = escritor.escribir(
+                dict(chunk, embedding=embedding, row=fila, offset=int(offset_datos + fila * bytes_fila))
+            )
+            ids.append(str(chunk['id']))
+            offsets.append(offset)
+            largos.append(largo)
+
+    with escritura_atomica(ruta_base_run(ruta_manifiesto) + SUFIJO_INDICE) as f:
+        np.save(f, indice_manifiesto(ids, offsets, largos), allow_pickle=False)
+    return ruta_manifiesto
+
+
+def leer_manifiesto(ruta_manifiesto):
+    """(cabecera, lista de chunks sin vectores)"""
+    with open(ruta_manifiesto, 'r', encoding='utf-8') as f:
+        cabecera = json.loads(f.readline())
+        if cabecera.get('format') != VERSION_FORMATO:
+            raise ValueError(f"Manifiesto no reconocido: {ruta_manifiesto}")
+        chunks = [json.loads(linea) for linea in f if linea.strip()]
+    return cabecera, chunks
+
+
+def cargar_run_binario(ruta, mmap=True):
+    """
+    Cargar un run binario: (resultado, matriz). `resultado` tiene la misma
+    forma que el JSON (sin los vectores dentro de los chunks); la fila de
+    cada chunk está en chunk['row'].
+    """
+    _, ruta_manifiesto = rutas_sidecar(ruta)
+    cabecera, chunks = leer_manifiesto(ruta_manifiesto)
+    ruta_vectores = os.path.join(os.path.dirname(ruta_manifiesto), cabecera['vectors']['file'])
+    matriz = np.load(ruta_vectores, mmap_mode='r' if mmap else None, allow_pickle=False)
+
+    clave = cabecera.pop('chunks_key')
+    resultado = {k: v for k, v in cabecera.items() if k not in ('format', 'vectors')}
+    resultado[clave] = chunks
+    return resultado, matriz
+
+
+def _resultado_sintetico(total):
+    """Resultado con el esquema de consola y vectores mock, para el benchmark"""
+    from embeddings_mock import chunks_sinteticos, generar_vectores_mock
+
+    chunks = list(chunks_sinteticos(total))
+    matriz = generar_vectores_mock([chunk['content'] for chunk in chunks])
+    return {
+        'metadata': {'model': 'mock', 'total_chunks': total, 'dimension': matriz.shape[1]},
+        'chunks': [registro_chunk(chunk, fila) for chunk, fila in zip(chunks, matriz)],
+        'top_similaridades': [],
+        'resumen': {'chunks_procesados': total}
+    }
+
+
+def benchmark_formatos(total):
+    """Tiempos de escritura/lectura y tamaños: JSON (indent=2, streaming) vs .npy + manifiesto"""
+    resultado = _resultado_sintetico(total)
+    directorio = tempfile.mkdtemp(prefix='recuiva_formatos_')
+    try:
+        ruta_json = os.path.join(directorio, 'run.json')
+        inicio = time.perf_counter()
+        guardar_json_streaming(ruta_json, resultado)
+        escritura_json = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        with open(ruta_json, 'r', encoding='utf-8') as f:
+            datos = json.load(f)
+        matriz_json = np.array([chunk['embedding']['vector'] for chunk in datos['chunks']], dtype=np.float32)
+        lectura_json = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        ruta_manifiesto = guardar_run_binario(resultado, os.path.join(directorio, 'run'))
+        escritura_npy = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        _, matriz_npy = cargar_run_binario(ruta_manifiesto, mmap=False)
+        lectura_npy = time.perf_counter() - inicio
+
+        return {
+            'chunks': total,
+            'identical_vectors': bool(np.array_equal(matriz_json, matriz_npy)),
+            'json': {
+                'bytes': os.path.getsize(ruta_json),
+                'write_s': round(escritura_json, 4),
+                'load_s': round(lectura_json, 4)
+            },
+            'npy': {
+                'bytes': sum(os.path.getsize(archivo) for archivo in archivos_run(ruta_manifiesto)),
+                'write_s': round(escritura_npy, 4),
+                'load_s': round(lectura_npy, 4)
+            }
+        }
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recuiva - benchmark de formatos de salida")
+    parser.add_argument('--chunks', type=int, default=10000)
+    args = parser.parse_args()
+
+    reporte = benchmark_formatos(args.chunks)
+    print(f"📦 {reporte['chunks']:,} chunks de 384D (vectores idénticos: {'✅' if reporte['identical_vectors'] else '❌'})")
+    print(f"{'formato':<10}{'tamaño':>12}{'escritura':>12}{'lectura':>10}")
+    for formato in ('json', 'npy'):
+        fila = reporte[formato]
+        print(f"{formato:<10}{fila['bytes'] / 1024 / 1024:>10.2f}MB{fila['write_s']:>11.2f}s{fila['load_s']:>9.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Índice ANN (IVF) para recuperar chunks
+Vecinos aproximados sin recorrer todos los vectores: k-means esférico
+reparte los chunks en listas (celdas) alrededor de centroides; cada
+consulta compara contra los centroides y solo recorre las `nprobe`
+listas más cercanas. Los vectores se guardan reordenados por lista, así
+cada lista es un tramo contiguo de la matriz (un solo producto matricial
+por lista, sin índices dispersos). El índice se guarda junto al run
+(.ivf.npz + .ivf.vectors.npy, este último se abre con mmap).
+
+Uso:
+    python indice_ann.py construir output/run.manifest.ndjson [--listas 256]
+    python indice_ann.py buscar output/run.manifest.ndjson chunk_0000001 [--k 5] [--nprobe 8]
+    python indice_ann.py --benchmark 200000 [--nprobe 1,2,4,8,16,32]
+
+Fecha: 18/10/2026
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from escritor_json import escritura_atomica
+from formato_binario import ruta_base_run
+from matriz_embeddings import MatrizEmbeddings
+
+VERSION_INDICE = 'recuiva-ivf-v1'
+SUFIJO_INDICE = '.ivf.npz'
+SUFIJO_VECTORES = '.ivf.vectors.npy'
+NPROBE = int(os.environ.get('RECUIVA_ANN_NPROBE', '8'))
+ITERACIONES_KMEANS = 10
+MUESTRAS_POR_LISTA = 32        # Entrenamiento de k-means sobre una muestra de ~32 filas por lista
+MIN_FILAS_POR_LISTA = 16
+FILAS_ASIGNACION = 16384       # Filas por bloque al asignar a centroides
+
+
+def listas_sugeridas(n):
+    """Cantidad de listas por defecto: ~4·sqrt(n), con al menos MIN_FILAS_POR_LISTA filas por lista"""
+    return int(np.clip(4 * np.sqrt(n), 1, max(1, n // MIN_FILAS_POR_LISTA)))
+
+
+def asignar(vectores, centroides):
+    """(centroide más cercano, similitud) de cada fila, por bloques de filas"""
+    etiquetas = np.empty(len(vectores), dtype=np.int64)
+    similitudes = np.empty(len(vectores), dtype=np.float32)
+    for inicio in range(0, len(vectores), FILAS_ASIGNACION):
+        bloque = vectores[inicio:inicio + FILAS_ASIGNACION] @ centroides.T
+        etiquetas[inicio:inicio + len(bloque)] = bloque.argmax(axis=1)
+        similitudes[inicio:inicio + len(bloque)] = bloque[np.arange(len(bloque)), etiquetas[inicio:inicio + len(bloque)]]
+    return etiquetas, similitudes
+
+
+def kmeans_esferico(vectores, k, iteraciones=ITERACIONES_KMEANS, semilla=0):
+    """
+    Centroides unitarios (k, d) de `vectores` unitarios (k-means con coseno).
+    Las listas que quedan vacías se vuelven a sembrar con las filas peor
+    asignadas.
+    """
+    rng = np.random.default_rng(semilla)
+    centroides = vectores[rng.choice(len(vectores), size=k, replace=False)].copy()
+    for _ in range(iteraciones):
+        etiquetas, similitudes = asignar(vectores, centroides)
+        conteos = np.bincount(etiquetas, minlength=k)
+        llenas = conteos > 0
+        inicios = np.cumsum(conteos) - conteos
+        sumas = np.zeros_like(centroides)
+        sumas[llenas] = np.add.reduceat(vectores[np.argsort(etiquetas, kind='stable')], inicios[llenas])
+        vacias = np.flatnonzero(~llenas)
+        if len(vacias):
+            sumas[vacias] = vectores[np.argsort(similitudes)[:len(vacias)]]
+        normas = np.linalg.norm(sumas, axis=1, keepdims=True)
+        centroides = sumas / np.clip(normas, 1e-12, None)
+    return centroides.astype(np.float32, copy=False)
+
+
+class IndiceIVF:
+    """
+    Índice de listas invertidas sobre vectores unitarios. La lista `l`
+    ocupa las filas inicios[l]:inicios[l + 1] de `vectores`; `filas` da la
+    fila original (la de la MatrizEmbeddings) de cada una.
+    """
+
+    def __init__(self, centroides, inicios, filas, vectores, ids):
+        self.centroides = centroides
+        self.inicios = inicios
+        self.filas = filas
+        self.vectores = vectores
+        self.ids = list(ids)
+
+    @classmethod
+    def construir(cls, matriz, listas=None, iteraciones=ITERACIONES_KMEANS, semilla=0):
+        """Entrenar centroides sobre una muestra y repartir todas las filas de una MatrizEmbeddings"""
+        vectores = matriz.matriz
+        listas = min(listas or listas_sugeridas(len(vectores)), len(vectores))
+        rng = np.random.default_rng(semilla)
+        tam_muestra = min(len(vectores), listas * MUESTRAS_POR_LISTA)
+        muestra = vectores[np.sort(rng.choice(len(vectores), size=tam_muestra, replace=False))]
+        centroides = kmeans_esferico(muestra, listas, iteraciones, semilla)
+
+        etiquetas, _ = asignar(vectores, centroides)
+        filas = np.argsort(etiquetas, kind='stable')
+        inicios = np.zeros(listas + 1, dtype=np.int64)
+        np.cumsum(np.bincount(etiquetas, minlength=listas), out=inicios[1:])
+        return cls(centroides, inicios, filas, vectores[filas], matriz.ids)
+
+    def __len__(self):
+        return len(self.filas)
+
+    @property
+    def listas(self):
+        return len(self.centroides)
+
+    def _candidatas(self, consulta, nprobe):
+        """Tramos (inicio, fin) de las nprobe listas más cercanas a la consulta"""
+        nprobe = min(nprobe, self.listas)
+        cercanas = np.argpartition(self.centroides @ consulta, -nprobe)[-nprobe:]
+        return [(self.inicios[l], self.inicios[l + 1]) for l in cercanas if self.inicios[l + 1] > self.inicios[l]]
+
+    def buscar(self, consulta, k=5, nprobe=NPROBE, vivas=None):
+        """
+        Los k chunks aproximadamente más similares a un vector de consulta:
+        [(similitud, fila)], de mayor a menor (misma forma que
+        MatrizEmbeddings.mas_similares). `vivas` (bool por fila original)
+        descarta las filas borradas antes de elegir el top-k.
+        """
+        consulta = np.array(consulta, dtype=np.float32)
+        consulta /= max(float(np.linalg.norm(consulta)), 1e-12)
+        tramos = self._candidatas(consulta, nprobe)
+        if not tramos:
+            return []
+        puntajes = np.concatenate([self.vectores[inicio:fin] @ consulta for inicio, fin in tramos])
+        posiciones = np.concatenate([np.arange(inicio, fin) for inicio, fin in tramos])
+        if vivas is not None:
+            validas = vivas[self.filas[posiciones]]
+            puntajes, posiciones = puntajes[validas], posiciones[validas]
+        k = min(k, len(puntajes))
+        if k <= 0:
+            return []
+        mejores = np.argpartition(puntajes, -k)[-k:]
+        mejores = mejores[np.argsort(-puntajes[mejores], kind='stable')]
+        return [(float(puntajes[m]), int(self.filas[posiciones[m]])) for m in mejores]
+
+    def estadisticas(self):
+        tamanos = np.diff(self.inicios)
+        return {
+            'rows': len(self),
+            'lists': self.listas,
+            'dimension': int(self.vectores.shape[1]) if self.vectores.ndim == 2 else 0,
+            'list_rows_mean': round(float(tamanos.mean()), 1) if len(tamanos) else 0,
+            'list_rows_max': int(tamanos.max()) if len(tamanos) else 0
+        }
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+
+    def guardar(self, base):
+        """Escribir `base`.ivf.npz (centroides, listas, ids) y `base`.ivf.vectors.npy"""
+        with escritura_atomica(base + SUFIJO_VECTORES) as f:
+            np.save(f, np.ascontiguousarray(self.vectores), allow_pickle=False)
+        with escritura_atomica(base + SUFIJO_INDICE) as f:
+            np.savez(
+                f,
+                format=np.array(VERSION_INDICE),
+                centroides=self.centroides,
+                inicios=self.inicios,
+                filas=self.filas,
+                ids=np.array(json.dumps(self.ids, ensure_ascii=False))
+            )
+
+    @classmethod
+    def cargar(cls, base, mmap=True):
+        """Abrir un índice guardado; los vectores quedan en mmap (solo se leen las listas consultadas)"""
+        with np.load(base + SUFIJO_INDICE, allow_pickle=False) as datos:
+            if str(datos['format']) != VERSION_INDICE:
+                raise ValueError(f"Índice ANN no reconocido: {base + SUFIJO_INDICE}")
+            centroides, inicios, filas = datos['centroides'], datos['inicios'], datos['filas']
+            ids = json.loads(str(datos['ids']))
+        vectores = np.load(base + SUFIJO_VECTORES, mmap_mode='r' if mmap else None, allow_pickle=False)
+        return cls(centroides, inicios, filas, vectores, ids)
+
+
+def _benchmark(total, lista_nprobe, k, consultas=200):
+    from embeddings_mock import vectores_por_temas
+
+    vectores, _ = vectores_por_temas(total + consultas, temas=max(10, total // 200), ruido=2.0)
+    matriz = MatrizEmbeddings(vectores[:total], [f'chunk_{i}' for i in range(total)])
+    preguntas = vectores[total:]
+
+    inicio = time.perf_counter()
+    indice = IndiceIVF.construir(matriz)
+    construccion = time.perf_counter() - inicio
+    print(f"🗂️  {total:,} chunks x {matriz.dimension}D, {indice.listas} listas, construido en {construccion:.2f}s")
+
+    exactos, tiempos = [], []
+    for consulta in preguntas:
+        inicio = time.perf_counter()
+        exactos.append({fila for _, fila in matriz.mas_similares(consulta, k)})
+        tiempos.append(time.perf_counter() - inicio)
+    print(f"   Exacto (fuerza bruta): p50 {1000 * np.median(tiempos):.2f} ms, "
+          f"p95 {1000 * np.percentile(tiempos, 95):.2f} ms")
+
+    for nprobe in lista_nprobe:
+        aciertos, tiempos = 0, []
+        for consulta, exacto in zip(preguntas, exactos):
+            inicio = time.perf_counter()
+            encontrados = indice.buscar(consulta, k, nprobe)
+            tiempos.append(time.perf_counter() - inicio)
+            aciertos += len(exacto & {fila for _, fila in encontrados})
+        print(f"   nprobe={nprobe:>3}: recall@{k} {aciertos / (k * len(preguntas)):.3f}, "
+              f"p50 {1000 * np.median(tiempos):.2f} ms, p95 {1000 * np.percentile(tiempos, 95):.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recuiva - índice ANN (IVF) de chunks")
+    parser.add_argument('comando', nargs='?', choices=['construir', 'buscar'])
+    parser.add_argument('run', nargs='?', help="Run de output/")
+    parser.add_argument('chunk_id', nargs='?', help="Chunk cuyo vector se usa como consulta")
+    parser.add_argument('--listas', type=int, help="Listas (por defecto ~4·sqrt(n))")
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--nprobe', help=f"Listas a recorrer (por defecto {NPROBE}; en --benchmark, separadas por comas)")
+    parser.add_argument('--benchmark', type=int, metavar='CHUNKS', help="Recall@k y latencia contra búsqueda exacta")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        _benchmark(args.benchmark, [int(n) for n in (args.nprobe or '1,2,4,8,16,32').split(',')], args.k)
+        return 0
+    if not args.comando or not args.run:
+        parser.error("indicar 'construir' o 'buscar' y un run (o --benchmark)")
+
+    base = ruta_base_run(args.run)
+    if args.comando == 'construir':
+        inicio = time.perf_counter()
+        indice = IndiceIVF.construir(MatrizEmbeddings.desde_run(args.run), args.listas)
+        indice.guardar(base)
+        print(f"✅ Índice en {base}{SUFIJO_INDICE} ({time.perf_counter() - inicio:.2f}s): {indice.estadisticas()}")
+        return 0
+
+    if not args.chunk_id:
+        parser.error("'buscar' necesita un chunk_id")
+    try:
+        indice = IndiceIVF.cargar(base)
+    except FileNotFoundError:
+        print(f"❌ No hay índice para {args.run}; ejecutar primero 'construir'")
+        return 1
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    if args.chunk_id not in indice.ids:
+        print(f"❌ Chunk no encontrado en el índice: {args.chunk_id}")
+        return 1
+    consulta = indice.vectores[np.flatnonzero(indice.filas == indice.ids.index(args.chunk_id))[0]]
+    for similitud, fila in indice.buscar(consulta, args.k, int(args.nprobe or NPROBE)):
+        print(f"   {similitud:.4f}  {indice.ids[fila]}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Índice Incremental de Chunks (tombstones + reconstrucción en segundo plano)
+Mantiene el índice ANN al día mientras se suben, reemplazan y eliminan
+materiales, sin reconstruirlo en cada cambio. Los chunks nuevos van a un
+delta que se recorre por fuerza bruta; eliminar un documento solo marca
+sus filas como muertas (tombstones) y las consultas las filtran. Cuando
+las filas muertas o el delta crecen demasiado, un hilo arma un IndiceIVF
+nuevo con las filas vivas; mientras tanto las consultas siguen usando la
+instantánea anterior, y al terminar se cambia la instantánea de una vez
+(sin perder lo agregado o eliminado durante la reconstrucción).
+
+Uso:
+    python indice_incremental.py              (índice del almacén de corpus + estado)
+    python indice_incremental.py --benchmark 200 [--chunks 250]
+
+Fecha: 18/10/2026
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from indice_ann import NPROBE, IndiceIVF
+from matriz_embeddings import MatrizEmbeddings, normalizar_filas
+
+UMBRAL_TOMBSTONES = float(os.environ.get('RECUIVA_ANN_TOMBSTONES', '0.2'))  # Reconstruir con 20% de filas muertas
+FRACCION_DELTA = 0.1       # ... o con un delta mayor al 10% del índice
+MIN_FILAS_DELTA = 4096     # (y de al menos estas filas: con pocas, la fuerza bruta es más rápida)
+
+
+class Instantanea:
+    """
+    Estado inmutable que leen las consultas: IndiceIVF (o None) + delta, con
+    el documento, la versión y la marca de vida de cada fila. Cada cambio
+    arma una instantánea nueva; nunca se modifica una publicada.
+    """
+
+    def __init__(self, indice, docs_indice, versiones_indice, vivas_indice,
+                 delta, ids_delta, docs_delta, versiones_delta, vivas_delta):
+        self.indice = indice
+        self.docs_indice = docs_indice
+        self.versiones_indice = versiones_indice
+        self.vivas_indice = vivas_indice
+        self.delta = delta
+        self.ids_delta = ids_delta
+        self.docs_delta = docs_delta
+        self.versiones_delta = versiones_delta
+        self.vivas_delta = vivas_delta
+
+    @classmethod
+    def vacia(cls, dimension=0):
+        entero, booleano = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+        return cls(None, entero, entero, booleano,
+                   np.zeros((0, dimension), dtype=np.float32), [], entero, entero, booleano)
+
+    @property
+    def filas(self):
+        return len(self.vivas_indice) + len(self.vivas_delta)
+
+    @property
+    def muertas(self):
+        return int((~self.vivas_indice).sum() + (~self.vivas_delta).sum())
+
+
+class IndiceIncremental:
+    """
+    Índice de chunks por documento: agregar_documento (reemplaza la versión
+    anterior), eliminar_documento y buscar. Las consultas no toman el lock:
+    leen la instantánea vigente.
+    """
+
+    def __init__(self, reconstruir_automatico=True, umbral_tombstones=UMBRAL_TOMBSTONES):
+        self.reconstruir_automatico = reconstruir_automatico
+        self.umbral_tombstones = umbral_tombstones
+        self._instantanea = Instantanea.vacia()
+        self._lock = threading.RLock()
+        self._codigos = {}      # doc_id -> código entero
+        self._nombres = []      # código -> doc_id
+        self._versiones = []    # código -> versión vigente (crece en cada reemplazo)
+        self._eliminados = set()
+        self._lock_reconstruccion = threading.Lock()
+        self._hilo_reconstruccion = None
+        self.reconstrucciones = 0
+        self.ultima_reconstruccion = {}
+
+    @classmethod
+    def desde_almacen(cls, almacen, reconstruir_automatico=True, umbral_tombstones=UMBRAL_TOMBSTONES):
+        """Índice con todos los documentos del almacén de corpus (reconstruido de una vez)"""
+        indice = cls(False, umbral_tombstones)
+        for doc_id in almacen.documentos():
+            ids = [chunk['chunk_id'] for chunk in almacen.chunks_documento(doc_id)]
+            indice.agregar_documento(doc_id, ids, almacen.vectores_documento(doc_id))
+        indice.reconstruir()
+        indice.reconstruir_automatico = reconstruir_automatico
+        return indice
+
+    # ------------------------------------------------------------------
+    # Cambios
+    # ------------------------------------------------------------------
+
+    def _sin_documento(self, instantanea, codigo):
+        """Máscaras de vida nuevas con todas las filas del documento marcadas como muertas"""
+        vivas_indice, vivas_delta = instantanea.vivas_indice, instantanea.vivas_delta
+        en_indice = instantanea.docs_indice == codigo
+        if en_indice.any():
+            vivas_indice = vivas_indice & ~en_indice
+        en_delta = instantanea.docs_delta == codigo
+        if en_delta.any():
+            vivas_delta = vivas_delta & ~en_delta
+        return vivas_indice, vivas_delta
+
+    def agregar_documento(self, doc_id, ids, vectores):
+        """
+        Agregar (o reemplazar) los chunks de un documento; las filas anteriores
+        quedan como tombstones. Sin chunks, el documento solo pierde los que tenía.
+        """
+        vectores = np.array(vectores, dtype=np.float32)
+        if not vectores.size:  # ndmin=2 convertiría [] en (1, 0)
+            vectores = vectores.reshape(0, vectores.shape[-1] if vectores.ndim == 2 else 0)
+        else:
+            vectores = np.atleast_2d(vectores)
+        if len(ids) != len(vectores):
+            raise ValueError(f"{len(ids)} ids para {len(vectores)} vectores")
+        normalizar_filas(vectores)
+
+        with self._lock:
+            actual = self._instantanea
+            if doc_id in self._codigos:
+                codigo = self._codigos[doc_id]
+                vivas_indice, vivas_delta = self._sin_documento(actual, codigo)
+                self._versiones[codigo] += 1
+                self._eliminados.discard(codigo)
+            else:
+                codigo = self._codigos[doc_id] = len(self._nombres)
+                self._nombres.append(doc_id)
+                self._versiones.append(0)
+                vivas_indice, vivas_delta = actual.vivas_indice, actual.vivas_delta
+            if not len(vectores):
+                delta = actual.delta
+            else:
+                delta = vectores if not len(actual.delta) else np.concatenate([actual.delta, vectores])
+            self._instantanea = Instantanea(
+                actual.indice, actual.docs_indice, actual.versiones_indice, vivas_indice,
+                delta,
+                actual.ids_delta + [str(chunk_id) for chunk_id in ids],
+                np.concatenate([actual.docs_delta, np.full(len(ids), codigo, dtype=np.int64)]),
+                np.concatenate([actual.versiones_delta, np.full(len(ids), self._versiones[codigo], dtype=np.int64)]),
+                np.concatenate([vivas_delta, np.ones(len(ids), dtype=bool)])
+            )
+        self._quizas_reconstruir()
+
+    def eliminar_documento(self, doc_id):
+        """Marcar las filas del documento como muertas; el espacio se libera al reconstruir"""
+        with self._lock:
+            if doc_id not in self._codigos or self._codigos[doc_id] in self._eliminados:
+                raise KeyError(f"Documento no encontrado en el índice: {doc_id}")
+            codigo = self._codigos[doc_id]
+            actual = self._instantanea
+            vivas_indice, vivas_delta = self._sin_documento(actual, codigo)
+            self._eliminados.add(codigo)
+            self._instantanea = Instantanea(
+                actual.indice, actual.docs_indice, actual.versiones_indice, vivas_indice,
+                actual.delta, actual.ids_delta, actual.docs_delta, actual.versiones_delta, vivas_delta
+            )
+        self._quizas_reconstruir()
+
+    # ------------------------------------------------------------------
+    # Reconstrucción
+    # ------------------------------------------------------------------
+
+    def necesita_reconstruir(self, instantanea=None):
+        instantanea = instantanea or self._instantanea
+        filas = instantanea.filas
+        if not filas:
+            return False
+        limite_delta = max(MIN_FILAS_DELTA, FRACCION_DELTA * len(instantanea.vivas_indice))
+        return instantanea.muertas / filas > self.umbral_tombstones or len(instantanea.vivas_delta) > limite_delta
+
+    def _quizas_reconstruir(self):
+        if self.reconstruir_automatico and self.necesita_reconstruir():
+            self.reconstruir_en_segundo_plano()
+
+    def reconstruir(self):
+        """
+        Armar un IndiceIVF con las filas vivas de la instantánea actual (sin
+        el lock) y publicarlo con lo que se agregó o eliminó mientras tanto.
+        """
+        with self._lock_reconstruccion:
+            return self._reconstruir()
+
+    def _reconstruir(self):
+        inicio = time.perf_counter()
+        with self._lock:
+            base = self._instantanea
+        filas_delta_base = len(base.vivas_delta)
+
+        # Filas vivas de la base: las del índice (en el orden de sus vectores) + todo el delta
+        partes_vectores, ids, docs, versiones = [], [], [], []
+        if base.indice is not None:
+            posiciones = np.flatnonzero(base.vivas_indice[base.indice.filas])
+            filas = base.indice.filas[posiciones]
+            partes_vectores.append(base.indice.vectores[posiciones])
+            ids.extend(base.indice.ids[f] for f in filas)
+            docs.append(base.docs_indice[filas])
+            versiones.append(base.versiones_indice[filas])
+        vivas = np.flatnonzero(base.vivas_delta)
+        partes_vectores.append(base.delta[vivas])
+        ids.extend(base.ids_delta[f] for f in vivas)
+        docs.append(base.docs_delta[vivas])
+        versiones.append(base.versiones_delta[vivas])
+        docs, versiones = np.concatenate(docs), np.concatenate(versiones)
+        indice = None
+        if len(ids):
+            matriz = MatrizEmbeddings(np.concatenate(partes_vectores), ids, normalizada=True)
+            indice = IndiceIVF.construir(matriz)
+
+        with self._lock:
+            actual = self._instantanea
+            # Lo eliminado o reemplazado durante la reconstrucción: versión distinta de la vigente
+            vigentes = np.asarray(self._versiones, dtype=np.int64)
+            vigentes[list(self._eliminados)] = -1
+            self._instantanea = Instantanea(
+                indice, docs, versiones, vigentes[docs] == versiones,
+                actual.delta[filas_delta_base:],
+                actual.ids_delta[filas_delta_base:],
+                actual.docs_delta[filas_delta_base:],
+                actual.versiones_delta[filas_delta_base:],
+                actual.vivas_delta[filas_delta_base:]
+            )
+            self.reconstrucciones += 1
+            self.ultima_reconstruccion = {
+                'rows_in': base.filas,
+                'rows_out': len(ids),
+                'seconds': round(time.perf_counter() - inicio, 3)
+            }
+        return self.ultima_reconstruccion
+
+    def reconstruir_en_segundo_plano(self):
+        """Lanzar la reconstrucción en un hilo (una a la vez); devuelve el hilo"""
+        with self._lock:
+            if self._hilo_reconstruccion and self._hilo_reconstruccion.is_alive():
+                return self._hilo_reconstruccion
+            self._hilo_reconstruccion = threading.Thread(
+                target=self.reconstruir, name='recuiva-indice', daemon=True
+            )
+            self._hilo_reconstruccion.start()
+            return self._hilo_reconstruccion
+
+    def esperar_reconstruccion(self):
+        hilo = self._hilo_reconstruccion
+        if hilo:
+            hilo.join()
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def buscar(self, consulta, k=5, nprobe=NPROBE):
+        """Los k chunks vivos más similares: [(similitud, doc_id, chunk_id)], de mayor a menor"""
+        instantanea = self._instantanea
+        consulta = np.array(consulta, dtype=np.float32)
+        consulta /= max(float(np.linalg.norm(consulta)), 1e-12)
+
+        candidatos = []
+        if instantanea.indice is not None:
+            for similitud, fila in instantanea.indice.buscar(consulta, k, nprobe, instantanea.vivas_indice):
+                candidatos.append((similitud, int(instantanea.docs_indice[fila]), instantanea.indice.ids[fila]))
+        if len(instantanea.delta):
+            puntajes = instantanea.delta @ consulta
+            puntajes[~instantanea.vivas_delta] = -np.inf
+            kk = min(k, len(puntajes))
+            for fila in np.argpartition(puntajes, -kk)[-kk:]:
+                if np.isfinite(puntajes[fila]):
+                    candidatos.append((float(puntajes[fila]), int(instantanea.docs_delta[fila]),
+                                       instantanea.ids_delta[fila]))
+        candidatos.sort(key=lambda c: c[0], reverse=True)
+        return [(similitud, self._nombres[codigo], chunk_id) for similitud, codigo, chunk_id in candidatos[:k]]
+
+    def estadisticas(self):
+        instantanea = self._instantanea
+        hilo = self._hilo_reconstruccion
+        return {
+            'documents': len(self._nombres) - len(self._eliminados),
+            'rows': instantanea.filas,
+            'dead_rows': instantanea.muertas,
+            'indexed_rows': len(instantanea.vivas_indice),
+            'delta_rows': len(instantanea.vivas_delta),
+            'rebuilding': bool(hilo and hilo.is_alive()),
+            'rebuilds': self.reconstrucciones,
+            'last_rebuild': self.ultima_reconstruccion
+        }
+
+
+def _benchmark(documentos, chunks_por_documento, consultas=300):
+    """Cambios de documentos mientras otro hilo consulta: latencia con y sin reconstrucción en curso"""
+    from embeddings_mock import vectores_por_temas
+
+    total = documentos * chunks_por_documento
+    vectores, _ = vectores_por_temas(2 * total + consultas, temas=max(10, total // 200), ruido=2.0)
+    preguntas = vectores[-consultas:]
+
+    def chunks(d, version):
+        inicio = (d + version * documentos) * chunks_por_documento % (2 * total)
+        return [f'chunk_{i}' for i in range(chunks_por_documento)], vectores[inicio:inicio + chunks_por_documento]
+
+    indice = IndiceIncremental(reconstruir_automatico=False)
+    inicio = time.perf_counter()
+    for d in range(documentos):
+        indice.agregar_documento(f'doc_{d:05d}', *chunks(d, 0))
+    indice.reconstruir()
+    indice.reconstruir_automatico = True
+    print(f"🗂️  {documentos} documentos x {chunks_por_documento} chunks indexados en {time.perf_counter() - inicio:.2f}s")
+
+    latencias = {True: [], False: []}
+    terminado = threading.Event()
+
+    def consultar():
+        i = 0
+        while not terminado.is_set():
+            reconstruyendo = indice.estadisticas()['rebuilding']
+            t = time.perf_counter()
+            indice.buscar(preguntas[i % consultas], 10)
+            latencias[reconstruyendo].append(time.perf_counter() - t)
+            i += 1
+
+    hilo = threading.Thread(target=consultar)
+    hilo.start()
+    rng = np.random.default_rng(0)
+    eliminados = set()
+    inicio = time.perf_counter()
+    cambios = documentos // 2
+    for paso in range(cambios):
+        d = int(rng.integers(documentos))
+        doc_id = f'doc_{d:05d}'
+        if paso % 3 == 2 and doc_id not in eliminados:
+            indice.eliminar_documento(doc_id)
+            eliminados.add(doc_id)
+        else:
+            indice.agregar_documento(doc_id, *chunks(d, 1))
+            eliminados.discard(doc_id)
+        time.sleep(0.005)
+    duracion = time.perf_counter() - inicio
+    indice.esperar_reconstruccion()
+    terminado.set()
+    hilo.join()
+
+    print(f"   {cambios} cambios (reemplazos + eliminaciones) en {duracion:.2f}s: "
+          f"{1000 * duracion / cambios:.2f} ms/cambio, {indice.reconstrucciones - 1} reconstrucciones en segundo plano")
+    for reconstruyendo, tiempos in latencias.items():
+        if tiempos:
+            print(f"   Consultas {'durante' if reconstruyendo else 'sin'} reconstrucción: {len(tiempos)}, "
+                  f"p50 {1000 * np.median(tiempos):.2f} ms, p95 {1000 * np.percentile(tiempos, 95):.2f} ms")
+    devueltos = {doc_id for pregunta in preguntas[:50] for _, doc_id, _ in indice.buscar(pregunta, 10)}
+    print(f"   Documentos eliminados en resultados: {len(devueltos & eliminados)}")
+    print(f"   Estado: {indice.estadisticas()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recuiva - índice incremental de chunks")
+    parser.add_argument('--benchmark', type=int, metavar='DOCUMENTOS', help="Cambios de documentos con consultas concurrentes")
+    parser.add_argument('--chunks', type=int, default=250, help="Chunks por documento en --benchmark")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        _benchmark(args.benchmark, args.chunks)
+        return 0
+
+    from almacen_corpus import obtener_almacen
+
+    indice = IndiceIncremental.desde_almacen(obtener_almacen())
+    print(f"🗂️  Índice del corpus: {indice.estadisticas()}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
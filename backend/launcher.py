@@ -60,6 +60,7 @@ def mostrar_ayuda():
     print("   • NumPy para cálculos matemáticos")
     print("   • Tkinter para interfaz gráfica")
     print("   • JSON para almacenamiento de resultados")
+    print("   • Registro de modelos: cada modelo se carga una vez por proceso")
     print()
     print("📊 FUNCIONALIDADES:")
     print("   • Lectura de archivos PDF y TXT")
@@ -192,8 +193,10 @@ def ejecutar_consola():
             print("   • ✅ Script encontrado: embeddings_local.py")
             print("\n" + "-"*50)
             
-            # Ejecutar script original
-            subprocess.run([sys.executable, "embeddings_local.py"])
+            # Ejecutar en el mismo proceso para compartir el registro de modelos
+            # con la GUI: el modelo se carga una sola vez por sesión del launcher
+            import embeddings_local
+            embeddings_local.main()
             
             print("-"*50)
         else:
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Lector de Runs de Embeddings (memory-mapped, carga perezosa)
+Abre un run de output/ sin copiarlo al heap: la matriz de vectores, el
+índice (id, offset) y el manifiesto se mapean en memoria, y el texto y la
+metadata de cada chunk se leen solo cuando se piden por id o por fila.
+Los runs JSON antiguos también se pueden abrir (se cargan completos).
+
+Uso:
+    python lector_runs.py output/run.manifest.ndjson [--id chunk_001]
+    python lector_runs.py --listar
+
+Fecha: 18/10/2026
+"""
+
+import argparse
+import glob
+import json
+import mmap
+import os
+import sys
+import time
+
+import numpy as np
+
+from formato_binario import (
+    SUFIJO_INDICE, SUFIJO_MANIFIESTO, VERSION_FORMATO, clave_chunks, es_run_json, indice_manifiesto,
+    rutas_sidecar, ruta_base_run
+)
+
+DIRECTORIO_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
+
+
+class LectorRun:
+    """
+    Acceso perezoso a un run: `matriz` es un memmap (n, d); `chunk(fila)` y
+    `chunk_por_id(id)` leen una sola línea del manifiesto.
+    """
+
+    def __init__(self, ruta):
+        _, self.ruta_manifiesto = rutas_sidecar(ruta)
+        self._archivo = open(self.ruta_manifiesto, 'rb')
+        try:
+            self._manifiesto = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Manifiesto vacío
+            self._archivo.close()
+            raise ValueError(f"Manifiesto vacío: {self.ruta_manifiesto}")
+
+        fin_cabecera = self._manifiesto.find(b'\n')
+        self.cabecera = json.loads(self._manifiesto[:fin_cabecera if fin_cabecera >= 0 else None])
+        if self.cabecera.get('format') != VERSION_FORMATO:
+            self.cerrar()
+            raise ValueError(f"Manifiesto no reconocido: {self.ruta_manifiesto}")
+
+        ruta_vectores = os.path.join(os.path.dirname(self.ruta_manifiesto), self.cabecera['vectors']['file'])
+        self.matriz = np.load(ruta_vectores, mmap_mode='r', allow_pickle=False)
+        self.indice = self._abrir_indice(fin_cabecera + 1)
+
+    def _abrir_indice(self, inicio_chunks):
+        """Índice (id, offset, largo) del manifiesto; se reconstruye si el run no lo tiene"""
+        ruta_indice = ruta_base_run(self.ruta_manifiesto) + SUFIJO_INDICE
+        if os.path.exists(ruta_indice):
+            return np.load(ruta_indice, mmap_mode='r', allow_pickle=False)
+
+        # Run escrito antes de que existiera el índice: un recorrido del manifiesto
+        ids, offsets, largos = [], [], []
+        posicion = inicio_chunks
+        while posicion < len(self._manifiesto):
+            fin = self._manifiesto.find(b'\n', posicion)
+            fin = len(self._manifiesto) if fin < 0 else fin + 1
+            linea = self._manifiesto[posicion:fin]
+            if linea.strip():
+                ids.append(str(json.loads(linea)['id']))
+                offsets.append(posicion)
+                largos.append(fin - posicion)
+            posicion = fin
+        indice = indice_manifiesto(ids, offsets, largos)
+        try:
+            np.save(ruta_indice, indice, allow_pickle=False)
+        except OSError:
+            pass  # Directorio de solo lectura: se usa el índice en memoria
+        return indice
+
+    # ------------------------------------------------------------------
+    # Acceso
+    # ------------------------------------------------------------------
+
+    def __len__(self):
+        return len(self.indice)
+
+    @property
+    def metadata(self):
+        return self.cabecera.get('metadata', {})
+
+    @property
+    def dimension(self):
+        return self.matriz.shape[1] if self.matriz.ndim == 2 else 0
+
+    @property
+    def ids(self):
+        return self.indice['id']
+
+    def _orden_ids(self):
+        """Permutación que ordena los ids (del índice; los índices anteriores a ella se ordenan una vez)"""
+        if 'sorted' in self.indice.dtype.names:
+            return self.indice['sorted']
+        if getattr(self, '_orden', None) is None:
+            self._orden = np.argsort(self.indice['id'], kind='stable')
+        return self._orden
+
+    def fila_de(self, chunk_id):
+        """Fila de un chunk por id (búsqueda binaria sobre el índice mapeado: solo toca O(log n) entradas)"""
+        # A mano y no con np.searchsorted: este copia la columna de ids entera para hacerla contigua
+        chunk_id = str(chunk_id)
+        ids, orden = self.indice['id'], self._orden_ids()
+        bajo, alto = 0, len(orden)
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            if ids[orden[medio]] < chunk_id:
+                bajo = medio + 1
+            else:
+                alto = medio
+        if bajo < len(orden) and ids[orden[bajo]] == chunk_id:
+            return int(orden[bajo])
+        raise KeyError(f"Chunk no encontrado en el run: {chunk_id}")
+
+    def chunk(self, fila):
+        """Registro completo (texto + metadata, sin vector) de la fila `fila`"""
+        entrada = self.indice[fila]
+        inicio = int(entrada['offset'])
+        return json.loads(self._manifiesto[inicio:inicio + int(entrada['length'])])
+
+    def chunk_por_id(self, chunk_id):
+        return self.chunk(self.fila_de(chunk_id))
+
+    def texto(self, fila):
+        return self.chunk(fila)['content']
+
+    def vector(self, fila):
+        """Vista de solo lectura de la fila (sin copia)"""
+        return self.matriz[fila]
+
+    def vector_por_id(self, chunk_id):
+        return self.matriz[self.fila_de(chunk_id)]
+
+    def iterar_chunks(self, inicio=0, fin=None):
+        """Registros de chunks en orden de fila, leídos de a uno"""
+        for fila in range(inicio, len(self) if fin is None else fin):
+            yield self.chunk(fila)
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def cerrar(self):
+        self._manifiesto.close()
+        self._archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+class LectorRunJSON(LectorRun):
+    """Misma interfaz para runs JSON antiguos (esquema de consola o GUI): carga completa"""
+
+    def __init__(self, ruta):
+        with open(ruta, 'r', encoding='utf-8') as f:
+            datos = json.load(f)
+        self.ruta_manifiesto = None
+        clave = clave_chunks(datos)
+        self._chunks = datos.pop(clave)
+        self.cabecera = dict(datos, chunks_key=clave)  # Misma clave que la cabecera de un manifiesto
+        self.matriz = np.array([chunk['embedding']['vector'] for chunk in self._chunks], dtype=np.float32)
+        self.indice = indice_manifiesto([str(chunk['id']) for chunk in self._chunks],
+                                        np.zeros(len(self._chunks)), np.zeros(len(self._chunks)))
+
+    def chunk(self, fila):
+        chunk = dict(self._chunks[fila], row=fila)
+        chunk['embedding'] = {k: v for k, v in chunk['embedding'].items() if k != 'vector'}
+        return chunk
+
+    def cerrar(self):
+        pass
+
+
+def abrir_run(ruta):
+    """Abrir un run (manifiesto, base o cualquiera de sus archivos; o un JSON antiguo)"""
+    if ruta.endswith('.json'):
+        return LectorRunJSON(ruta)
+    return LectorRun(ruta)
+
+
+def listar_runs(directorio=DIRECTORIO_OUTPUT):
+    """Runs disponibles en `directorio`, del más reciente al más antiguo"""
+    rutas = glob.glob(os.path.join(directorio, f'*{SUFIJO_MANIFIESTO}'))
+    rutas += [ruta for ruta in glob.glob(os.path.join(directorio, '*.json')) if es_run_json(ruta)]
+    return sorted(rutas, key=os.path.getmtime, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recuiva - lector de runs de embeddings")
+    parser.add_argument('run', nargs='?', help="Manifiesto o JSON de output/ (por defecto: el más reciente)")
+    parser.add_argument('--id', help="Mostrar un chunk por id")
+    parser.add_argument('--listar', action='store_true', help="Listar los runs de output/")
+    args = parser.parse_args()
+
+    runs = listar_runs()
+    if args.listar:
+        for ruta in runs:
+            print(f"   {os.path.basename(ruta)} ({os.path.getsize(ruta) / 1024:.1f} KB)")
+        return 0
+
+    ruta = args.run or (runs[0] if runs else None)
+    if not ruta:
+        print("❌ No hay runs en output/")
+        return 1
+
+    inicio = time.perf_counter()
+    with abrir_run(ruta) as run:
+        apertura = time.perf_counter() - inicio
+        print(f"📂 {os.path.basename(ruta)}: {len(run)} chunks x {run.dimension}D "
+              f"({run.matriz.dtype}) abierto en {apertura * 1000:.2f} ms")
+        print(f"🤖 Modelo: {run.metadata.get('model', 'N/A')}")
+
+        fila = run.fila_de(args.id) if args.id else 0
+        if len(run):
+            chunk = run.chunk(fila)
+            print(f"📄 {chunk['id']} (fila {fila}): {chunk['content'][:80]}...")
+            print(f"   Vector: {[round(float(x), 4) for x in run.vector(fila)[:5]]}...")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Matriz de Embeddings
+Contenedor único de los vectores de un run para las etapas que comparan
+chunks: una matriz float32 contigua, normalizada (L2) una sola vez, con el
+mapeo id <-> fila y la norma original de cada vector. Similaridades,
+motor por bloques y búsqueda trabajan sobre la matriz directamente, sin
+volver a armar arrays desde las listas de los registros ni suponer que el
+modelo entrega vectores unitarios.
+
+Fecha: 18/10/2026
+"""
+
+import numpy as np
+
+from similitud_bloques import PRESUPUESTO_MB, HILOS_SIMILITUD, MotorSimilitud
+
+EPSILON_NORMA = 1e-12
+
+
+def normalizar_filas(matriz):
+    """Normalizar las filas de `matriz` (float32) en el lugar; devuelve sus normas originales"""
+    normas = np.linalg.norm(matriz, axis=1)
+    matriz /= np.clip(normas, EPSILON_NORMA, None)[:, None]
+    return normas.astype(np.float32, copy=False)
+
+
+class MatrizEmbeddings:
+    """
+    Vectores unitarios (n, d) float32 + ids de chunk por fila. Con
+    `normalizada=True` la matriz se toma tal cual (ya normalizada, sin copia);
+    si no, se copia y se normaliza aquí.
+    """
+
+    def __init__(self, matriz, ids, normas=None, normalizada=False):
+        if normalizada:
+            self.matriz = matriz
+            self.normas = normas if normas is not None else np.linalg.norm(matriz, axis=1).astype(np.float32)
+        else:
+            self.matriz = np.array(matriz, dtype=np.float32, order='C')
+            self.normas = normalizar_filas(self.matriz) if len(self.matriz) else np.zeros(0, dtype=np.float32)
+        self.ids = [str(chunk_id) for chunk_id in ids]
+        if len(self.ids) != len(self.matriz):
+            raise ValueError(f"{len(self.ids)} ids para {len(self.matriz)} vectores")
+        self._filas = None
+
+    @classmethod
+    def desde_registros(cls, registros):
+        """Desde registros de salida ('id', 'embedding'['vector']): la única conversión lista -> array"""
+        from almacen_corpus import _vector_float32
+
+        if not registros:
+            return cls(np.zeros((0, 0), dtype=np.float32), [])
+        matriz = np.stack([_vector_float32(registro['embedding']) for registro in registros])
+        return cls(matriz, [registro['id'] for registro in registros])
+
+    @classmethod
+    def desde_run(cls, ruta):
+        """Desde un run de output/ (JSON o .npy + manifiesto; deshace la escala int8)"""
+        from lector_runs import abrir_run
+
+        with abrir_run(ruta) as run:
+            chunks = list(run.iterar_chunks())
+            matriz = np.array(run.matriz, dtype=np.float32)
+        if chunks and 'scale' in chunks[0]['embedding']:
+            matriz *= np.array([chunk['embedding']['scale'] for chunk in chunks], dtype=np.float32)[:, None]
+        return cls(matriz, [chunk['id'] for chunk in chunks])
+
+    # ------------------------------------------------------------------
+    # Acceso
+    # ------------------------------------------------------------------
+
+    def __len__(self):
+        return len(self.matriz)
+
+    @property
+    def dimension(self):
+        return self.matriz.shape[1] if self.matriz.ndim == 2 else 0
+
+    def fila(self, chunk_id):
+        if self._filas is None:
+            self._filas = {chunk_id: fila for fila, chunk_id in enumerate(self.ids)}
+        try:
+            return self._filas[str(chunk_id)]
+        except KeyError:
+            raise KeyError(f"Chunk no encontrado en la matriz: {chunk_id}") from None
+
+    def vector(self, chunk_id):
+        """Vista (sin copia) del vector unitario de un chunk"""
+        return self.matriz[self.fila(chunk_id)]
+
+    def norma(self, fila):
+        """Norma del vector antes de normalizar (la que devolvió el modelo)"""
+        return float(self.normas[fila])
+
+    def subconjunto(self, filas):
+        """Otra MatrizEmbeddings con las filas indicadas (copia)"""
+        filas = np.asarray(filas, dtype=np.int64)
+        return MatrizEmbeddings(self.matriz[filas], [self.ids[f] for f in filas], self.normas[filas], normalizada=True)
+
+    # ------------------------------------------------------------------
+    # Similitudes
+    # ------------------------------------------------------------------
+
+    def normalizar_consulta(self, vectores):
+        """Vector (d,) o matriz (m, d) de consulta -> float32 unitario(s)"""
+        consulta = np.array(vectores, dtype=np.float32, ndmin=2)
+        normalizar_filas(consulta)
+        return consulta
+
+    def similitud(self, id_a, id_b):
+        return float(self.vector(id_a) @ self.vector(id_b))
+
+    def similitudes(self, consulta):
+        """Coseno de cada consulta (m, d) contra todas las filas: (m, n)"""
+        return self.normalizar_consulta(consulta) @ self.matriz.T
+
+    def mas_similares(self, consulta, k=5, filas=None):
+        """
+        Los k chunks más similares a un vector de consulta: [(similitud, fila)],
+        de mayor a menor. `filas` restringe la búsqueda a un subconjunto.
+        """
+        candidatas = self.matriz if filas is None else self.matriz[filas]
+        puntajes = candidatas @ self.normalizar_consulta(consulta)[0]
+        k = min(k, len(puntajes))
+        if k <= 0:
+            return []
+        mejores = np.argpartition(puntajes, -k)[-k:]
+        mejores = mejores[np.argsort(-puntajes[mejores], kind='stable')]
+        origen = np.arange(len(self)) if filas is None else np.asarray(filas)
+        return [(float(puntajes[m]), int(origen[m])) for m in mejores]
+
+    def motor(self, presupuesto_mb=PRESUPUESTO_MB, hilos=HILOS_SIMILITUD):
+        """MotorSimilitud (todos los pares por bloques) sobre la matriz normalizada, sin copia"""
+        return MotorSimilitud(self.matriz, presupuesto_mb, hilos)
+
+    def top_k_pares(self, k=3):
+        """Top-k pares (coseno, i, j) con i < j"""
+        return self.motor().top_k_pares(k)
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Migración de Runs Antiguos al Corpus
+Importa en bloque los resultados guardados con los esquemas anteriores
+(`script_version` 1.0 de embeddings_local.py y 3.0_GUI_ActiveRecall de la
+GUI; también runs .npy + manifiesto) al almacén de corpus. Cada archivo se
+lee, valida y normaliza en un proceso aparte; el proceso principal agrupa
+los documentos en segmentos grandes a medida que llegan, así la memoria
+no depende de cuántos archivos haya. Los archivos ya migrados (mismo
+tamaño y fecha de modificación) se saltan. El modelo del corpus se fija
+antes de empezar (el del corpus, --modelo o el del primer archivo en orden)
+y si el mismo documento aparece en varias carpetas gana el más reciente,
+sin depender del orden en que terminan los procesos.
+
+Uso:
+    python migrar_legacy.py output/ [otra_carpeta/ run.json ...] [--procesos 4] [--modelo all-MiniLM-L6-v2]
+    python migrar_legacy.py output/ --validar          (solo validar, sin escribir)
+    python migrar_legacy.py --benchmark 2000           (archivos sintéticos de ambos esquemas)
+
+Fecha: 18/10/2026
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from almacen_corpus import AlmacenCorpus, _vector_float32, hash_contenido, obtener_almacen
+from formato_binario import SUFIJO_MANIFIESTO, es_run_json, ruta_base_run
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+PROCESOS_MIGRACION = int(os.environ.get('RECUIVA_PROCESOS_MIGRACION', '0')) or max(1, os.cpu_count() or 1)
+FILAS_POR_SEGMENTO = 8192   # Documentos que se juntan en un mismo segmento del corpus
+
+# Esquemas conocidos: clave de chunks y claves extra que se conservan como conteos
+ESQUEMAS = {
+    '1.0': {
+        'chunks': 'chunks',
+        'similarities': 'top_similaridades',
+        'questions': None
+    },
+    '3.0_GUI_ActiveRecall': {
+        'chunks': 'chunks_procesados',
+        'similarities': 'analisis_similaridades',
+        'questions': 'preguntas_active_recall'
+    }
+}
+
+
+class ErrorEsquema(ValueError):
+    """Archivo que no corresponde a ningún esquema conocido o con datos inválidos"""
+
+
+def detectar_esquema(datos):
+    """Versión de esquema de un resultado (por script_version o, si falta, por sus claves)"""
+    if not isinstance(datos, dict):
+        raise ErrorEsquema("El archivo no contiene un objeto JSON")
+    version = (datos.get('metadata') or {}).get('script_version')
+    if version in ESQUEMAS:
+        return version
+    for nombre, esquema in ESQUEMAS.items():
+        if esquema['chunks'] in datos:
+            return nombre
+    raise ErrorEsquema(f"Esquema desconocido (script_version={version!r}, claves: {', '.join(sorted(datos))})")
+
+
+def normalizar_chunks(chunks, dimension_declarada=None):
+    """
+    Validar y normalizar los chunks de un run: (registros sin vector, matriz
+    float32). Completa 'length' y 'type' si faltan y agrega 'content_hash'.
+    """
+    if not isinstance(chunks, list) or not chunks:
+        raise ErrorEsquema("Lista de chunks vacía o inválida")
+
+    registros, vectores, ids = [], [], set()
+    for posicion, chunk in enumerate(chunks):
+        if not isinstance(chunk, dict) or not isinstance(chunk.get('content'), str):
+            raise ErrorEsquema(f"Chunk {posicion} sin contenido de texto")
+        chunk_id = str(chunk.get('id', f'chunk_{posicion + 1:03d}'))
+        if chunk_id in ids:
+            raise ErrorEsquema(f"Id de chunk repetido: {chunk_id}")
+        ids.add(chunk_id)
+
+        embedding = chunk.get('embedding')
+        if not isinstance(embedding, dict) or 'vector' not in embedding:
+            raise ErrorEsquema(f"Chunk {chunk_id} sin vector")
+        try:
+            vector = _vector_float32(embedding)
+        except (TypeError, ValueError):
+            raise ErrorEsquema(f"Vector no numérico en {chunk_id}")
+        if vector.ndim != 1 or not len(vector):
+            raise ErrorEsquema(f"Vector con forma inválida en {chunk_id}: {vector.shape}")
+        vectores.append(vector)
+
+        registros.append({
+            'id': chunk_id,
+            'content': chunk['content'],
+            'length': int(chunk.get('length', len(chunk['content']))),
+            'type': chunk.get('type', 'paragraph'),
+            'content_hash': hash_contenido(chunk['content']),
+            'embedding': {'dimension': len(vector)}
+        })
+
+    dimensiones = {len(vector) for vector in vectores}
+    if len(dimensiones) > 1:
+        raise ErrorEsquema(f"Vectores de dimensiones distintas: {sorted(dimensiones)}")
+    matriz = np.vstack(vectores)
+    if dimension_declarada and matriz.shape[1] != dimension_declarada:
+        raise ErrorEsquema(f"Dimensión declarada {dimension_declarada} distinta a la de los vectores ({matriz.shape[1]})")
+    if not np.isfinite(matriz).all():
+        raise ErrorEsquema("Vectores con NaN o infinitos")
+
+    normas = np.linalg.norm(matriz, axis=1)
+    for registro, norma in zip(registros, normas):
+        registro['embedding']['norm'] = float(norma)
+    return registros, matriz
+
+
+def _leer_json(ruta):
+    with open(ruta, 'rb') as f:
+        contenido = f.read()
+    try:
+        return orjson.loads(contenido) if ORJSON_AVAILABLE else json.loads(contenido)
+    except ValueError as e:
+        raise ErrorEsquema(f"JSON inválido: {e}")
+
+
+def _leer_manifiesto_binario(ruta):
+    """Run .npy + manifiesto: (esquema, metadata, chunks con vector, conteo de preguntas)"""
+    from lector_runs import LectorRun
+
+    with LectorRun(ruta) as run:
+        metadata = dict(run.metadata)
+        chunks = []
+        for fila, chunk in enumerate(run.iterar_chunks()):
+            chunk['embedding']['vector'] = np.array(run.matriz[fila])
+            chunks.append(chunk)
+        preguntas = len(run.cabecera.get('preguntas_active_recall', []))
+    return metadata.get('script_version', 'binario'), metadata, chunks, preguntas
+
+
+def leer_run_legacy(ruta):
+    """
+    Leer, validar y normalizar un run de cualquier esquema conocido. Devuelve
+    {'doc_id', 'model', 'metadata', 'chunks', 'matrix'}; lanza ErrorEsquema
+    si el archivo no se puede migrar.
+    """
+    if ruta.endswith(SUFIJO_MANIFIESTO):
+        esquema, metadata, chunks, preguntas = _leer_manifiesto_binario(ruta)
+    else:
+        datos = _leer_json(ruta)
+        esquema = detectar_esquema(datos)
+        metadata = datos.get('metadata') or {}
+        chunks = datos.get(ESQUEMAS[esquema]['chunks'])
+        clave_preguntas = ESQUEMAS[esquema]['questions']
+        preguntas = len(datos.get(clave_preguntas) or []) if clave_preguntas else 0
+
+    registros, matriz = normalizar_chunks(chunks, metadata.get('dimension'))
+    estado = os.stat(ruta)
+    return {
+        'doc_id': os.path.basename(ruta_base_run(ruta)),
+        'model': metadata.get('model') or 'desconocido',
+        'metadata': {
+            'source': os.path.basename(ruta),
+            'schema': esquema,
+            'timestamp': metadata.get('timestamp'),
+            'source_file': metadata.get('source_file'),
+            'questions': preguntas,
+            'source_size': estado.st_size,
+            'source_mtime_ns': estado.st_mtime_ns
+        },
+        'chunks': registros,
+        'matrix': matriz
+    }
+
+
+def _leer_en_worker(ruta):
+    """Tarea de cada proceso: nunca lanza, devuelve (ruta, documento, error)"""
+    try:
+        return ruta, leer_run_legacy(ruta), None
+    except Exception as e:  # Un archivo roto se rechaza sin abortar la migración
+        return ruta, None, f"{type(e).__name__}: {e}"
+
+
+def _inicializar_worker():
+    # Cada worker solo parsea y valida: un hilo de BLAS por proceso
+    for variable in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[variable] = '1'
+
+
+def expandir_rutas(rutas):
+    """Carpetas -> sus runs .json y manifiestos (recursivo, sin archivos auxiliares); archivos tal cual"""
+    archivos = []
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            json_runs = glob.glob(os.path.join(ruta, '**', '*.json'), recursive=True)
+            archivos.extend(archivo for archivo in json_runs if es_run_json(archivo))
+            archivos.extend(glob.glob(os.path.join(ruta, '**', f'*{SUFIJO_MANIFIESTO}'), recursive=True))
+        else:
+            archivos.append(ruta)
+    return sorted(set(archivos))
+
+
+def versiones_mas_recientes(archivos):
+    """
+    (archivos a migrar, {ruta descartada: ruta que la reemplaza}): por cada
+    doc_id se queda el archivo modificado más recientemente (a igual fecha,
+    el último por ruta)
+    """
+    ganadores = {}
+    for ruta in archivos:
+        doc_id = os.path.basename(ruta_base_run(ruta))
+        actual = ganadores.get(doc_id)
+        if actual is None or (os.stat(ruta).st_mtime_ns, ruta) > (os.stat(actual).st_mtime_ns, actual):
+            ganadores[doc_id] = ruta
+    elegidos = set(ganadores.values())
+    reemplazados = {ruta: ganadores[os.path.basename(ruta_base_run(ruta))] for ruta in archivos if ruta not in elegidos}
+    return [ruta for ruta in archivos if ruta in elegidos], reemplazados
+
+
+def modelo_inicial(archivos):
+    """Modelo del primer archivo legible en orden de ruta (corpus vacío y sin --modelo)"""
+    for ruta in archivos:
+        _, doc, _ = _leer_en_worker(ruta)
+        if doc is not None:
+            return doc['model']
+    return None
+
+
+def ya_migrado(almacen, ruta):
+    """El documento de `ruta` ya está en el corpus con el mismo tamaño y fecha de modificación"""
+    documento = almacen.manifiesto['documents'].get(os.path.basename(ruta_base_run(ruta)))
+    if not documento:
+        return False
+    estado = os.stat(ruta)
+    metadata = documento['metadata']
+    return metadata.get('source_size') == estado.st_size and metadata.get('source_mtime_ns') == estado.st_mtime_ns
+
+
+def migrar(rutas, almacen=None, procesos=PROCESOS_MIGRACION, solo_validar=False, forzar=False,
+           filas_por_segmento=FILAS_POR_SEGMENTO, progreso=None, modelo=None):
+    """
+    Migrar `rutas` (archivos o carpetas) al corpus. Devuelve un reporte con
+    conteos, tiempos y el motivo de cada archivo rechazado. Solo se aceptan
+    runs de `modelo` (por defecto el del corpus o, si está vacío, el del
+    primer archivo legible en orden de ruta).
+    """
+    almacen = almacen or obtener_almacen()
+    inicio = time.perf_counter()
+    archivos, reemplazados = versiones_mas_recientes(expandir_rutas(rutas))
+    pendientes = archivos if forzar or solo_validar else [r for r in archivos if not ya_migrado(almacen, r)]
+    reporte = {
+        'files': len(archivos) + len(reemplazados),
+        'skipped': len(archivos) - len(pendientes),
+        'superseded': reemplazados,
+        'migrated': 0,
+        'chunks': 0,
+        'segments': [],
+        'schemas': {},
+        'rejected': {}
+    }
+
+    lote, filas_lote = [], 0
+    if almacen.manifiesto['model'] and modelo and modelo != almacen.manifiesto['model']:
+        raise ValueError(f"Modelo {modelo} distinto al del corpus ({almacen.manifiesto['model']})")
+    modelo_corpus = almacen.manifiesto['model'] or modelo or modelo_inicial(pendientes)
+    reporte['model'] = modelo_corpus
+
+    def volcar_lote():
+        nonlocal lote, filas_lote
+        if lote and not solo_validar:
+            documentos = []
+            for doc in lote:
+                for registro, vector in zip(doc['chunks'], doc['matrix']):
+                    registro['embedding']['vector'] = vector
+                documentos.append((doc['doc_id'], doc['chunks'], doc['metadata']))
+            reporte['segments'].append(almacen.agregar_documentos(documentos, modelo_corpus))
+        lote, filas_lote = [], 0
+
+    def resultados():
+        if procesos <= 1 or len(pendientes) < 2:
+            yield from map(_leer_en_worker, pendientes)
+            return
+        contexto = multiprocessing.get_context('spawn')
+        with contexto.Pool(min(procesos, len(pendientes)), initializer=_inicializar_worker) as pool:
+            yield from pool.imap_unordered(_leer_en_worker, pendientes, chunksize=4)
+
+    for procesados, (ruta, doc, error) in enumerate(resultados(), 1):
+        if doc is not None:
+            if doc['model'] != modelo_corpus:
+                error = f"Modelo {doc['model']} distinto al del corpus ({modelo_corpus})"
+            elif almacen.manifiesto['dimension'] and doc['matrix'].shape[1] != almacen.manifiesto['dimension']:
+                error = f"Dimensión {doc['matrix'].shape[1]} distinta a la del corpus ({almacen.manifiesto['dimension']})"
+        if error:
+            reporte['rejected'][ruta] = error
+        else:
+            lote.append(doc)
+            filas_lote += len(doc['chunks'])
+            reporte['migrated'] += 1
+            reporte['chunks'] += len(doc['chunks'])
+            esquema = doc['metadata']['schema']
+            reporte['schemas'][esquema] = reporte['schemas'].get(esquema, 0) + 1
+            if filas_lote >= filas_por_segmento:
+                volcar_lote()
+        if progreso:
+            progreso(procesados, len(pendientes))
+    volcar_lote()
+
+    duracion = time.perf_counter() - inicio
+    reporte['seconds'] = round(duracion, 3)
+    reporte['files_per_s'] = round(reporte['migrated'] / duracion, 1) if duracion else 0.0
+    reporte['chunks_per_s'] = round(reporte['chunks'] / duracion, 1) if duracion else 0.0
+    return reporte
+
+
+def _escribir_runs_sinteticos(directorio, total, chunks_por_run):
+    """Runs JSON de ambos esquemas con vectores mock, para el benchmark"""
+    from datetime import datetime
+    from embeddings_mock import chunks_sinteticos, generar_vectores_mock
+    from escritor_json import guardar_json_streaming
+    from streaming_embeddings import registro_chunk
+
+    for n in range(total):
+        chunks = list(chunks_sinteticos(chunks_por_run, inicio=n * chunks_por_run))
+        matriz = generar_vectores_mock([chunk['content'] for chunk in chunks])
+        registros = [registro_chunk(chunk, fila) for chunk, fila in zip(chunks, matriz)]
+        metadata = {'timestamp': datetime.now().isoformat(), 'model': 'mock', 'total_chunks': len(registros),
+                    'dimension': matriz.shape[1]}
+        if n % 2:
+            metadata['script_version'] = '3.0_GUI_ActiveRecall'
+            resultado = {'metadata': metadata, 'preguntas_active_recall': [], 'chunks_procesados': registros,
+                         'analisis_similaridades': []}
+        else:
+            metadata['script_version'] = '1.0'
+            resultado = {'metadata': metadata, 'chunks': registros, 'top_similaridades': []}
+        guardar_json_streaming(os.path.join(directorio, f'run_{n:05d}.json'), resultado)
+
+
+def _benchmark(total, chunks_por_run, procesos):
+    import shutil
+    import tempfile
+
+    directorio = tempfile.mkdtemp(prefix='recuiva_migracion_')
+    try:
+        origen = os.path.join(directorio, 'runs')
+        os.makedirs(origen)
+        _escribir_runs_sinteticos(origen, total, chunks_por_run)
+        tamaño = sum(os.path.getsize(ruta) for ruta in glob.glob(os.path.join(origen, '*.json')))
+        print(f"📦 {total:,} runs x {chunks_por_run} chunks ({tamaño / 1024 / 1024:.0f} MB de JSON)")
+
+        for n_procesos in sorted({1, procesos}):
+            almacen = AlmacenCorpus(os.path.join(directorio, f'corpus_{n_procesos}'))
+            reporte = migrar([origen], almacen, procesos=n_procesos)
+            almacen.cerrar()
+            print(f"   {n_procesos:>2} proceso(s): {reporte['seconds']:>7.2f}s  "
+                  f"{reporte['files_per_s']:>7.1f} archivos/s  {reporte['chunks_per_s']:>9,.0f} chunks/s  "
+                  f"({len(reporte['segments'])} segmentos)")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recuiva - migración de runs antiguos al corpus")
+    parser.add_argument('rutas', nargs='*', help="Archivos o carpetas con runs (.json o manifiestos)")
+    parser.add_argument('--procesos', type=int, default=PROCESOS_MIGRACION)
+    parser.add_argument('--validar', action='store_true', help="Solo validar los archivos, sin escribir")
+    parser.add_argument('--forzar', action='store_true', help="Reimportar archivos ya migrados")
+    parser.add_argument('--modelo', help="Modelo de los runs a aceptar (por defecto: el del corpus o el del primer archivo)")
+    parser.add_argument('--benchmark', type=int, metavar='RUNS', help="Migrar RUNS archivos sintéticos")
+    parser.add_argument('--chunks', type=int, default=40, help="Chunks por run sintético (benchmark)")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        _benchmark(args.benchmark, args.chunks, args.procesos)
+        return 0
+    if not args.rutas:
+        parser.error("Indicar al menos un archivo o carpeta")
+
+    def progreso(procesados, total):
+        if procesados % 100 == 0 or procesados == total:
+            print(f"   {procesados}/{total} archivos", end='\r')
+
+    try:
+        reporte = migrar(args.rutas, procesos=args.procesos, solo_validar=args.validar, forzar=args.forzar,
+                         progreso=progreso, modelo=args.modelo)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"\n✅ {reporte['migrated']} runs {'válidos' if args.validar else 'migrados'} "
+          f"({reporte['chunks']:,} chunks, modelo {reporte['model']}) en {reporte['seconds']:.2f}s; "
+          f"{reporte['skipped']} ya migrados; esquemas: {reporte['schemas']}")
+    for ruta, ganador in reporte['superseded'].items():
+        print(f"↪️  {ruta}: reemplazado por la versión más reciente {ganador}")
+    for ruta, motivo in sorted(reporte['rejected'].items()):
+        print(f"❌ {ruta}: {motivo}")
+    return 1 if reporte['rejected'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
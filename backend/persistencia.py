@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Persistencia en SQLite
+Capa de datos del backend: usuarios, materiales, chunks (con su vector
+float32 como BLOB), preguntas generadas, progreso de repaso e historial.
+Reemplaza lo que hoy guarda assets/js/mockApi.js en localStorage.
+SQLite en modo WAL: una conexión de escritura (serializada con un lock) y
+un pool de conexiones de solo lectura para consultas concurrentes. Las
+consultas son sentencias fijas con parámetros, así sqlite3 reutiliza la
+sentencia preparada de cada conexión; los índices cubren las consultas
+por usuario, por material y por fecha del próximo repaso.
+
+Uso:
+    python persistencia.py [--usuarios 1000] [--hilos 8]
+    (carga masiva sintética y latencia de consultas por usuario)
+
+Fecha: 18/10/2026
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+RUTA_BD = os.environ.get(
+    'RECUIVA_BD',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datos', 'recuiva.sqlite')
+)
+LECTORES_POR_DEFECTO = int(os.environ.get('RECUIVA_BD_LECTORES', '8'))
+SENTENCIAS_EN_CACHE = 256   # Sentencias preparadas que sqlite3 guarda por conexión
+SEGUNDOS_POR_DIA = 24 * 60 * 60
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS usuarios (
+    id TEXT PRIMARY KEY,
+    email TEXT UNIQUE,
+    nombre TEXT,
+    creado REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS materiales (
+    id TEXT PRIMARY KEY,
+    usuario_id TEXT NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+    titulo TEXT NOT NULL,
+    fuente TEXT,
+    modelo TEXT,
+    dimension INTEGER,
+    creado REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_materiales_usuario ON materiales(usuario_id, creado);
+CREATE TABLE IF NOT EXISTS chunks (
+    material_id TEXT NOT NULL REFERENCES materiales(id) ON DELETE CASCADE,
+    fila INTEGER NOT NULL,
+    chunk_id TEXT NOT NULL,
+    contenido TEXT NOT NULL,
+    tipo TEXT,
+    largo INTEGER,
+    contenido_hash TEXT,
+    vector BLOB,
+    PRIMARY KEY (material_id, fila)
+) WITHOUT ROWID;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_chunks_id ON chunks(material_id, chunk_id);
+CREATE INDEX IF NOT EXISTS idx_chunks_hash ON chunks(contenido_hash);
+CREATE TABLE IF NOT EXISTS preguntas (
+    id TEXT PRIMARY KEY,
+    material_id TEXT NOT NULL REFERENCES materiales(id) ON DELETE CASCADE,
+    chunk_id TEXT,
+    pregunta TEXT NOT NULL,
+    respuesta TEXT,
+    concepto TEXT,
+    dificultad TEXT,
+    datos TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_preguntas_material ON preguntas(material_id);
+CREATE TABLE IF NOT EXISTS progreso (
+    usuario_id TEXT NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+    pregunta_id TEXT NOT NULL REFERENCES preguntas(id) ON DELETE CASCADE,
+    material_id TEXT NOT NULL,
+    intervalo INTEGER NOT NULL,
+    repeticiones INTEGER NOT NULL,
+    ultima_calificacion INTEGER,
+    ultimo_puntaje REAL,
+    proximo_repaso REAL NOT NULL,
+    actualizado REAL NOT NULL,
+    PRIMARY KEY (usuario_id, pregunta_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_progreso_proximo ON progreso(usuario_id, proximo_repaso);
+CREATE INDEX IF NOT EXISTS idx_progreso_material ON progreso(usuario_id, material_id);
+CREATE TABLE IF NOT EXISTS repasos (
+    id INTEGER PRIMARY KEY,
+    usuario_id TEXT NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+    pregunta_id TEXT NOT NULL REFERENCES preguntas(id) ON DELETE CASCADE,
+    calificacion INTEGER NOT NULL,
+    puntaje REAL,
+    intervalo INTEGER NOT NULL,
+    fecha REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_repasos_usuario ON repasos(usuario_id, fecha);
+CREATE INDEX IF NOT EXISTS idx_repasos_pregunta ON repasos(pregunta_id, fecha);
+"""
+
+# Sentencias (texto fijo: cada conexión prepara cada una una sola vez)
+# Usuarios, materiales y preguntas con upsert: INSERT OR REPLACE borraría la fila y, en cascada, todo lo que cuelga de ella
+SQL_INSERTAR_USUARIO = (
+    'INSERT INTO usuarios (id, email, nombre, creado) VALUES (?, ?, ?, ?) '
+    'ON CONFLICT (id) DO UPDATE SET email = excluded.email, nombre = excluded.nombre'
+)
+SQL_INSERTAR_MATERIAL = (
+    'INSERT INTO materiales (id, usuario_id, titulo, fuente, modelo, dimension, creado) VALUES (?, ?, ?, ?, ?, ?, ?) '
+    'ON CONFLICT (id) DO UPDATE SET titulo = excluded.titulo, fuente = excluded.fuente, '
+    'modelo = excluded.modelo, dimension = excluded.dimension'
+)
+# Los chunks de un material se reemplazan en bloque (agregar_chunks borra los anteriores primero)
+SQL_BORRAR_CHUNKS = 'DELETE FROM chunks WHERE material_id = ?'
+SQL_INSERTAR_CHUNK = (
+    'INSERT OR REPLACE INTO chunks (material_id, fila, chunk_id, contenido, tipo, largo, contenido_hash, vector) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+)
+SQL_INSERTAR_PREGUNTA = (
+    'INSERT INTO preguntas (id, material_id, chunk_id, pregunta, respuesta, concepto, dificultad, datos) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+    'ON CONFLICT (id) DO UPDATE SET chunk_id = excluded.chunk_id, pregunta = excluded.pregunta, '
+    'respuesta = excluded.respuesta, concepto = excluded.concepto, dificultad = excluded.dificultad, '
+    'datos = excluded.datos'
+)
+SQL_INSERTAR_REPASO = (
+    'INSERT INTO repasos (usuario_id, pregunta_id, calificacion, puntaje, intervalo, fecha) VALUES (?, ?, ?, ?, ?, ?)'
+)
+SQL_GUARDAR_PROGRESO = """
+    INSERT INTO progreso (usuario_id, pregunta_id, material_id, intervalo, repeticiones,
+                          ultima_calificacion, ultimo_puntaje, proximo_repaso, actualizado)
+    SELECT ?, id, material_id, ?, 1, ?, ?, ?, ? FROM preguntas WHERE id = ?
+    ON CONFLICT (usuario_id, pregunta_id) DO UPDATE SET
+        intervalo = excluded.intervalo,
+        repeticiones = progreso.repeticiones + 1,
+        ultima_calificacion = excluded.ultima_calificacion,
+        ultimo_puntaje = excluded.ultimo_puntaje,
+        proximo_repaso = excluded.proximo_repaso,
+        actualizado = excluded.actualizado
+"""
+SQL_INTERVALO_ACTUAL = 'SELECT intervalo FROM progreso WHERE usuario_id = ? AND pregunta_id = ?'
+SQL_MATERIALES_USUARIO = """
+    SELECT m.id, m.titulo, m.fuente, m.modelo, m.creado,
+           (SELECT COUNT(*) FROM chunks c WHERE c.material_id = m.id),
+           (SELECT COUNT(*) FROM preguntas p WHERE p.material_id = m.id)
+    FROM materiales m WHERE m.usuario_id = ? ORDER BY m.creado DESC
+"""
+SQL_CHUNKS_MATERIAL = (
+    'SELECT fila, chunk_id, contenido, tipo, largo, contenido_hash FROM chunks WHERE material_id = ? ORDER BY fila'
+)
+SQL_VECTORES_MATERIAL = 'SELECT chunk_id, vector FROM chunks WHERE material_id = ? ORDER BY fila'
+SQL_PREGUNTAS_MATERIAL = (
+    'SELECT id, chunk_id, pregunta, respuesta, concepto, dificultad, datos FROM preguntas WHERE material_id = ?'
+)
+SQL_REPASOS_PENDIENTES = """
+    SELECT p.pregunta_id, p.material_id, m.titulo, q.pregunta, p.intervalo, p.repeticiones,
+           p.ultima_calificacion, p.ultimo_puntaje, p.proximo_repaso
+    FROM progreso p
+    JOIN preguntas q ON q.id = p.pregunta_id
+    JOIN materiales m ON m.id = p.material_id
+    WHERE p.usuario_id = ? AND p.proximo_repaso <= ?
+    ORDER BY p.proximo_repaso LIMIT ?
+"""
+SQL_HISTORIAL = """
+    SELECT pregunta_id, calificacion, puntaje, intervalo, fecha FROM repasos
+    WHERE usuario_id = ? ORDER BY fecha DESC LIMIT ?
+"""
+SQL_HISTORIAL_PREGUNTA = """
+    SELECT pregunta_id, calificacion, puntaje, intervalo, fecha FROM repasos
+    WHERE usuario_id = ? AND pregunta_id = ? ORDER BY fecha DESC LIMIT ?
+"""
+SQL_ESTADISTICAS_USUARIO = """
+    SELECT COUNT(*), COALESCE(SUM(proximo_repaso <= ?), 0), AVG(ultimo_puntaje), AVG(intervalo)
+    FROM progreso WHERE usuario_id = ?
+"""
+
+
+def nuevo_intervalo(intervalo_actual, calificacion):
+    """
+    Intervalo en días tras un repaso (SM-2 simplificado, el mismo que
+    calculateNewInterval en mockApi.js): 1 mala, 2 regular, 3 buena, 4 excelente.
+    """
+    if calificacion == 1:
+        return 1
+    if calificacion == 2:
+        return max(1, intervalo_actual // 2)
+    if calificacion == 4:
+        return max(intervalo_actual + 1, int(intervalo_actual * 1.3))  # floor(1 * 1.3) dejaría el intervalo en 1
+    return intervalo_actual
+
+
+def _fecha_iso(segundos):
+    return datetime.fromtimestamp(segundos).isoformat() if segundos is not None else None
+
+
+def _id_pregunta(material_id, texto, chunk_id):
+    """
+    Id estable de una pregunta sin 'id' propio (derivado de su texto y su chunk):
+    reimportar el mismo material actualiza la pregunta en vez de duplicarla
+    """
+    huella = hashlib.sha1(f"{chunk_id}\x00{texto}".encode('utf-8')).hexdigest()[:12]
+    return f"{material_id}:q_{huella}"
+
+
+def _fila_pregunta(material_id, pregunta):
+    """Pregunta del esquema de la GUI ('pregunta', 'chunk_fuente') o de mockApi ('question', 'answer')"""
+    conocidas = ('id', 'pregunta', 'question', 'answer', 'respuesta', 'concepto_clave', 'dificultad',
+                 'difficulty', 'chunk_fuente', 'chunk_id')
+    extra = {clave: valor for clave, valor in pregunta.items() if clave not in conocidas}
+    dificultad = pregunta.get('dificultad', pregunta.get('difficulty'))
+    chunk_id = pregunta.get('chunk_id', pregunta.get('chunk_fuente'))
+    chunk_id = None if chunk_id == 'N/A' else chunk_id
+    texto = pregunta.get('pregunta', pregunta.get('question'))
+    return (
+        f"{material_id}:{pregunta['id']}" if 'id' in pregunta else _id_pregunta(material_id, texto, chunk_id),
+        material_id,
+        chunk_id,
+        texto,
+        pregunta.get('respuesta', pregunta.get('answer')),
+        pregunta.get('concepto_clave'),
+        None if dificultad is None else str(dificultad),
+        json.dumps(extra, ensure_ascii=False) if extra else None
+    )
+
+
+class Persistencia:
+    """
+    Base SQLite del backend. Escrituras por una sola conexión (con lock);
+    lecturas por un pool de hasta `lectores` conexiones de solo lectura.
+    """
+
+    def __init__(self, ruta=RUTA_BD, lectores=LECTORES_POR_DEFECTO):
+        directorio = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(directorio, exist_ok=True)
+        self.ruta = ruta
+        self.max_lectores = max(1, lectores)
+        self._lock_escritura = threading.Lock()
+        self._lock_pool = threading.Lock()
+        self._lectores = queue.LifoQueue()
+        self._lectores_creados = 0
+
+        self._escritor = self._conectar()
+        self._escritor.execute('PRAGMA journal_mode=WAL')
+        self._escritor.executescript(ESQUEMA)
+        self._escritor.commit()
+
+    def _conectar(self, solo_lectura=False):
+        conexion = sqlite3.connect(self.ruta, check_same_thread=False, timeout=30,
+                                   cached_statements=SENTENCIAS_EN_CACHE)
+        conexion.execute('PRAGMA synchronous=NORMAL')
+        conexion.execute('PRAGMA foreign_keys=ON')
+        conexion.execute('PRAGMA temp_store=MEMORY')
+        if solo_lectura:
+            conexion.execute('PRAGMA query_only=ON')
+            conexion.execute('PRAGMA mmap_size=268435456')
+        return conexion
+
+    # ------------------------------------------------------------------
+    # Conexiones
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def _lectura(self):
+        """Conexión de lectura del pool (se crea otra si hay cupo; si no, se espera una libre)"""
+        try:
+            conexion = self._lectores.get_nowait()
+        except queue.Empty:
+            with self._lock_pool:
+                crear = self._lectores_creados < self.max_lectores
+                self._lectores_creados += crear
+            conexion = self._conectar(solo_lectura=True) if crear else self._lectores.get()
+        try:
+            yield conexion
+        finally:
+            self._lectores.put(conexion)
+
+    @contextmanager
+    def _escritura(self):
+        """Transacción en la conexión de escritura (commit al salir, rollback si hay error)"""
+        with self._lock_escritura:
+            with self._escritor:
+                yield self._escritor
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def guardar_usuario(self, usuario_id, email=None, nombre=None):
+        with self._escritura() as conexion:
+            conexion.execute(SQL_INSERTAR_USUARIO, (usuario_id, email, nombre, time.time()))
+        return usuario_id
+
+    def guardar_usuarios(self, usuarios):
+        """Carga masiva: [{'id', 'email', 'name'}] (formato de mockApi) en una transacción"""
+        ahora = time.time()
+        with self._escritura() as conexion:
+            conexion.executemany(SQL_INSERTAR_USUARIO, (
+                (u['id'], u.get('email'), u.get('name', u.get('nombre')), ahora) for u in usuarios
+            ))
+
+    def crear_material(self, usuario_id, titulo, material_id=None, fuente=None, modelo=None, dimension=None):
+        material_id = material_id or f"mat_{uuid.uuid4().hex[:12]}"
+        with self._escritura() as conexion:
+            conexion.execute(SQL_INSERTAR_MATERIAL,
+                             (material_id, usuario_id, titulo, fuente, modelo, dimension, time.time()))
+        return material_id
+
+    def agregar_chunks(self, material_id, chunks, vectores=None):
+        """
+        Carga masiva de chunks (registros con 'id' y 'content'). Los vectores
+        salen de `vectores` (n, d) o de chunk['embedding']['vector']; se guardan
+        como BLOB float32. Reemplaza los chunks que el material ya tuviera.
+        """
+        from almacen_corpus import _vector_float32, hash_contenido
+
+        def filas():
+            for fila, chunk in enumerate(chunks):
+                if vectores is not None:
+                    vector = np.asarray(vectores[fila], dtype=np.float32)
+                elif 'vector' in chunk.get('embedding', {}):
+                    vector = _vector_float32(chunk['embedding'])
+                else:
+                    vector = None
+                yield (material_id, fila, str(chunk['id']), chunk['content'], chunk.get('type'),
+                       chunk.get('length', len(chunk['content'])),
+                       chunk.get('content_hash') or hash_contenido(chunk['content']),
+                       None if vector is None else vector.tobytes())
+
+        with self._escritura() as conexion:
+            conexion.execute(SQL_BORRAR_CHUNKS, (material_id,))
+            conexion.executemany(SQL_INSERTAR_CHUNK, filas())
+        return len(chunks)
+
+    def agregar_preguntas(self, material_id, preguntas):
+        """Carga masiva de preguntas (esquema de la GUI o de mockApi); devuelve sus ids"""
+        filas = [_fila_pregunta(material_id, pregunta) for pregunta in preguntas]
+        with self._escritura() as conexion:
+            conexion.executemany(SQL_INSERTAR_PREGUNTA, filas)
+        return [fila[0] for fila in filas]
+
+    def registrar_repaso(self, usuario_id, pregunta_id, calificacion, puntaje=None, fecha=None):
+        """Guardar un repaso (calificación 1-4) y reprogramar la pregunta; devuelve el nuevo intervalo"""
+        return self.registrar_repasos([(usuario_id, pregunta_id, calificacion, puntaje, fecha)])[0]
+
+    def registrar_repasos(self, repasos):
+        """
+        Carga masiva de repasos [(usuario_id, pregunta_id, calificacion, puntaje, fecha)]
+        en una transacción, en orden. Devuelve [{'interval', 'next_review'}].
+        """
+        resultados = []
+        with self._escritura() as conexion:
+            for usuario_id, pregunta_id, calificacion, puntaje, fecha in repasos:
+                fecha = fecha or time.time()
+                actual = conexion.execute(SQL_INTERVALO_ACTUAL, (usuario_id, pregunta_id)).fetchone()
+                intervalo = nuevo_intervalo(actual[0] if actual else 1, calificacion)
+                proximo = fecha + intervalo * SEGUNDOS_POR_DIA
+                conexion.execute(SQL_INSERTAR_REPASO, (usuario_id, pregunta_id, calificacion, puntaje, intervalo, fecha))
+                conexion.execute(SQL_GUARDAR_PROGRESO,
+                                 (usuario_id, intervalo, calificacion, puntaje, proximo, fecha, pregunta_id))
+                resultados.append({'interval': intervalo, 'next_review': _fecha_iso(proximo)})
+        return resultados
+
+    def eliminar_material(self, material_id):
+        """Borra el material con sus chunks, preguntas, progreso e historial"""
+        with self._escritura() as conexion:
+            conexion.execute('DELETE FROM materiales WHERE id = ?', (material_id,))
+
+    def importar_run(self, usuario_id, ruta, titulo=None):
+        """Crear un material a partir de un run de output/ (JSON o .npy + manifiesto)"""
+        from lector_runs import abrir_run
+
+        with abrir_run(ruta) as run:
+            fuente = run.metadata.get('source_file') or os.path.basename(ruta)
+            material_id = self.crear_material(usuario_id, titulo or fuente, fuente=fuente,
+                                              modelo=run.metadata.get('model'), dimension=run.dimension)
+            self.agregar_chunks(material_id, list(run.iterar_chunks()), run.matriz)
+            preguntas = run.cabecera.get('preguntas_active_recall', [])
+        if preguntas:
+            self.agregar_preguntas(material_id, preguntas)
+        return material_id
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def materiales_usuario(self, usuario_id):
+        with self._lectura() as conexion:
+            filas = conexion.execute(SQL_MATERIALES_USUARIO, (usuario_id,)).fetchall()
+        return [{
+            'id': material_id, 'title': titulo, 'source': fuente, 'model': modelo,
+            'created_at': _fecha_iso(creado), 'chunks': chunks, 'questions': preguntas
+        } for material_id, titulo, fuente, modelo, creado, chunks, preguntas in filas]
+
+    def chunks_material(self, material_id):
+        with self._lectura() as conexion:
+            filas = conexion.execute(SQL_CHUNKS_MATERIAL, (material_id,)).fetchall()
+        return [{
+            'row': fila, 'id': chunk_id, 'content': contenido, 'type': tipo, 'length': largo,
+            'content_hash': contenido_hash
+        } for fila, chunk_id, contenido, tipo, largo, contenido_hash in filas]
+
+    def vectores_material(self, material_id):
+        """(ids de chunk, matriz float32 (n, d)) de un material"""
+        with self._lectura() as conexion:
+            filas = conexion.execute(SQL_VECTORES_MATERIAL, (material_id,)).fetchall()
+        filas = [(chunk_id, blob) for chunk_id, blob in filas if blob is not None]
+        if not filas:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        matriz = np.frombuffer(b''.join(blob for _, blob in filas), dtype=np.float32).reshape(len(filas), -1)
+        return [chunk_id for chunk_id, _ in filas], matriz
+
+    def preguntas_material(self, material_id):
+        with self._lectura() as conexion:
+            filas = conexion.execute(SQL_PREGUNTAS_MATERIAL, (material_id,)).fetchall()
+        return [dict(
+            json.loads(datos) if datos else {},
+            id=pregunta_id, chunk_id=chunk_id, question=pregunta, answer=respuesta, concept=concepto,
+            difficulty=dificultad
+        ) for pregunta_id, chunk_id, pregunta, respuesta, concepto, dificultad, datos in filas]
+
+    def repasos_pendientes(self, usuario_id, hasta=None, limite=50):
+        """Preguntas del usuario cuyo próximo repaso vence antes de `hasta` (por defecto: ahora)"""
+        ahora = time.time()
+        hasta = hasta or ahora
+        with self._lectura() as conexion:
+            filas = conexion.execute(SQL_REPASOS_PENDIENTES, (usuario_id, hasta, limite)).fetchall()
+        return [{
+            'question_id': pregunta_id, 'material_id': material_id, 'material_title': titulo,
+            'question': pregunta, 'interval': intervalo, 'repetitions': repeticiones,
+            'last_rating': calificacion, 'last_score': puntaje, 'next_review': _fecha_iso(proximo),
+            'days_overdue': int((ahora - proximo) // SEGUNDOS_POR_DIA)
+        } for (pregunta_id, material_id, titulo, pregunta, intervalo, repeticiones,
+               calificacion, puntaje, proximo) in filas]
+
+    def historial_repasos(self, usuario_id, pregunta_id=None, limite=100):
+        with self._lectura() as conexion:
+            if pregunta_id:
+                filas = conexion.execute(SQL_HISTORIAL_PREGUNTA, (usuario_id, pregunta_id, limite)).fetchall()
+            else:
+                filas = conexion.execute(SQL_HISTORIAL, (usuario_id, limite)).fetchall()
+        return [{
+            'question_id': pregunta, 'rating': calificacion, 'score': puntaje, 'interval': intervalo,
+            'reviewed_at': _fecha_iso(fecha)
+        } for pregunta, calificacion, puntaje, intervalo, fecha in filas]
+
+    def estadisticas_usuario(self, usuario_id):
+        with self._lectura() as conexion:
+            total, pendientes, puntaje, intervalo = conexion.execute(
+                SQL_ESTADISTICAS_USUARIO, (time.time(), usuario_id)
+            ).fetchone()
+        return {
+            'questions_in_progress': total,
+            'due_now': pendientes,
+            'average_score': round(puntaje, 4) if puntaje is not None else None,
+            'average_interval_days': round(intervalo, 2) if intervalo is not None else None
+        }
+
+    def cerrar(self):
+        with self._lock_escritura:
+            self._escritor.close()
+        while True:
+            try:
+                self._lectores.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_persistencia_global = None
+_lock_global = threading.Lock()
+
+
+def obtener_persistencia():
+    """Base compartida por todo el proceso"""
+    global _persistencia_global
+    with _lock_global:
+        if _persistencia_global is None:
+            _persistencia_global = Persistencia()
+        return _persistencia_global
+
+
+def _benchmark(usuarios, materiales_por_usuario, preguntas_por_material, hilos):
+    """Carga masiva sintética y latencia (p50/p99) de consultas por usuario con hilos concurrentes"""
+    import shutil
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    from embeddings_mock import chunks_sinteticos, generar_vectores_mock
+
+    directorio = tempfile.mkdtemp(prefix='recuiva_bd_')
+    try:
+        bd = Persistencia(os.path.join(directorio, 'recuiva.sqlite'), lectores=hilos)
+        chunks = list(chunks_sinteticos(20))
+        vectores = generar_vectores_mock([chunk['content'] for chunk in chunks])
+
+        inicio = time.perf_counter()
+        bd.guardar_usuarios({'id': f'u{u}', 'email': f'u{u}@recuiva.com', 'name': f'Usuario {u}'}
+                            for u in range(usuarios))
+        repasos = []
+        rng = np.random.default_rng(0)
+        for u in range(usuarios):
+            for m in range(materiales_por_usuario):
+                material_id = bd.crear_material(f'u{u}', f'Material {m}', material_id=f'u{u}_m{m}')
+                bd.agregar_chunks(material_id, chunks, vectores)
+                ids = bd.agregar_preguntas(material_id, [
+                    {'id': f'q{q}', 'question': f'Pregunta {q}', 'answer': 'Respuesta', 'difficulty': 2}
+                    for q in range(preguntas_por_material)
+                ])
+                fechas = time.time() - rng.uniform(0, 30, len(ids)) * SEGUNDOS_POR_DIA
+                repasos.extend((f'u{u}', pregunta_id, int(rng.integers(1, 5)), None, float(fecha))
+                               for pregunta_id, fecha in zip(ids, fechas))
+        bd.registrar_repasos(repasos)
+        carga = time.perf_counter() - inicio
+        print(f"💾 {usuarios:,} usuarios x {materiales_por_usuario} materiales x {preguntas_por_material} "
+              f"preguntas: carga en {carga:.2f}s ({len(repasos):,} repasos)")
+
+        def medir(consulta):
+            inicio = time.perf_counter()
+            consulta(f'u{int(rng.integers(usuarios))}')
+            return time.perf_counter() - inicio
+
+        consultas = {
+            'repasos_pendientes': bd.repasos_pendientes,
+            'materiales_usuario': bd.materiales_usuario,
+            'estadisticas_usuario': bd.estadisticas_usuario,
+            'vectores_material': lambda usuario_id: bd.vectores_material(f'{usuario_id}_m0')
+        }
+        with ThreadPoolExecutor(hilos) as pool:
+            for nombre, consulta in consultas.items():
+                tiempos = np.array(list(pool.map(lambda _: medir(consulta), range(2000)))) * 1000
+                print(f"   {nombre:<22} p50 {np.percentile(tiempos, 50):.3f} ms   "
+                      f"p99 {np.percentile(tiempos, 99):.3f} ms   ({hilos} hilos)")
+        bd.cerrar()
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recuiva - benchmark de la capa de persistencia")
+    parser.add_argument('--usuarios', type=int, default=1000)
+    parser.add_argument('--materiales', type=int, default=5)
+    parser.add_argument('--preguntas', type=int, default=10)
+    parser.add_argument('--hilos', type=int, default=LECTORES_POR_DEFECTO)
+    args = parser.parse_args()
+    _benchmark(args.usuarios, args.materiales, args.preguntas, args.hilos)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
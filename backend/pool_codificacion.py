@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Pool de Codificación Multiproceso
+Reparte los chunks entre N procesos (cada uno con su propia copia del
+modelo y un número fijo de hilos intra-op) y une los resultados en orden.
+Para entradas pequeñas codifica en el mismo proceso: arrancar workers
+cuesta más de lo que ahorran.
+
+Fecha: 18/10/2026
+"""
+
+import atexit
+import multiprocessing
+import os
+import threading
+
+import numpy as np
+
+PROCESOS_POR_DEFECTO = int(os.environ.get('RECUIVA_PROCESOS', '0')) or max(1, (os.cpu_count() or 1) // 2)
+MIN_CHUNKS_POOL = int(os.environ.get('RECUIVA_MIN_CHUNKS_POOL', '1000'))
+MIN_CHUNKS_POR_PROCESO = 250
+FRAGMENTOS_POR_PROCESO = 2  # Más fragmentos que procesos para balancear carga
+
+# Estado de cada worker (se inicializa una vez por proceso hijo)
+_codificador_worker = None
+
+# Pools del proceso principal, compartidos entre ejecuciones (clave: configuración)
+_pools = {}
+_lock_pools = threading.Lock()
+
+
+def _fijar_hilos(hilos):
+    """Limitar hilos intra-op antes de importar torch/onnxruntime en el worker"""
+    for variable in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'RECUIVA_ONNX_HILOS'):
+        os.environ[variable] = str(hilos)
+    try:
+        import torch
+        torch.set_num_threads(hilos)
+    except ImportError:
+        pass
+
+
+def _inicializar_worker(nombre, backend, hilos):
+    global _codificador_worker
+    _fijar_hilos(hilos)
+
+    from registro_modelos import obtener_modelo
+    from codificacion_lotes import CodificadorPorLongitud
+    _codificador_worker = CodificadorPorLongitud(obtener_modelo(nombre, backend=backend))
+
+
+def _codificar_fragmento(tarea):
+    inicio, textos = tarea
+    return inicio, _codificador_worker.encode(textos)
+
+
+def lote_minimo_pool(procesos=PROCESOS_POR_DEFECTO):
+    """Textos por llamada a partir de los que conviene_pool reparte entre procesos"""
+    return max(MIN_CHUNKS_POOL, procesos * MIN_CHUNKS_POR_PROCESO)
+
+
+def conviene_pool(n_textos, procesos=PROCESOS_POR_DEFECTO):
+    """Heurística: solo usar workers si cada uno recibe trabajo suficiente"""
+    return procesos > 1 and n_textos >= lote_minimo_pool(procesos)
+
+
+class CodificadorMultiproceso:
+    """
+    Misma interfaz que CodificadorPorLongitud: `encode(textos)` devuelve
+    float32 en el orden original. El pool se crea al primer uso y se reutiliza.
+    """
+
+    def __init__(self, codificador_local, nombre, backend, procesos=PROCESOS_POR_DEFECTO, hilos_por_proceso=None):
+        self.codificador_local = codificador_local
+        self.nombre = nombre
+        self.backend = backend
+        self.procesos = procesos
+        self.hilos_por_proceso = hilos_por_proceso or max(1, (os.cpu_count() or 1) // procesos)
+        self.ultimas_estadisticas = {}
+
+    def configuracion(self):
+        configuracion = self.codificador_local.configuracion()
+        configuracion['pool'] = {
+            'processes': self.procesos,
+            'threads_per_process': self.hilos_por_proceso,
+            'min_chunks': lote_minimo_pool(self.procesos)
+        }
+        configuracion['last_run'] = dict(self.ultimas_estadisticas)
+        return configuracion
+
+    def lote_minimo(self):
+        """Textos por llamada a encode para que se repartan entre procesos (tamaño de los lotes del stream)"""
+        return lote_minimo_pool(self.procesos) if self.procesos > 1 else 1
+
+    def _obtener_pool(self):
+        clave = (self.nombre, self.backend, self.procesos, self.hilos_por_proceso)
+        with _lock_pools:
+            if clave not in _pools:
+                contexto = multiprocessing.get_context('spawn')
+                _pools[clave] = contexto.Pool(
+                    self.procesos,
+                    initializer=_inicializar_worker,
+                    initargs=clave[:2] + (self.hilos_por_proceso,)
+                )
+            return _pools[clave]
+
+    def encode(self, textos, **kwargs):
+        textos = list(textos)
+        if not conviene_pool(len(textos), self.procesos):
+            resultado = self.codificador_local.encode(textos, **kwargs)
+            self.ultimas_estadisticas = dict(self.codificador_local.ultimas_estadisticas, processes=1)
+            return resultado
+
+        tamano = -(-len(textos) // (self.procesos * FRAGMENTOS_POR_PROCESO))
+        tareas = [(inicio, textos[inicio:inicio + tamano]) for inicio in range(0, len(textos), tamano)]
+
+        resultado = None
+        for inicio, vectores in self._obtener_pool().imap_unordered(_codificar_fragmento, tareas):
+            if resultado is None:
+                resultado = np.empty((len(textos), vectores.shape[1]), dtype=np.float32)
+            resultado[inicio:inicio + len(vectores)] = vectores
+
+        self.ultimas_estadisticas = {
+            'texts': len(textos),
+            'processes': self.procesos,
+            'shards': len(tareas)
+        }
+        return resultado
+
+
+@atexit.register
+def cerrar_pools():
+    """Terminar los workers al salir del proceso"""
+    with _lock_pools:
+        for pool in _pools.values():
+            pool.close()
+            pool.join()
+        _pools.clear()
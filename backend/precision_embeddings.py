@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Almacenamiento de Embeddings en Precisión Reducida
+Modos float32, float16 e int8 (con escala por vector), más truncado
+opcional a las primeras N dimensiones. Las similaridades se calculan
+directamente sobre la representación compacta, por bloques.
+
+Uso:
+    python precision_embeddings.py [--archivo output/run.json] [--k 10]
+    (reporte de recall del top-k de pares similares por modo)
+
+Fecha: 18/10/2026
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+MODOS_PRECISION = ('float32', 'float16', 'int8')
+PRECISION_ALMACENAMIENTO = os.environ.get('RECUIVA_PRECISION', 'float32')
+DIMENSION_ALMACENAMIENTO = int(os.environ.get('RECUIVA_DIMENSION', '0')) or None
+FILAS_POR_BLOQUE = 2048
+DIMENSION_EXACTA_INT8 = 2 ** 24 // (127 * 127)  # 1040: hasta acá el producto int8 entra en la mantisa de float32
+
+
+def configurar_almacenamiento(modo=None, dimension=None):
+    """Cambiar el modo de almacenamiento del proceso (opciones --precision/--dimension)"""
+    global PRECISION_ALMACENAMIENTO, DIMENSION_ALMACENAMIENTO
+    if modo is not None:
+        if modo not in MODOS_PRECISION:
+            raise ValueError(f"Precisión no soportada: {modo} (opciones: {', '.join(MODOS_PRECISION)})")
+        PRECISION_ALMACENAMIENTO = modo
+    if dimension is not None:
+        DIMENSION_ALMACENAMIENTO = dimension or None
+
+
+def almacenamiento_actual():
+    return PRECISION_ALMACENAMIENTO, DIMENSION_ALMACENAMIENTO
+
+
+class VectoresCompactos:
+    """Matriz de embeddings en float32/float16/int8 (+ escala por fila en int8)"""
+
+    def __init__(self, datos, modo, escalas=None, dimension_original=None, normas=None):
+        self.datos = datos
+        self.modo = modo
+        self.escalas = escalas
+        self.normas = normas
+        self.dimension = datos.shape[1]
+        self.dimension_original = dimension_original or self.dimension
+
+    @classmethod
+    def desde_matriz(cls, matriz, modo='float32', dimension=None):
+        """
+        Truncar (y renormalizar) a `dimension` y convertir al modo pedido. Se
+        guarda la norma de cada fila tal como llega, antes de truncar y cuantizar.
+        """
+        if modo not in MODOS_PRECISION:
+            raise ValueError(f"Precisión no soportada: {modo}")
+        matriz = np.asarray(matriz, dtype=np.float32)
+        dimension_original = matriz.shape[1]
+        normas_originales = np.linalg.norm(matriz, axis=1).astype(np.float32)
+
+        if dimension and dimension < dimension_original:
+            matriz = matriz[:, :dimension]
+            normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+            matriz = matriz / np.clip(normas, 1e-12, None)
+
+        if modo == 'float32':
+            return cls(np.ascontiguousarray(matriz), modo, dimension_original=dimension_original,
+                       normas=normas_originales)
+        if modo == 'float16':
+            return cls(matriz.astype(np.float16), modo, dimension_original=dimension_original,
+                       normas=normas_originales)
+
+        escalas = np.abs(matriz).max(axis=1) / 127.0
+        escalas[escalas == 0] = 1.0
+        datos = np.clip(np.rint(matriz / escalas[:, None]), -127, 127).astype(np.int8)
+        return cls(datos, modo, escalas.astype(np.float32), dimension_original, normas_originales)
+
+    def __len__(self):
+        return len(self.datos)
+
+    @property
+    def bytes_por_vector(self):
+        return self.datos.itemsize * self.dimension + (4 if self.escalas is not None else 0)
+
+    @property
+    def nbytes(self):
+        return self.datos.nbytes + (self.escalas.nbytes if self.escalas is not None else 0)
+
+    def _bloque(self, inicio, fin):
+        """
+        Filas [inicio, fin) en punto flotante para usar BLAS. Para int8 el
+        producto es exacto en float32 solo si 127 * 127 * dimensión < 2**24
+        (dimensión <= 1040); por encima se acumula en float64 (exacto hasta 2**53).
+        """
+        if self.escalas is not None and self.dimension > DIMENSION_EXACTA_INT8:
+            return self.datos[inicio:fin].astype(np.float64)
+        return self.datos[inicio:fin].astype(np.float32, copy=False)
+
+    def decodificar(self, filas=None):
+        """Vectores float32 aproximados (para filas puntuales, no para todo el corpus)"""
+        datos = self.datos if filas is None else self.datos[filas]
+        vectores = datos.astype(np.float32)
+        if self.escalas is not None:
+            escalas = self.escalas if filas is None else self.escalas[filas]
+            vectores *= np.asarray(escalas)[..., None]
+        return vectores
+
+    def similitudes(self, inicio, fin, col_inicio=0, col_fin=None):
+        """Bloque de similaridades coseno filas[inicio:fin] x filas[col_inicio:col_fin]"""
+        col_fin = len(self) if col_fin is None else col_fin
+        producto = self._bloque(inicio, fin) @ self._bloque(col_inicio, col_fin).T
+        if self.escalas is None:
+            return producto
+        producto = producto.astype(np.float32, copy=False)
+        return producto * self.escalas[inicio:fin, None] * self.escalas[None, col_inicio:col_fin]
+
+    def top_k_pares(self, k=3):
+        """Top-k pares (similaridad, i, j) con i < j, recorriendo bloques de filas"""
+        mejores = []
+        for inicio in range(0, len(self), FILAS_POR_BLOQUE):
+            fin = min(inicio + FILAS_POR_BLOQUE, len(self))
+            bloque = self.similitudes(inicio, fin, inicio, len(self))
+            filas = np.arange(fin - inicio)[:, None]
+            bloque[np.arange(bloque.shape[1])[None, :] <= filas] = -np.inf
+
+            plano = bloque.ravel()
+            kk = min(k, plano.size)
+            for indice in np.argpartition(plano, -kk)[-kk:]:
+                if np.isfinite(plano[indice]):
+                    r, c = divmod(int(indice), bloque.shape[1])
+                    mejores.append((float(plano[indice]), inicio + r, inicio + c))
+            mejores = sorted(mejores, reverse=True)[:k]
+        return mejores
+
+    def registro_embedding(self, i, norma=None):
+        """
+        Diccionario 'embedding' de un chunk para la salida JSON. 'norm' es la
+        del vector del modelo (`norma` si se pasa), no la del vector decodificado.
+        """
+        if norma is None:
+            norma = self.normas[i] if self.normas is not None else np.linalg.norm(self.decodificar(i))
+        registro = {
+            'vector': self.datos[i],
+            'dimension': self.dimension,
+            'dtype': self.modo,
+            'norm': float(norma)
+        }
+        if self.escalas is not None:
+            registro['scale'] = float(self.escalas[i])
+        if self.dimension != self.dimension_original:
+            registro['original_dimension'] = self.dimension_original
+        return registro
+
+    def descripcion(self):
+        """Metadata del modo de almacenamiento"""
+        return {
+            'precision': self.modo,
+            'dimension': self.dimension,
+            'original_dimension': self.dimension_original,
+            'bytes_per_vector': self.bytes_por_vector
+        }
+
+
+def compactar_registros(registros, matriz, modo, dimension=None):
+    """Reemplazar el 'embedding' de cada registro por su versión compacta"""
+    compactos = VectoresCompactos.desde_matriz(matriz, modo, dimension)
+    if hasattr(registros, 'usar_compactos'):  # RegistrosStream: los registros se arman al leerlos
+        registros.usar_compactos(compactos)
+        return compactos
+    for i, registro in enumerate(registros):
+        registro['embedding'] = compactos.registro_embedding(i, registro['embedding'].get('norm'))
+    return compactos
+
+
+def descripcion_almacenamiento(registros):
+    """Metadata de almacenamiento a partir de los registros de una ejecución"""
+    if not registros:
+        return None
+    embedding = registros[0]['embedding']
+    modo = embedding.get('dtype', 'float32')
+    bytes_valor = {'float32': 4, 'float16': 2, 'int8': 1}[modo]
+    return {
+        'precision': modo,
+        'dimension': embedding['dimension'],
+        'original_dimension': embedding.get('original_dimension', embedding['dimension']),
+        'bytes_per_vector': bytes_valor * embedding['dimension'] + (4 if 'scale' in embedding else 0)
+    }
+
+
+def reporte_recall(matriz, k=10, configuraciones=None):
+    """
+    Recall del top-k de pares similares (el de los pipelines, con k
+    configurable) para cada (modo, dimensión) frente a float32 completo.
+    """
+    matriz = np.asarray(matriz, dtype=np.float32)
+    configuraciones = configuraciones or [
+        ('float32', None), ('float16', None), ('int8', None),
+        ('float32', 256), ('float16', 256), ('int8', 256),
+        ('float32', 128), ('int8', 128)
+    ]
+
+    referencia = VectoresCompactos.desde_matriz(matriz, 'float32')
+    pares_referencia = {(i, j) for _, i, j in referencia.top_k_pares(k)}
+    bytes_referencia = referencia.bytes_por_vector
+
+    filas = []
+    for modo, dimension in configuraciones:
+        if dimension and dimension >= matriz.shape[1]:
+            continue
+        inicio = time.perf_counter()
+        compactos = VectoresCompactos.desde_matriz(matriz, modo, dimension)
+        pares = {(i, j) for _, i, j in compactos.top_k_pares(k)}
+        filas.append({
+            'precision': modo,
+            'dimension': compactos.dimension,
+            'bytes_per_vector': compactos.bytes_por_vector,
+            'compression': round(bytes_referencia / compactos.bytes_por_vector, 2),
+            f'recall@{k}': round(len(pares & pares_referencia) / max(len(pares_referencia), 1), 4),
+            'seconds': round(time.perf_counter() - inicio, 4)
+        })
+    return filas
+
+
+def cargar_vectores_json(ruta):
+    """Vectores float32 de una salida existente (JSON de consola o GUI, o manifiesto .npy)"""
+    if ruta.endswith('.json'):
+        with open(ruta, 'r', encoding='utf-8') as f:
+            datos = json.load(f)
+        chunks = datos.get('chunks') or datos.get('chunks_procesados') or []
+        matriz = np.array([chunk['embedding']['vector'] for chunk in chunks], dtype=np.float32)
+    else:
+        from formato_binario import cargar_run_binario, clave_chunks
+        datos, matriz = cargar_run_binario(ruta, mmap=False)
+        chunks = datos[clave_chunks(datos)]
+        matriz = matriz.astype(np.float32)
+
+    # Runs int8: volver a la escala original de cada vector
+    if chunks and 'scale' in chunks[0]['embedding']:
+        matriz *= np.array([chunk['embedding']['scale'] for chunk in chunks], dtype=np.float32)[:, None]
+    return matriz
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recuiva - recall por modo de almacenamiento")
+    parser.add_argument('--archivo', help="JSON o manifiesto de output/ (por defecto: 5000 vectores mock)")
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.archivo:
+        matriz = cargar_vectores_json(args.archivo)
+    else:
+        from embeddings_mock import chunks_sinteticos, generar_vectores_mock
+        matriz = generar_vectores_mock(chunk['content'] for chunk in chunks_sinteticos(5000))
+
+    print(f"📐 {len(matriz)} vectores de {matriz.shape[1]}D, top-{args.k} pares")
+    print(f"{'precisión':<10}{'dim':>6}{'bytes':>8}{'compresión':>12}{'recall':>9}{'tiempo':>9}")
+    for fila in reporte_recall(matriz, args.k):
+        print(f"{fila['precision']:<10}{fila['dimension']:>6}{fila['bytes_per_vector']:>8}"
+              f"{fila['compression']:>11}x{fila[f'recall@{args.k}']:>9.2%}{fila['seconds']:>8.2f}s")
+
+
+if __name__ == '__main__':
+    main()
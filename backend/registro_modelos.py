@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Registro de Modelos
+Carga cada modelo de sentence-transformers una sola vez por proceso y lo
+comparte entre la consola (embeddings_local.py), la GUI y el launcher.
+El backend (PyTorch, ONNX fp32 u ONNX int8) se elige con RECUIVA_BACKEND
+o con la opción --backend de los scripts.
+
+Fecha: 18/10/2026
+"""
+
+import os
+import threading
+import time
+
+try:
+    from sentence_transformers import SentenceTransformer
+    TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    TRANSFORMERS_AVAILABLE = False
+
+from backend_onnx import ONNX_AVAILABLE, CodificadorONNX, ruta_modelo_onnx
+
+MODELO_POR_DEFECTO = 'all-MiniLM-L6-v2'
+PRECISIONES_VALIDAS = ('fp32', 'fp16')
+BACKENDS_VALIDOS = ('pytorch', 'onnx-fp32', 'onnx-int8')
+BACKEND_POR_DEFECTO = os.environ.get('RECUIVA_BACKEND', 'pytorch')
+
+# Estado global del proceso: un modelo por clave (nombre, dispositivo, precisión, backend)
+_lock_registro = threading.Lock()
+_entradas = {}
+_locks_carga = {}
+
+
+def configurar_backend(backend):
+    """Cambiar el backend por defecto del proceso (opción --backend)"""
+    global BACKEND_POR_DEFECTO
+    if backend not in BACKENDS_VALIDOS:
+        raise ValueError(f"Backend no soportado: {backend} (opciones: {', '.join(BACKENDS_VALIDOS)})")
+    BACKEND_POR_DEFECTO = backend
+
+
+def backend_actual():
+    """Backend por defecto vigente (para pasarlo a procesos hijos)"""
+    return BACKEND_POR_DEFECTO
+
+
+def encoder_disponible(backend=None):
+    """¿Están instaladas las librerías que necesita el backend elegido?"""
+    backend = backend or BACKEND_POR_DEFECTO
+    if backend == 'pytorch':
+        return TRANSFORMERS_AVAILABLE
+    return ONNX_AVAILABLE
+
+
+def identificador_modelo(nombre=MODELO_POR_DEFECTO, backend=None):
+    """Nombre para cache/metadata: los vectores int8 no son idénticos a los de PyTorch"""
+    backend = backend or BACKEND_POR_DEFECTO
+    return nombre if backend == 'pytorch' else f"{nombre}@{backend}"
+
+
+def _clave(nombre, dispositivo, precision, backend):
+    return (nombre, dispositivo or 'auto', precision, backend or BACKEND_POR_DEFECTO)
+
+
+def _cargar_modelo(nombre, dispositivo, precision, backend):
+    """Construir el modelo real (solo se llama una vez por clave)"""
+    if backend in ('onnx-fp32', 'onnx-int8'):
+        return CodificadorONNX(ruta_modelo_onnx(nombre), cuantizado=(backend == 'onnx-int8'))
+
+    if not TRANSFORMERS_AVAILABLE:
+        raise ImportError("sentence-transformers no está instalado")
+
+    modelo = SentenceTransformer(nombre, device=dispositivo)
+    if precision == 'fp16':
+        modelo = modelo.half()
+    return modelo
+
+
+def obtener_modelo(nombre=MODELO_POR_DEFECTO, dispositivo=None, precision='fp32', backend=None):
+    """
+    Devolver el modelo compartido para (nombre, dispositivo, precisión, backend).
+    La primera llamada lo carga; las siguientes lo reutilizan (cache hit).
+    Es seguro llamarlo desde varios hilos a la vez.
+    """
+    if precision not in PRECISIONES_VALIDAS:
+        raise ValueError(f"Precisión no soportada: {precision}")
+
+    clave = _clave(nombre, dispositivo, precision, backend)
+    if clave[3] not in BACKENDS_VALIDOS:
+        raise ValueError(f"Backend no soportado: {clave[3]}")
+
+    with _lock_registro:
+        entrada = _entradas.get(clave)
+        if entrada is not None:
+            entrada['aciertos'] += 1
+            return entrada['modelo']
+        lock_carga = _locks_carga.setdefault(clave, threading.Lock())
+
+    # Cargar fuera del lock global para no bloquear otros modelos
+    with lock_carga:
+        with _lock_registro:
+            entrada = _entradas.get(clave)
+            if entrada is not None:
+                entrada['aciertos'] += 1
+                return entrada['modelo']
+
+        inicio = time.perf_counter()
+        modelo = _cargar_modelo(*clave)
+        tiempo_carga = time.perf_counter() - inicio
+
+        with _lock_registro:
+            _entradas[clave] = {
+                'modelo': modelo,
+                'tiempo_carga': tiempo_carga,
+                'aciertos': 0,
+                'cargado_en': time.time()
+            }
+        return modelo
+
+
+def info_modelo(nombre=MODELO_POR_DEFECTO, dispositivo=None, precision='fp32', backend=None):
+    """Metadata de carga para incluir en los resultados (None si no está cargado)"""
+    clave = _clave(nombre, dispositivo, precision, backend)
+    with _lock_registro:
+        entrada = _entradas.get(clave)
+        if entrada is None:
+            return None
+        return {
+            'model': nombre,
+            'device': clave[1],
+            'precision': precision,
+            'backend': clave[3],
+            'load_time_s': round(entrada['tiempo_carga'], 4),
+            'cache_hits': entrada['aciertos']
+        }
+
+
+def estadisticas_registro():
+    """Resumen de todos los modelos cargados en este proceso"""
+    with _lock_registro:
+        return [
+            {
+                'model': clave[0],
+                'device': clave[1],
+                'precision': clave[2],
+                'backend': clave[3],
+                'load_time_s': round(entrada['tiempo_carga'], 4),
+                'cache_hits': entrada['aciertos']
+            }
+            for clave, entrada in _entradas.items()
+        ]
+
+
+def limpiar_registro():
+    """Liberar todos los modelos (útil para tests o para cambiar de modelo)"""
+    with _lock_registro:
+        _entradas.clear()
+        _locks_carga.clear()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Servicio Backend (modo de arranque del contenedor)
+Precarga el encoder configurado, ejecuta lotes de calentamiento hasta que
+la mediana (p50) de latencia de `encode` se estabiliza y recién entonces
+se declara listo: GET /health responde 200 (503 mientras arranca) y se
+escribe el archivo de readiness. El tiempo hasta estar listo queda
+registrado en /health y en ese archivo.
+
+Endpoints:
+    GET  /health     estado de arranque y calentamiento
+    GET  /metrics    métricas del micro-batching (servidor_embeddings)
+    POST /embed      {"texts": [...]} -> {"vectors": [[...]], "dimension": d}
+    POST /search     {"query": "...", "k": 5, "filters": {...}} -> chunks ordenados (busqueda_semantica)
+
+Uso:
+    python servicio_backend.py [--puerto 8000] [--backend onnx-int8]
+
+Fecha: 18/10/2026
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from registro_modelos import (
+    BACKENDS_VALIDOS, MODELO_POR_DEFECTO, configurar_backend, encoder_disponible, identificador_modelo,
+    info_modelo, obtener_modelo
+)
+from servidor_embeddings import obtener_servidor
+
+PUERTO = int(os.environ.get('RECUIVA_PUERTO', '8000'))
+ARCHIVO_LISTO = os.environ.get('RECUIVA_ARCHIVO_LISTO', '/tmp/recuiva_ready.json')
+VENTANA_CALENTAMIENTO = 5      # Rondas por ventana para comparar medianas
+TOLERANCIA_P50 = float(os.environ.get('RECUIVA_TOLERANCIA_P50', '0.10'))
+MIN_RONDAS = 2 * VENTANA_CALENTAMIENTO
+MAX_RONDAS = int(os.environ.get('RECUIVA_MAX_RONDAS_CALENTAMIENTO', '60'))
+TAMANO_LOTE_CALENTAMIENTO = 32
+
+# Estado de arranque compartido con los handlers HTTP
+estado = {
+    'ready': False,
+    'phase': 'starting',
+    'model': None,
+    'started_at': time.time(),
+    'time_to_ready_s': None,
+    'load_time_s': None,
+    'warmup': None,
+    'error': None
+}
+
+
+def textos_calentamiento(cantidad=TAMANO_LOTE_CALENTAMIENTO):
+    """Líneas del texto de muestra (longitudes reales de chunks), repetidas hasta `cantidad`"""
+    ruta = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_active_recall.txt')
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            textos = [linea.strip() for linea in f if len(linea.strip()) >= 20]
+    except OSError:
+        textos = []
+    if not textos:
+        from embeddings_mock import chunks_sinteticos
+        textos = [chunk['content'] for chunk in chunks_sinteticos(cantidad)]
+    return (textos * (cantidad // len(textos) + 1))[:cantidad]
+
+
+def p50_estable(latencias, ventana=VENTANA_CALENTAMIENTO, tolerancia=TOLERANCIA_P50):
+    """¿La mediana de la última ventana difiere menos de `tolerancia` de la anterior?"""
+    if len(latencias) < max(MIN_RONDAS, 2 * ventana):
+        return False
+    anterior = np.median(latencias[-2 * ventana:-ventana])
+    actual = np.median(latencias[-ventana:])
+    return bool(abs(actual - anterior) <= tolerancia * anterior)
+
+
+def calentar_encoder(codificar, textos, max_rondas=MAX_RONDAS):
+    """
+    Ejecutar `codificar(textos)` hasta que p50 se estabiliza (sin pasar por
+    la cache en disco: se mide el forward real). Devuelve el resumen.
+    """
+    latencias = []
+    estable = False
+    while len(latencias) < max_rondas and not estable:
+        inicio = time.perf_counter()
+        codificar(textos)
+        latencias.append(time.perf_counter() - inicio)
+        estable = p50_estable(latencias)
+
+    return {
+        'rounds': len(latencias),
+        'batch_size': len(textos),
+        'stable': estable,
+        'first_ms': round(1000 * latencias[0], 3),
+        'p50_ms': round(1000 * float(np.median(latencias[-VENTANA_CALENTAMIENTO:])), 3),
+        'tolerance': TOLERANCIA_P50
+    }
+
+
+def escribir_archivo_listo(ruta=ARCHIVO_LISTO):
+    """Archivo de readiness (escritura atómica) con el estado de arranque"""
+    if not ruta:
+        return
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, indent=2)
+    os.replace(temporal, ruta)
+
+
+def preparar_servicio():
+    """Precarga + calentamiento; marca el servicio como listo al terminar"""
+    try:
+        estado['phase'] = 'loading'
+        if encoder_disponible():
+            from codificacion_lotes import CodificadorPorLongitud
+
+            estado['model'] = identificador_modelo()
+            print(f"🤖 Precargando {estado['model']}...")
+            modelo = obtener_modelo(MODELO_POR_DEFECTO)
+            estado['load_time_s'] = info_modelo(MODELO_POR_DEFECTO)['load_time_s']
+            codificar = CodificadorPorLongitud(modelo).encode
+        else:
+            from embeddings_mock import generar_vectores_mock
+            estado['model'] = 'mock'
+            estado['load_time_s'] = 0.0
+            codificar = generar_vectores_mock
+
+        estado['phase'] = 'warming_up'
+        print("🔥 Calentando encoder hasta estabilizar p50...")
+        estado['warmup'] = calentar_encoder(codificar, textos_calentamiento())
+        obtener_servidor()  # Hilo de micro-batching listo antes de la primera petición
+
+        estado['time_to_ready_s'] = round(time.time() - estado['started_at'], 3)
+        estado['phase'] = 'ready'
+        estado['ready'] = True
+        escribir_archivo_listo()
+        calentamiento = estado['warmup']
+        print(f"✅ Listo en {estado['time_to_ready_s']:.2f}s ({calentamiento['rounds']} rondas, "
+              f"p50 {calentamiento['p50_ms']:.1f} ms; primera {calentamiento['first_ms']:.1f} ms)")
+    except Exception as e:
+        estado['phase'] = 'error'
+        estado['error'] = str(e)
+        print(f"❌ Error preparando el servicio: {e}")
+
+
+class ManejadorRecuiva(BaseHTTPRequestHandler):
+    """Handler HTTP mínimo (JSON) sobre la biblioteca estándar"""
+
+    def _responder(self, codigo, cuerpo):
+        datos = json.dumps(cuerpo).encode('utf-8')
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _leer_json(self):
+        largo = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(largo) or b'{}')
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._responder(200 if estado['ready'] else 503, estado)
+        elif self.path == '/metrics':
+            if not estado['ready']:
+                return self._responder(503, {'error': 'servicio no listo', 'phase': estado['phase']})
+            self._responder(200, obtener_servidor().metricas())
+        else:
+            self._responder(404, {'error': f'ruta no encontrada: {self.path}'})
+
+    def do_POST(self):
+        if self.path not in ('/embed', '/search'):
+            return self._responder(404, {'error': f'ruta no encontrada: {self.path}'})
+        if not estado['ready']:
+            return self._responder(503, {'error': 'servicio no listo', 'phase': estado['phase']})
+        if self.path == '/search':
+            return self._buscar()
+        try:
+            textos = self._leer_json().get('texts') or []
+        except (ValueError, AttributeError):
+            return self._responder(400, {'error': 'se esperaba JSON {"texts": [...]}'})
+        if not isinstance(textos, list) or not all(isinstance(t, str) for t in textos):
+            return self._responder(400, {'error': '"texts" debe ser una lista de strings'})
+        if not textos:
+            return self._responder(200, {'vectors': [], 'dimension': 0})
+
+        try:
+            vectores = obtener_servidor().codificar_varios(textos)
+        except Exception as e:
+            return self._responder(500, {'error': f'error al codificar: {e}'})
+        self._responder(200, {'vectors': vectores.tolist(), 'dimension': int(vectores.shape[1])})
+
+    def _buscar(self):
+        from busqueda_semantica import obtener_buscador
+
+        try:
+            peticion = self._leer_json()
+            consulta, k, filtros = peticion.get('query'), peticion.get('k', 5), peticion.get('filters') or {}
+        except (ValueError, AttributeError):
+            return self._responder(400, {'error': 'se esperaba JSON {"query": "...", "k": 5, "filters": {...}}'})
+        if not isinstance(filtros, dict) or not isinstance(k, int):
+            return self._responder(400, {'error': '"k" debe ser un entero y "filters" un objeto'})
+        try:
+            buscador = obtener_buscador(obtener_servidor().codificar_varios)
+        except (FileNotFoundError, ValueError) as e:
+            return self._responder(503, {'error': str(e)})
+        except Exception as e:
+            return self._responder(500, {'error': f'no se pudo abrir el material para buscar: {e}'})
+        try:
+            respuesta = buscador.buscar(consulta, k, filtros)
+        except ValueError as e:
+            return self._responder(400, {'error': str(e)})
+        except Exception as e:
+            return self._responder(500, {'error': f'error en la búsqueda: {e}'})
+        self._responder(200, respuesta)
+
+    def log_message(self, formato, *args):
+        pass  # Sin log por petición (el healthcheck consulta cada pocos segundos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recuiva - servicio backend")
+    parser.add_argument('--puerto', type=int, default=PUERTO)
+    parser.add_argument('--backend', choices=BACKENDS_VALIDOS)
+    args = parser.parse_args()
+    if args.backend:
+        configurar_backend(args.backend)
+
+    if ARCHIVO_LISTO and os.path.exists(ARCHIVO_LISTO):
+        os.remove(ARCHIVO_LISTO)  # No heredar el "listo" de un arranque anterior
+
+    servidor = ThreadingHTTPServer(('0.0.0.0', args.puerto), ManejadorRecuiva)
+    threading.Thread(target=preparar_servicio, name='recuiva-arranque', daemon=True).start()
+    print(f"🌐 Servicio Recuiva en el puerto {args.puerto} (GET /health)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Servicio de Embeddings con Micro-Batching
+Servicio en proceso para muchas peticiones concurrentes y cortas (p. ej.
+respuestas de estudiantes): los textos entran a una cola, un hilo los
+agrupa en un solo lote por ventana de tiempo o por tamaño, ejecuta un
+único `encode` y resuelve el Future de cada llamador.
+
+Uso:
+    python servidor_embeddings.py [--clientes 64] [--peticiones 20]
+    (compara codificar cada respuesta por separado contra el micro-batching)
+
+Fecha: 18/10/2026
+"""
+
+import argparse
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+MAX_LOTE_SERVIDOR = int(os.environ.get('RECUIVA_SERVIDOR_MAX_LOTE', '64'))
+MAX_ESPERA_MS = float(os.environ.get('RECUIVA_SERVIDOR_MAX_ESPERA_MS', '5'))
+_DETENER = object()
+
+
+class ServidorEmbeddings:
+    """
+    Cola + hilo de micro-batching. `codificar(textos)` debe devolver una
+    matriz (n, d) en el orden de `textos` (por ejemplo cache.codificar).
+    """
+
+    def __init__(self, codificar, max_lote=MAX_LOTE_SERVIDOR, max_espera_ms=MAX_ESPERA_MS):
+        self.codificar = codificar
+        self.max_lote = max_lote
+        self.max_espera = max_espera_ms / 1000.0
+        self._cola = queue.Queue()
+        self._hilo = None
+        self._deteniendo = False   # Centinela encolado para self._hilo y join vencido
+        self._lock = threading.Lock()
+        self._reiniciar_metricas()
+
+    def _reiniciar_metricas(self):
+        self.peticiones = 0
+        self.lotes = 0
+        self.errores = 0
+        self.profundidad_maxima = 0
+        self.espera_total = 0.0
+        self.codificacion_total = 0.0
+        self.lotes_por_tamano = 0  # Lotes cerrados por llegar a max_lote (el resto, por tiempo)
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def iniciar(self):
+        with self._lock:
+            self._asegurar_hilo()
+        return self
+
+    def _asegurar_hilo(self):
+        """
+        Arrancar el hilo si no está vivo o si tiene un `detener` pendiente (con
+        self._lock tomado). En ese caso el hilo anterior termina lo que tiene
+        y su centinela en su propia cola; el nuevo atiende una cola nueva.
+        """
+        if self._hilo is not None and self._hilo.is_alive() and not self._deteniendo:
+            return
+        if self._deteniendo:
+            self._cola = queue.Queue()
+            self._deteniendo = False
+        self._hilo = threading.Thread(target=self._bucle, args=(self._cola,), name='recuiva-microbatch',
+                                      daemon=True)
+        self._hilo.start()
+
+    def detener(self, timeout=5.0):
+        """
+        Procesar lo que queda en cola y terminar el hilo. El lock se mantiene
+        hasta el join: un `enviar` concurrente no puede arrancar un segundo hilo
+        que consuma el centinela de este.
+        """
+        with self._lock:
+            if self._hilo is None:
+                return
+            if not self._deteniendo:
+                self._cola.put(_DETENER)
+                self._deteniendo = True
+            self._hilo.join(timeout)
+            if not self._hilo.is_alive():
+                self._hilo = None
+                self._deteniendo = False
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.detener()
+
+    @property
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    # ------------------------------------------------------------------
+    # API para los llamadores
+    # ------------------------------------------------------------------
+
+    def enviar(self, texto):
+        """
+        Encolar un texto; el Future se resuelve con su vector float32 (d,).
+        Se encola bajo el lock para no quedar detrás del centinela de un
+        `detener` en curso sin hilo que lo atienda.
+        """
+        futuro = Future()
+        with self._lock:
+            self._asegurar_hilo()
+            self._cola.put((texto, futuro, time.perf_counter()))
+        profundidad = self._cola.qsize()
+        if profundidad > self.profundidad_maxima:
+            self.profundidad_maxima = profundidad
+        return futuro
+
+    def codificar_uno(self, texto, timeout=None):
+        """Versión bloqueante de `enviar`"""
+        return self.enviar(texto).result(timeout)
+
+    def codificar_varios(self, textos, timeout=None):
+        """Encolar varios textos (se mezclan con los de otros llamadores) y esperar la matriz"""
+        futuros = [self.enviar(texto) for texto in textos]
+        return np.stack([futuro.result(timeout) for futuro in futuros]) if futuros else None
+
+    # ------------------------------------------------------------------
+    # Hilo de micro-batching
+    # ------------------------------------------------------------------
+
+    def _recolectar(self, cola, primero):
+        """Juntar peticiones hasta max_lote o hasta que venza la ventana desde la primera"""
+        lote = [primero]
+        limite = time.perf_counter() + self.max_espera
+        while len(lote) < self.max_lote:
+            restante = limite - time.perf_counter()
+            try:
+                item = cola.get(timeout=restante) if restante > 0 else cola.get_nowait()
+            except queue.Empty:
+                break
+            if item is _DETENER:
+                cola.put(_DETENER)  # Terminar después de este lote
+                break
+            lote.append(item)
+        return lote
+
+    def _bucle(self, cola):
+        while True:
+            item = cola.get()
+            if item is _DETENER:
+                return
+            lote = self._recolectar(cola, item)
+            self._procesar(lote)
+
+    def _procesar(self, lote):
+        inicio = time.perf_counter()
+        lote = [(texto, futuro, llegada) for texto, futuro, llegada in lote if futuro.set_running_or_notify_cancel()]
+        if not lote:
+            return
+        try:
+            vectores = np.asarray(self.codificar([texto for texto, _, _ in lote]), dtype=np.float32)
+        except Exception as e:
+            self.errores += 1
+            for _, futuro, _ in lote:
+                futuro.set_exception(e)
+            return
+
+        fin = time.perf_counter()
+        for fila, (_, futuro, _) in zip(vectores, lote):
+            futuro.set_result(fila)
+
+        self.peticiones += len(lote)
+        self.lotes += 1
+        self.lotes_por_tamano += len(lote) >= self.max_lote
+        self.espera_total += sum(inicio - llegada for _, _, llegada in lote)
+        self.codificacion_total += fin - inicio
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+
+    def metricas(self):
+        """Profundidad de cola, tamaño medio de lote y tiempos medios"""
+        return {
+            'queue_depth': self._cola.qsize(),
+            'max_queue_depth': self.profundidad_maxima,
+            'requests': self.peticiones,
+            'batches': self.lotes,
+            'errors': self.errores,
+            'avg_batch_size': round(self.peticiones / self.lotes, 2) if self.lotes else 0.0,
+            'batches_closed_by_size': self.lotes_por_tamano,
+            'avg_queue_wait_ms': round(1000 * self.espera_total / self.peticiones, 3) if self.peticiones else 0.0,
+            'avg_encode_ms': round(1000 * self.codificacion_total / self.lotes, 3) if self.lotes else 0.0,
+            'max_batch_size': self.max_lote,
+            'max_wait_ms': self.max_espera * 1000
+        }
+
+
+def codificador_por_defecto():
+    """Encoder del registro (o mock) detrás de la cache en disco, como en embeddings_local"""
+    from cache_embeddings import obtener_cache
+    from codificacion_lotes import CodificadorPorLongitud
+    from embeddings_mock import NOMBRE_MOCK, generar_vectores_mock
+    from registro_modelos import MODELO_POR_DEFECTO, encoder_disponible, identificador_modelo, obtener_modelo
+
+    cache = obtener_cache()
+    if not encoder_disponible():
+        return lambda textos: cache.codificar(NOMBRE_MOCK, textos, generar_vectores_mock)
+
+    codificador = CodificadorPorLongitud(obtener_modelo(MODELO_POR_DEFECTO))
+    nombre = identificador_modelo()
+    return lambda textos: cache.codificar(nombre, textos, codificador.encode)
+
+
+_servidor_global = None
+_lock_global = threading.Lock()
+
+
+def obtener_servidor():
+    """Servicio compartido por todo el proceso (se inicia al primer uso)"""
+    global _servidor_global
+    with _lock_global:
+        if _servidor_global is None:
+            _servidor_global = ServidorEmbeddings(codificador_por_defecto()).iniciar()
+        return _servidor_global
+
+
+def _benchmark(codificar, textos, clientes, usar_servidor, max_lote, max_espera_ms):
+    """Tiempo total para que `clientes` hilos codifiquen sus textos de a uno"""
+    servidor = ServidorEmbeddings(codificar, max_lote, max_espera_ms).iniciar() if usar_servidor else None
+    por_cliente = [textos[i::clientes] for i in range(clientes)]
+
+    def cliente(mis_textos):
+        for texto in mis_textos:
+            if servidor:
+                servidor.codificar_uno(texto)
+            else:
+                codificar([texto])
+
+    hilos = [threading.Thread(target=cliente, args=(t,)) for t in por_cliente]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    metricas = servidor.metricas() if servidor else None
+    if servidor:
+        servidor.detener()
+    return duracion, metricas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recuiva - benchmark del micro-batching")
+    parser.add_argument('--clientes', type=int, default=64)
+    parser.add_argument('--peticiones', type=int, default=20, help="Respuestas por cliente")
+    parser.add_argument('--max-lote', type=int, default=MAX_LOTE_SERVIDOR)
+    parser.add_argument('--max-espera-ms', type=float, default=MAX_ESPERA_MS)
+    args = parser.parse_args()
+
+    from embeddings_mock import chunks_sinteticos
+    from registro_modelos import MODELO_POR_DEFECTO, encoder_disponible, identificador_modelo, obtener_modelo
+
+    # Sin cache: se mide el costo real de cada forward
+    if encoder_disponible():
+        modelo = obtener_modelo(MODELO_POR_DEFECTO)
+        codificar = lambda textos: modelo.encode(textos, show_progress_bar=False)
+        nombre = identificador_modelo()
+    else:
+        from embeddings_mock import generar_vectores_mock
+        codificar, nombre = generar_vectores_mock, 'mock'
+
+    total = args.clientes * args.peticiones
+    textos = [chunk['content'] for chunk in chunks_sinteticos(total)]
+    print(f"🧪 {args.clientes} clientes x {args.peticiones} respuestas ({total} textos, encoder: {nombre})")
+
+    individual, _ = _benchmark(codificar, textos, args.clientes, False, args.max_lote, args.max_espera_ms)
+    agrupado, metricas = _benchmark(codificar, textos, args.clientes, True, args.max_lote, args.max_espera_ms)
+
+    print(f"   Una llamada por respuesta: {individual:.2f}s ({total / individual:,.0f} textos/s)")
+    print(f"   Micro-batching:            {agrupado:.2f}s ({total / agrupado:,.0f} textos/s)")
+    print(f"   Lote medio: {metricas['avg_batch_size']}, cola máx.: {metricas['max_queue_depth']}, "
+          f"espera media: {metricas['avg_queue_wait_ms']:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Similitud por Bloques (todos los pares, memoria acotada)
+Recorre la matriz de similitudes sin materializarla: bloques de filas
+contra las columnas que hacen falta (solo el triángulo superior para los
+pares), con el tamaño del bloque calculado a partir de un presupuesto de
+memoria. El top-k global se mantiene en un heap entre bloques; también
+se pueden pedir todos los pares sobre un umbral (casi duplicados) o los
+m vecinos de cada chunk (chunks relacionados). Los bloques se pueden
+repartir entre hilos (NumPy libera el GIL durante el producto de matrices).
+
+Uso:
+    python similitud_bloques.py output/run.manifest.ndjson [--top-k 10] [--umbral 0.95] [--vecinos 5]
+    python similitud_bloques.py --corpus [--umbral 0.95]     (todo el almacén de corpus)
+    python similitud_bloques.py --benchmark 50000 [--hilos 4] [--presupuesto-mb 256]
+
+Fecha: 18/10/2026
+"""
+
+import argparse
+import heapq
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+PRESUPUESTO_MB = float(os.environ.get('RECUIVA_SIMILITUD_MB', '256'))
+HILOS_SIMILITUD = int(os.environ.get('RECUIVA_SIMILITUD_HILOS', '1'))
+COPIAS_POR_BLOQUE = 2      # El bloque de similitudes + la máscara/temporales de argpartition
+MAX_PARES_UMBRAL = 100000  # Tope de pares devueltos por pares_sobre_umbral
+
+
+class MotorSimilitud:
+    """
+    Similitudes (producto punto) entre todas las filas de `vectores` (n, d),
+    por bloques de filas que entran en `presupuesto_mb` (sumando los hilos).
+    """
+
+    def __init__(self, vectores, presupuesto_mb=PRESUPUESTO_MB, hilos=HILOS_SIMILITUD):
+        self.vectores = np.ascontiguousarray(vectores, dtype=np.float32)
+        self.presupuesto_mb = presupuesto_mb
+        self.hilos = max(1, hilos)
+        self.ultimas_estadisticas = {}
+
+    def __len__(self):
+        return len(self.vectores)
+
+    def filas_por_bloque(self):
+        """Filas por bloque: cada hilo tiene en vuelo un bloque (filas x n) float32 y sus temporales"""
+        n = max(len(self), 1)
+        por_hilo = self.presupuesto_mb * 1024 * 1024 / self.hilos
+        return int(max(1, min(n, por_hilo // (n * 4 * COPIAS_POR_BLOQUE))))
+
+    def _bloques(self, funcion, triangular=True):
+        """
+        Aplicar funcion(inicio, fin, col_inicio, bloque) a cada bloque de filas.
+        Con `triangular`, cada bloque solo ve las columnas >= inicio, con las
+        columnas <= fila propia en -inf (cada par i < j aparece una sola vez).
+        """
+        n = len(self)
+        filas = self.filas_por_bloque()
+        rangos = [(inicio, min(inicio + filas, n)) for inicio in range(0, n, filas)]
+
+        def procesar(rango):
+            inicio, fin = rango
+            col_inicio = inicio if triangular else 0
+            bloque = self.vectores[inicio:fin] @ self.vectores[col_inicio:].T
+            columnas = np.arange(col_inicio, n)[None, :]
+            propias = np.arange(inicio, fin)[:, None]
+            bloque[(columnas <= propias) if triangular else (columnas == propias)] = -np.inf
+            return funcion(inicio, fin, col_inicio, bloque)
+
+        inicio = time.perf_counter()
+        if self.hilos == 1 or len(rangos) == 1:
+            resultados = map(procesar, rangos)
+            yield from resultados
+        else:
+            with ThreadPoolExecutor(self.hilos) as pool:
+                yield from pool.map(procesar, rangos)
+        self.ultimas_estadisticas = {
+            'rows': n,
+            'block_rows': filas,
+            'blocks': len(rangos),
+            'threads': self.hilos,
+            'peak_block_mb': round(filas * n * 4 / 1024 / 1024, 1),
+            'seconds': round(time.perf_counter() - inicio, 4)
+        }
+
+    def top_k_pares(self, k=3):
+        """Top-k pares (similaridad, i, j) con i < j, de mayor a menor"""
+        def candidatos(inicio, fin, col_inicio, bloque):
+            plano = bloque.ravel()
+            kk = min(k, plano.size)
+            if kk <= 0:
+                return []
+            indices = np.argpartition(plano, -kk)[-kk:]
+            filas, columnas = np.divmod(indices, bloque.shape[1])
+            return [(float(plano[i]), inicio + int(f), col_inicio + int(c))
+                    for i, f, c in zip(indices, filas, columnas) if np.isfinite(plano[i])]
+
+        heap = []  # (similaridad, i, j); mínimo en la raíz
+        for lista in self._bloques(candidatos):
+            for par in lista:
+                if len(heap) < k:
+                    heapq.heappush(heap, par)
+                elif par[0] > heap[0][0]:
+                    heapq.heapreplace(heap, par)
+        return sorted(heap, reverse=True)
+
+    def pares_sobre_umbral(self, umbral, max_pares=MAX_PARES_UMBRAL):
+        """
+        Pares (similaridad, i, j), i < j, con similaridad >= umbral (casi
+        duplicados), de mayor a menor. Entre bloques solo se guardan los
+        mejores `max_pares`: con un umbral bajo la memoria no crece con la
+        cantidad de pares que lo superan.
+        """
+        def sobre_umbral(inicio, fin, col_inicio, bloque):
+            filas, columnas = np.nonzero(bloque >= umbral)
+            return _mejores_pares(bloque[filas, columnas], filas + inicio, columnas + col_inicio, max_pares)
+
+        valores = np.zeros(0, dtype=np.float32)
+        filas = columnas = np.zeros(0, dtype=np.int64)
+        for parte_valores, parte_filas, parte_columnas in self._bloques(sobre_umbral):
+            if not len(parte_valores):
+                continue
+            valores = np.concatenate((valores, parte_valores))
+            filas = np.concatenate((filas, parte_filas))
+            columnas = np.concatenate((columnas, parte_columnas))
+            if len(valores) > max_pares:
+                valores, filas, columnas = _mejores_pares(valores, filas, columnas, max_pares)
+        valores, filas, columnas = _mejores_pares(valores, filas, columnas, max_pares)
+        return [(float(v), int(f), int(c)) for v, f, c in zip(valores, filas, columnas)]
+
+    def vecinos(self, m=5):
+        """Los m vecinos más similares de cada fila: (índices (n, m), similitudes (n, m)), de mayor a menor"""
+        n = len(self)
+        m = min(m, max(n - 1, 0))
+        indices = np.zeros((n, m), dtype=np.int64)
+        similitudes = np.zeros((n, m), dtype=np.float32)
+
+        def mejores_por_fila(inicio, fin, col_inicio, bloque):
+            if m == 0:
+                return
+            parte = np.argpartition(bloque, -m, axis=1)[:, -m:]
+            valores = np.take_along_axis(bloque, parte, axis=1)
+            orden = np.argsort(-valores, axis=1, kind='stable')
+            indices[inicio:fin] = np.take_along_axis(parte, orden, axis=1)
+            similitudes[inicio:fin] = np.take_along_axis(valores, orden, axis=1)
+
+        for _ in self._bloques(mejores_por_fila, triangular=False):
+            pass
+        return indices, similitudes
+
+
+def _mejores_pares(valores, filas, columnas, tope):
+    """
+    Los `tope` pares de mayor similaridad, de mayor a menor (empates: menor
+    (i, j) primero, el orden en que los recorren los bloques)
+    """
+    if len(valores) > tope:
+        corte = np.partition(valores, len(valores) - tope)[len(valores) - tope]
+        dentro = valores >= corte   # Los `tope` mejores más los empatados con el corte
+        valores, filas, columnas = valores[dentro], filas[dentro], columnas[dentro]
+    orden = np.lexsort((columnas, filas, -valores))[:tope]
+    return valores[orden], filas[orden], columnas[orden]
+
+
+def _vectores_de_fuente(args):
+    """(MatrizEmbeddings normalizada, textos por fila) de un run o de todo el corpus"""
+    from matriz_embeddings import MatrizEmbeddings
+
+    if args.corpus:
+        from almacen_corpus import obtener_almacen
+
+        almacen = obtener_almacen()
+        matrices, etiquetas, textos = [], [], []
+        for doc_id in almacen.documentos():
+            matrices.append(almacen.vectores_documento(doc_id))
+            for chunk in almacen.chunks_documento(doc_id):
+                etiquetas.append(f"{doc_id}/{chunk['chunk_id']}")
+                textos.append(chunk['content'])
+        matriz = np.concatenate(matrices) if matrices else np.zeros((0, 0), dtype=np.float32)
+        return MatrizEmbeddings(matriz, etiquetas), textos
+
+    from lector_runs import abrir_run, listar_runs
+
+    ruta = args.run or next(iter(listar_runs()), None)
+    if not ruta:
+        raise FileNotFoundError("No hay runs en output/")
+    with abrir_run(ruta) as run:
+        textos = [chunk['content'] for chunk in run.iterar_chunks()]
+    return MatrizEmbeddings.desde_run(ruta), textos
+
+
+def _benchmark(total, presupuesto_mb, hilos, k):
+    from embeddings_mock import chunks_sinteticos, generar_vectores_mock
+
+    vectores = generar_vectores_mock([chunk['content'] for chunk in chunks_sinteticos(total)])
+    denso = total * total * 8 / 1024 / 1024
+    print(f"🧮 {total:,} chunks x {vectores.shape[1]}D (np.dot denso en float64: {denso:,.0f} MB)")
+    for n_hilos in sorted({1, hilos}):
+        motor = MotorSimilitud(vectores, presupuesto_mb, n_hilos)
+        pares = motor.top_k_pares(k)
+        e = motor.ultimas_estadisticas
+        print(f"   {n_hilos} hilo(s): {e['seconds']:.2f}s, {e['blocks']} bloques de {e['block_rows']} filas "
+              f"(~{e['peak_block_mb']} MB por bloque), mejor par {pares[0][1]}-{pares[0][2]} = {pares[0][0]:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recuiva - similitud por bloques entre todos los chunks")
+    parser.add_argument('run', nargs='?', help="Run de output/ (por defecto: el más reciente)")
+    parser.add_argument('--corpus', action='store_true', help="Usar todos los documentos del almacén de corpus")
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--umbral', type=float, help="Reportar pares con similitud >= umbral (casi duplicados)")
+    parser.add_argument('--vecinos', type=int, default=0, help="Vecinos más similares por chunk")
+    parser.add_argument('--presupuesto-mb', type=float, default=PRESUPUESTO_MB)
+    parser.add_argument('--hilos', type=int, default=HILOS_SIMILITUD)
+    parser.add_argument('--benchmark', type=int, metavar='CHUNKS', help="Benchmark con vectores mock")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        _benchmark(args.benchmark, args.presupuesto_mb, args.hilos, args.top_k)
+        return 0
+
+    try:
+        matriz, textos = _vectores_de_fuente(args)
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        return 1
+    etiquetas = matriz.ids
+    motor = matriz.motor(args.presupuesto_mb, args.hilos)
+    print(f"🧮 {len(motor):,} chunks, bloques de {motor.filas_por_bloque()} filas")
+
+    print(f"\n🔝 TOP-{args.top_k} pares:")
+    for similaridad, i, j in motor.top_k_pares(args.top_k):
+        print(f"   {similaridad:.4f}  {etiquetas[i]} ↔ {etiquetas[j]}")
+
+    if args.umbral is not None:
+        pares = motor.pares_sobre_umbral(args.umbral)
+        print(f"\n♻️  {len(pares)} pares casi duplicados (>= {args.umbral}):")
+        for similaridad, i, j in pares[:20]:
+            print(f"   {similaridad:.4f}  {etiquetas[i]} ↔ {etiquetas[j]}: {textos[i][:60]}")
+
+    if args.vecinos:
+        indices, similitudes = motor.vecinos(args.vecinos)
+        print(f"\n🔗 Chunks relacionados (primeros 10 de {len(motor)}):")
+        for fila in range(min(10, len(motor))):
+            relacionados = ', '.join(f"{etiquetas[j]} ({s:.2f})" for j, s in zip(indices[fila], similitudes[fila]))
+            print(f"   {etiquetas[fila]}: {relacionados}")
+    print(f"\n⏱️  {motor.ultimas_estadisticas}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Recuiva - Generación de Embeddings en Streaming
+Genera (chunks, vectores) por lotes a medida que se codifican, para que
+las etapas siguientes (similaridades, escritura, progreso de la GUI) los
+consuman de forma incremental. Los vectores se copian una sola vez a una
+matriz float32 preasignada (en un archivo temporal mapeado si pasa de
+RECUIVA_STREAM_DISCO_MB, así no crece la memoria anónima del proceso); los
+registros de salida no se guardan: RegistrosStream los arma al recorrerlos
+a partir del chunk y la vista de su fila. El top-k de pares similares
+se elige con argpartition sobre el triángulo superior; solo los k
+ganadores se convierten en diccionarios.
+
+Uso:
+    python streaming_embeddings.py [--chunks 1000 10000] [--k 3]
+    (benchmark del top-k: bucle de pares en Python vs vectorizado)
+
+Fecha: 18/10/2026
+"""
+
+import argparse
+import heapq
+import os
+import tempfile
+import time
+from collections.abc import Sequence
+
+import numpy as np
+
+from matriz_embeddings import MatrizEmbeddings, normalizar_filas
+from similitud_bloques import COPIAS_POR_BLOQUE, PRESUPUESTO_MB, MotorSimilitud
+
+TAMANO_LOTE_STREAM = int(os.environ.get('RECUIVA_LOTE_STREAM', '1024'))
+MATRIZ_EN_DISCO_MB = int(os.environ.get('RECUIVA_STREAM_DISCO_MB', '64'))  # Matrices más grandes: memmap temporal
+COLUMNAS_POR_BLOQUE = 4096  # Limita la memoria del bloque de similaridades (lote x columnas)
+FILAS_MASCARA = 1024        # Filas por paso al enmascarar el triángulo inferior
+TOP_K_SIMILARIDADES = int(os.environ.get('RECUIVA_TOP_K', '3'))
+
+
+def configurar_top_k(k):
+    """Cambiar cuántos pares similares se reportan (opción --top-k)"""
+    global TOP_K_SIMILARIDADES
+    if k < 1:
+        raise ValueError(f"top-k debe ser al menos 1 (recibido: {k})")
+    TOP_K_SIMILARIDADES = k
+
+
+def top_k_actual():
+    return TOP_K_SIMILARIDADES
+
+
+def iterar_lotes(elementos, tamano):
+    """Agrupar cualquier iterable en listas de `tamano` elementos"""
+    lote = []
+    for elemento in elementos:
+        lote.append(elemento)
+        if len(lote) == tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def generar_embeddings_stream(chunks, codificar, tamano_lote=TAMANO_LOTE_STREAM):
+    """
+    Generador de (lote_chunks, vectores float32) en orden.
+    `codificar` recibe una lista de textos y devuelve una matriz (n, d).
+    """
+    for lote in iterar_lotes(chunks, tamano_lote):
+        vectores = np.asarray(codificar([chunk['content'] for chunk in lote]), dtype=np.float32)
+        yield lote, vectores
+
+
+def registro_chunk(chunk, vector, norma=None):
+    """
+    Registro de salida de un chunk; `vector` es una vista (se serializa con
+    vector_a_json). `norma`: la ya calculada al normalizar, si se tiene.
+    """
+    registro = {
+        'id': chunk['id'],
+        'content': chunk['content'],
+        'length': chunk['length'],
+        'type': chunk['type'],
+        'embedding': {
+            'vector': vector,
+            'dimension': len(vector),
+            'norm': float(np.linalg.norm(vector) if norma is None else norma)
+        }
+    }
+    if chunk.get('span'):
+        registro['span'] = chunk['span']  # Posición [inicio, fin) en el texto del material
+    if chunk.get('duplicates'):
+        registro['duplicates'] = chunk['duplicates']  # Ids colapsados por la deduplicación
+    return registro
+
+
+class RegistrosStream(Sequence):
+    """
+    Secuencia de registros de salida (len, índices, iteración, como la lista
+    que reemplaza) armados al pedirlos desde los chunks y las filas del
+    acumulador: no queda un diccionario por chunk en memoria. Cada acceso
+    devuelve un registro nuevo.
+    """
+
+    def __init__(self, chunks, matriz, normas):
+        self.chunks = chunks
+        self.matriz = matriz
+        self.normas = normas
+        self.compactos = None
+
+    def usar_compactos(self, compactos):
+        """Servir el 'embedding' compacto (VectoresCompactos) en lugar de la fila float32"""
+        self.compactos = compactos
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return [self[i] for i in range(*indice.indices(len(self)))]
+        if indice < 0:
+            indice += len(self)
+        registro = registro_chunk(self.chunks[indice], self.matriz[indice], self.normas[indice])
+        if self.compactos is not None:
+            registro['embedding'] = self.compactos.registro_embedding(indice, self.normas[indice])
+        return registro
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def vector_a_json(objeto):
+    """`default` para json.dump: convierte arrays NumPy fila por fila al escribir"""
+    if isinstance(objeto, np.ndarray):
+        return objeto.tolist()
+    if isinstance(objeto, np.generic):
+        return objeto.item()
+    raise TypeError(f"Objeto no serializable: {type(objeto).__name__}")
+
+
+def formatear_pares(pares, chunks, largo_preview=80):
+    """(similaridad, i, j) -> diccionarios con ids y preview del contenido"""
+    return [
+        {
+            'chunk_1': chunks[i]['id'],
+            'chunk_2': chunks[j]['id'],
+            'similaridad': similaridad,
+            'content_1': chunks[i]['content'][:largo_preview] + "...",
+            'content_2': chunks[j]['content'][:largo_preview] + "..."
+        }
+        for similaridad, i, j in pares
+    ]
+
+
+def top_k_pares(vectores, k=None):
+    """
+    Top-k pares (similaridad, i, j) con i < j, de mayor a menor, sobre la
+    matriz completa vectores @ vectores.T (float32), o por bloques con
+    MotorSimilitud si no entra en RECUIVA_SIMILITUD_MB. El triángulo inferior
+    y la diagonal se descartan en el lugar, por bloques de filas, y una sola
+    argpartition elige los candidatos; solo se ordenan los k ganadores.
+    """
+    vectores = np.asarray(vectores, dtype=np.float32)
+    n = len(vectores)
+    k = min(TOP_K_SIMILARIDADES if k is None else k, n * (n - 1) // 2)
+    if k <= 0:
+        return []
+    if n * n * 4 * COPIAS_POR_BLOQUE > PRESUPUESTO_MB * 1024 * 1024:
+        # La matriz completa no entra en el presupuesto: recorrerla por bloques
+        return MotorSimilitud(vectores).top_k_pares(k)
+
+    similaridades = vectores @ vectores.T
+    columnas = np.arange(n)[None, :]
+    for inicio in range(0, n, FILAS_MASCARA):
+        fin = min(inicio + FILAS_MASCARA, n)
+        similaridades[inicio:fin][columnas <= np.arange(inicio, fin)[:, None]] = -np.inf
+
+    plano = similaridades.ravel()
+    ganadores = np.argpartition(plano, -k)[-k:]
+    ganadores = ganadores[np.argsort(-plano[ganadores], kind='stable')]
+    filas, cols = np.divmod(ganadores, n)
+    return [(float(plano[g]), int(i), int(j)) for g, i, j in zip(ganadores, filas, cols)]
+
+
+class AcumuladorSimilaridades:
+    """
+    Matriz float32 preasignada + top-k de pares más similares, actualizado
+    lote a lote (cada lote se compara contra todas las filas anteriores).
+    Cada fila se normaliza al copiarla; `normas` guarda la norma original.
+    Si la matriz pasa de MATRIZ_EN_DISCO_MB se respalda en un archivo
+    temporal sin nombre (el SO puede desalojar sus páginas).
+    """
+
+    def __init__(self, total, k=None, largo_preview=80):
+        self.total = total
+        self.k = TOP_K_SIMILARIDADES if k is None else k
+        self.largo_preview = largo_preview
+        self.matriz = None
+        self.normas = np.zeros(total, dtype=np.float32)
+        self.filas = 0
+        self.chunks = []
+        self._heap = []  # (similaridad, i, j) con i < j; mínimo en la raíz
+
+    def agregar(self, lote, vectores):
+        """Copiar el lote a la matriz, actualizar el top-k y devolver las filas (vistas)"""
+        if self.matriz is None:
+            forma = (self.total, vectores.shape[1])
+            if self.total * vectores.shape[1] * 4 > MATRIZ_EN_DISCO_MB * 1024 * 1024:
+                self.matriz = np.memmap(tempfile.TemporaryFile(prefix='recuiva_stream_'), dtype=np.float32,
+                                        mode='w+', shape=forma)
+            else:
+                self.matriz = np.empty(forma, dtype=np.float32)
+
+        inicio, fin = self.filas, self.filas + len(lote)
+        self.matriz[inicio:fin] = vectores
+        self.normas[inicio:fin] = normalizar_filas(self.matriz[inicio:fin])
+        self.chunks.extend(lote)
+        self.filas = fin
+
+        if self.k > 0:
+            self._actualizar_top_k(inicio, fin)
+        return self.matriz[inicio:fin]
+
+    def _actualizar_top_k(self, inicio, fin):
+        nuevas = self.matriz[inicio:fin]
+        filas_globales = np.arange(inicio, fin)[:, None]
+
+        for col_inicio in range(0, fin, COLUMNAS_POR_BLOQUE):
+            col_fin = min(col_inicio + COLUMNAS_POR_BLOQUE, fin)
+            bloque = nuevas @ self.matriz[col_inicio:col_fin].T
+
+            # Solo pares (j, i) con j < i: cada par se cuenta una vez
+            columnas = np.arange(col_inicio, col_fin)[None, :]
+            bloque[columnas >= filas_globales] = -np.inf
+
+            plano = bloque.ravel()
+            k = min(self.k, plano.size)
+            candidatos = np.argpartition(plano, -k)[-k:]
+            for indice in candidatos:
+                valor = plano[indice]
+                if not np.isfinite(valor):
+                    continue
+                r, c = divmod(int(indice), bloque.shape[1])
+                par = (float(valor), col_inicio + c, inicio + r)
+                if len(self._heap) < self.k:
+                    heapq.heappush(self._heap, par)
+                elif par[0] > self._heap[0][0]:
+                    heapq.heapreplace(self._heap, par)
+
+    def matriz_embeddings(self):
+        """MatrizEmbeddings sobre las filas acumuladas (sin copia)"""
+        matriz = self.matriz[:self.filas] if self.matriz is not None else np.zeros((0, 0), dtype=np.float32)
+        return MatrizEmbeddings(matriz, [chunk['id'] for chunk in self.chunks], self.normas[:self.filas],
+                                normalizada=True)
+
+    def top_pares(self):
+        """Top-k pares como diccionarios (formatear_pares): el top de similaridades de los pipelines"""
+        return formatear_pares(sorted(self._heap, reverse=True), self.chunks, self.largo_preview)
+
+
+def consumir_stream(chunks, codificar, acumulador=None, al_avanzar=None, tamano_lote=TAMANO_LOTE_STREAM):
+    """
+    Consumir el generador y devolver los registros de chunks (RegistrosStream
+    sobre la matriz del acumulador). `al_avanzar(procesados, total)` se llama
+    después de cada lote (progreso de la GUI).
+    """
+    chunks = chunks if isinstance(chunks, list) else list(chunks)
+    acumulador = acumulador or AcumuladorSimilaridades(len(chunks), k=0)
+
+    for lote, vectores in generar_embeddings_stream(chunks, codificar, tamano_lote):
+        acumulador.agregar(lote, vectores)
+        if al_avanzar:
+            al_avanzar(acumulador.filas, len(chunks))
+    if acumulador.matriz is None:
+        return RegistrosStream([], np.zeros((0, 0), dtype=np.float32), acumulador.normas)
+    return RegistrosStream(acumulador.chunks, acumulador.matriz, acumulador.normas)
+
+
+def _top_k_bucle(vectores, chunks, k, largo_preview=80):
+    """Selección anterior: un diccionario por par i < j, orden completo y corte (referencia del benchmark)"""
+    similaridades = np.dot(vectores, vectores.T)
+    pares = []
+    for i in range(len(chunks)):
+        for j in range(i + 1, len(chunks)):
+            pares.append({
+                'chunk_1': chunks[i]['id'],
+                'chunk_2': chunks[j]['id'],
+                'similaridad': float(similaridades[i][j]),
+                'content_1': chunks[i]['content'][:largo_preview] + "...",
+                'content_2': chunks[j]['content'][:largo_preview] + "..."
+            })
+    pares.sort(key=lambda x: x['similaridad'], reverse=True)
+    return pares[:k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recuiva - benchmark de selección top-k de pares")
+    parser.add_argument('--chunks', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--k', type=int, default=TOP_K_SIMILARIDADES)
+    parser.add_argument('--max-bucle', type=int, default=3000,
+                        help="Tamaño máximo medido con el bucle (más arriba se extrapola como O(n²))")
+    args = parser.parse_args()
+
+    from embeddings_mock import chunks_sinteticos, generar_vectores_mock
+
+    print(f"🏁 Top-{args.k} pares: bucle de pares en Python vs argpartition vectorizado")
+    for n in args.chunks:
+        chunks = list(chunks_sinteticos(n))
+        vectores = generar_vectores_mock([chunk['content'] for chunk in chunks])
+
+        inicio = time.perf_counter()
+        vectorizado = formatear_pares(top_k_pares(vectores, args.k), chunks)
+        t_vectorizado = time.perf_counter() - inicio
+
+        medido = min(n, args.max_bucle)
+        inicio = time.perf_counter()
+        referencia = _top_k_bucle(vectores[:medido], chunks[:medido], args.k)
+        t_bucle = (time.perf_counter() - inicio) * (n / medido) ** 2
+        nota = '' if medido == n else f' (estimado desde {medido:,})'
+        if medido == n:
+            iguales = [(p['chunk_1'], p['chunk_2']) for p in referencia] == \
+                      [(p['chunk_1'], p['chunk_2']) for p in vectorizado]
+            nota = f"  mismos pares: {'✅' if iguales else '❌'}"
+        print(f"   n={n:>6,}: bucle {t_bucle:>8.2f}s{nota}  |  vectorizado {t_vectorizado:.3f}s  "
+              f"(x{t_bucle / t_vectorizado:,.0f})")
+
+
+if __name__ == '__main__':
+    main()